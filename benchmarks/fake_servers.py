@@ -0,0 +1,410 @@
+"""Local stand-in servers for the VK API, the VK Streaming API, an OpenAI-compatible chat completions endpoint and the Telegram Bot API"""
+import base64
+import hashlib
+import json
+import queue
+import random
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# 模拟帖子使用的文本片段
+ACTIVITY_TEXTS = [
+    "Приглашаем на концерт камерной музыки {day} числа в 19:00, Санкт-Петербург, Дом музыки. Вход свободный.",
+    "Лекция о современном искусстве состоится {day} числа в Москве, музей Гараж. Регистрация по ссылке.",
+    "Выставка фотографии откроется {day} числа в Манеже, Санкт-Петербург. Билеты от 500 рублей.",
+]
+NOISE_TEXTS = [
+    "Скидки до 50% в торговом центре только на этой неделе! #скидки #шопинг",
+    "Вспоминаем, как прошёл вчерашний вечер. Спасибо всем! #фото",
+    "Новости района: ремонт дороги на улице Ленина продлится до конца месяца.",
+]
+
+
+class FakeServer(ABC):
+    """Base class running a ThreadingHTTPServer on a background thread"""
+
+    def __init__(self, latency_ms: float = 0, rate_limit_rate: float = 0, seed: int = 0):
+        """Initialize fake server
+
+        Args:
+            latency_ms: Delay added to every response
+            rate_limit_rate: Fraction of requests answered with a rate limit error (see rate_limited_response)
+            seed: Random seed so workloads are reproducible
+        """
+        self.latency_ms = latency_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "rate_limited": 0}
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset_counters(self):
+        with self.lock:
+            self.counters = {key: 0 for key in self.counters}
+
+    def should_rate_limit(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.rate_limit_rate
+
+    def rate_limited_response(self) -> Tuple[int, Dict[str, Any]]:
+        """Response to a request picked for rate limiting, HTTP 429 by default"""
+        return 429, {"error": "Too Many Requests"}
+
+    @abstractmethod
+    def handle(self, method: str, path: str, query: Dict[str, str], body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Return (status, json body) for one request"""
+        pass
+
+    def upgrade(self, request: BaseHTTPRequestHandler) -> bool:
+        """Take over a websocket upgrade request, False if the server does not serve websockets"""
+        return False
+
+    def start(self) -> "FakeServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                body = {}
+                content_type = self.headers.get("Content-Type", "")
+                if raw and "json" in content_type:
+                    body = json.loads(raw.decode("utf-8"))
+                elif raw and "x-www-form-urlencoded" in content_type:
+                    body = {k: v[-1] for k, v in parse_qs(raw.decode("utf-8")).items()}
+
+                server.count("requests")
+                if server.latency_ms:
+                    time.sleep(server.latency_ms / 1000.0)
+
+                if server.should_rate_limit():
+                    server.count("rate_limited")
+                    status, payload = server.rate_limited_response()
+                else:
+                    status, payload = server.handle(method, parsed.path, query, body)
+
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.headers.get("Upgrade", "").lower() == "websocket" and server.upgrade(self):
+                    self.close_connection = True
+                    return
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+
+class FakeVKServer(FakeServer):
+    """Fake VK API serving newsfeed.search from a deterministic, sliding post corpus
+
+    Posts are numbered; ``advance(n)`` publishes n new posts, so every
+    benchmark cycle sees a controllable number of fresh posts.
+    """
+
+    def __init__(self, posts_per_search: int = 100, activity_ratio: float = 0.2, owner_count: int = 50, **kwargs):
+        super().__init__(**kwargs)
+        self.posts_per_search = posts_per_search
+        self.activity_ratio = activity_ratio
+        self.owner_count = owner_count
+        self.latest_post_id = posts_per_search
+        self.counters.update({"newsfeed.search": 0})
+
+    def rate_limited_response(self):
+        # VK不使用HTTP 429，限流以HTTP 200和错误6（Too many requests per second）返回
+        return 200, {"error": {"error_code": 6, "error_msg": "Too many requests per second", "request_params": []}}
+
+    def advance(self, count: int):
+        with self.lock:
+            self.latest_post_id += count
+
+    def make_post(self, post_id: int) -> Dict[str, Any]:
+        rnd = random.Random(post_id)
+        is_activity = rnd.random() < self.activity_ratio
+        template = rnd.choice(ACTIVITY_TEXTS if is_activity else NOISE_TEXTS)
+        owner_id = -(1 + post_id % self.owner_count)
+        return {
+            "id": post_id,
+            "owner_id": owner_id,
+            "from_id": owner_id,
+            "date": int(time.time()) - (self.latest_post_id - post_id) * 30,
+            "post_type": "post",
+            "text": template.format(day=1 + post_id % 28) + f" [{post_id}]",
+            "views": {"count": rnd.randint(10, 50000)},
+            "likes": {"count": rnd.randint(0, 2000)},
+            "reposts": {"count": rnd.randint(0, 300)},
+        }
+
+    def handle(self, method, path, query, body):
+        params = {**query, **body}
+        api_method = path.rsplit("/", 1)[-1]
+        if api_method in self.counters:
+            self.count(api_method)
+
+        if api_method == "newsfeed.search":
+            count = int(params.get("count", 30))
+            offset = int(params.get("start_from") or 0)
+            with self.lock:
+                latest = self.latest_post_id
+            first = latest - offset
+            last = max(first - count, latest - self.posts_per_search)
+            items = [self.make_post(post_id) for post_id in range(first, last, -1)]
+            response = {"items": items, "count": len(items)}
+            if last > latest - self.posts_per_search:
+                response["next_from"] = str(offset + count)
+            return 200, {"response": response}
+
+        if api_method == "utils.resolveScreenName":
+            return 200, {"response": {"type": "group", "object_id": 1}}
+
+        return 200, {"error": {"error_code": 3, "error_msg": f"Unknown method passed: {api_method}"}}
+
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def websocket_frame(text: str) -> bytes:
+    """Unmasked server-to-client text frame"""
+    payload = text.encode("utf-8")
+    if len(payload) < 126:
+        header = struct.pack("!BB", 0x81, len(payload))
+    elif len(payload) < 65536:
+        header = struct.pack("!BBH", 0x81, 126, len(payload))
+    else:
+        header = struct.pack("!BBQ", 0x81, 127, len(payload))
+    return header + payload
+
+
+class FakeStreamingServer(FakeServer):
+    """Fake VK Streaming API: streaming.getServerUrl, the /rules endpoint and the /stream websocket
+
+    ``publish`` pushes a post event to every connected stream,
+    ``disconnect`` drops all streams without a close frame (like a network
+    failure) and ``available = False`` makes the rules endpoint fail so
+    clients cannot connect.
+    """
+
+    def __init__(self, key: str = "stream-key", **kwargs):
+        super().__init__(**kwargs)
+        self.key = key
+        self.available = True
+        self.rules: Dict[str, str] = {}
+        self.streams: List[queue.Queue] = []
+        self.next_post_id = 1
+        self.counters.update({"rules_added": 0, "rules_deleted": 0, "connections": 0})
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    def handle(self, method, path, query, body):
+        if path.endswith("/streaming.getServerUrl"):
+            return 200, {"response": {"endpoint": self.endpoint, "key": self.key}}
+        if path != "/rules":
+            return 404, {"code": 400, "error": {"message": "not found", "error_code": 404}}
+        if not self.available or query.get("key") != self.key:
+            return 200, {"code": 400, "error": {"message": "Invalid key", "error_code": 1000}}
+
+        with self.lock:
+            if method == "GET":
+                return 200, {"code": 200, "rules": [{"tag": tag, "value": value} for tag, value in self.rules.items()]}
+            rule = body.get("rule", {})
+            if method == "POST":
+                if rule.get("tag") in self.rules:
+                    return 200, {"code": 400, "error": {"message": "Tag already exist", "error_code": 2001}}
+                self.rules[rule.get("tag")] = rule.get("value")
+                self.counters["rules_added"] += 1
+            elif method == "DELETE":
+                if self.rules.pop(body.get("tag"), None) is None:
+                    return 200, {"code": 400, "error": {"message": "Tag doesn't exist", "error_code": 2002}}
+                self.counters["rules_deleted"] += 1
+        return 200, {"code": 200}
+
+    def upgrade(self, request):
+        parsed = urlparse(request.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        if parsed.path != "/stream" or not self.available or query.get("key") != self.key:
+            return False
+
+        accept = base64.b64encode(hashlib.sha1(
+            (request.headers["Sec-WebSocket-Key"] + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        # http.server默认以HTTP/1.0应答，websocket握手必须是HTTP/1.1
+        request.wfile.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                             f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("ascii"))
+        request.wfile.flush()
+
+        messages: queue.Queue = queue.Queue()
+        with self.lock:
+            self.streams.append(messages)
+            self.counters["connections"] += 1
+        try:
+            while True:
+                message = messages.get()
+                if message is None:
+                    return True
+                request.wfile.write(websocket_frame(message))
+                request.wfile.flush()
+        except OSError:
+            return True
+        finally:
+            with self.lock:
+                self.streams.remove(messages)
+
+    def publish(self, text: str, owner_id: int = -1, event_type: str = "post") -> int:
+        """Send a post event to every connected stream, returns its post id"""
+        with self.lock:
+            post_id = self.next_post_id
+            self.next_post_id += 1
+            streams = list(self.streams)
+        message = json.dumps({"code": 100, "event": {
+            "event_type": event_type,
+            "event_id": {"post_owner_id": owner_id, "post_id": post_id},
+            "creation_time": int(time.time()),
+            "text": text,
+            "tags": list(self.rules),
+        }}, ensure_ascii=False)
+        for stream in streams:
+            stream.put(message)
+        return post_id
+
+    def disconnect(self):
+        """Drop every open stream"""
+        with self.lock:
+            streams = list(self.streams)
+        for stream in streams:
+            stream.put(None)
+
+    def stop(self):
+        self.disconnect()
+        super().stop()
+
+
+class FakeAIServer(FakeServer):
+    """Fake OpenAI-compatible /chat/completions endpoint
+
+    Activity classification answers YES for posts generated from the activity
+    templates, everything else gets a short generic completion.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.counters.update({"completions": 0, "prompt_tokens": 0, "completion_tokens": 0})
+
+    def handle(self, method, path, query, body):
+        if not path.endswith("/chat/completions"):
+            return 404, {"error": "not found"}
+
+        messages = body.get("messages", [])
+        user_content = messages[-1].get("content", "") if messages else ""
+        system_content = messages[0].get("content", "") if messages else ""
+        if "classifier" in system_content:
+            is_activity = any(word in user_content for word in ("концерт", "Лекция", "Выставка"))
+            content = "YES" if is_activity else "NO"
+        elif "extract structured event" in system_content:
+            day = 1 + int(hashlib.md5(user_content.encode("utf-8")).hexdigest()[:4], 16) % 28
+            content = json.dumps({"title": user_content[30:70], "start": f"2099-01-{day:02d}T19:00", "end": None,
+                                  "city": "Санкт-Петербург", "venue": "Дом музыки", "category": "concert", "price": 500},
+                                 ensure_ascii=False)
+        else:
+            digest = hashlib.md5(user_content.encode("utf-8")).hexdigest()[:8]
+            content = f"summary {digest}"
+
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = max(1, len(content) // 4)
+        self.count("completions")
+        self.count("prompt_tokens", prompt_tokens)
+        self.count("completion_tokens", completion_tokens)
+        return 200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or "fake-model",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+
+class FakeTelegramServer(FakeServer):
+    """Fake Telegram Bot API, base url for clients is ``<url>/bot``"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.counters.update({"sendMessage": 0, "sendPhoto": 0, "sendMediaGroup": 0})
+        self.message_id = 0
+
+    def _message(self, chat_id, **fields) -> Dict[str, Any]:
+        with self.lock:
+            self.message_id += 1
+            message_id = self.message_id
+        return {"message_id": message_id, "date": int(time.time()),
+                "chat": {"id": int(chat_id or 0), "type": "private"}, **fields}
+
+    def handle(self, method, path, query, body):
+        params = {**query, **body}
+        api_method = path.rsplit("/", 1)[-1]
+        if api_method in self.counters:
+            self.count(api_method)
+
+        if api_method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}}
+        if api_method in ("setWebhook", "deleteWebhook"):
+            return 200, {"ok": True, "result": True}
+        if api_method == "sendMessage":
+            return 200, {"ok": True, "result": self._message(params.get("chat_id"), text=params.get("text", ""))}
+        if api_method == "sendPhoto":
+            file_id = "fake-" + hashlib.md5(str(params.get("photo")).encode("utf-8")).hexdigest()
+            photo = [{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}]
+            return 200, {"ok": True, "result": self._message(params.get("chat_id"), photo=photo)}
+        if api_method == "sendMediaGroup":
+            media = params.get("media") or []
+            if isinstance(media, str):
+                media = json.loads(media)
+            results = []
+            for item in media:
+                file_id = "fake-" + hashlib.md5(str(item.get("media")).encode("utf-8")).hexdigest()
+                photo = [{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}]
+                results.append(self._message(params.get("chat_id"), photo=photo))
+            return 200, {"ok": True, "result": results}
+
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
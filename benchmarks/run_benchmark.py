@@ -0,0 +1,178 @@
+"""End-to-end throughput benchmark for the scheduled ingest/classify/notify cycle
+
+Runs scripted workloads against local fake VK, AI and Telegram servers and
+writes a JSON report for regression tracking::
+
+    python -m benchmarks.run_benchmark --workloads benchmarks/workloads.yaml --output benchmark_results.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+import yaml
+
+from benchmarks.fake_servers import FakeAIServer, FakeTelegramServer, FakeVKServer
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def build_config(workload: Dict[str, Any], vk: FakeVKServer, ai: FakeAIServer, telegram: FakeTelegramServer,
+                 data_dir: str) -> Dict[str, Any]:
+    """Bot configuration pointing every client at the fake servers and every store at data_dir"""
+    config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "config", "config.yaml")
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    config["vk"].update({
+        "access_token": "fake-vk-token",
+        "api_base_url": f"{vk.url}/method",
+        "keywords": workload.get("keywords", ["концерт"]),
+        "ingest_mode": "poll",
+    })
+    config["telegram"].update({
+        "bot_token": "123456:fake-telegram-token",
+        "api_base_url": f"{telegram.url}/bot",
+    })
+    config["telegram"].setdefault("rich_notifications", {})["media_cache_path"] = os.path.join(data_dir, "media.db")
+    config["ai"]["providers"] = [
+        {"name": "siliconflow", "api_key": "fake-ai-key", "model": "fake-model",
+         "api_url": f"{ai.url}/v1/chat/completions"}
+    ]
+    config.setdefault("system", {}).setdefault("queue", {})["path"] = os.path.join(data_dir, "pipeline.db")
+    config["system"]["state_path"] = os.path.join(data_dir, "state.db")
+    config["system"]["catalogue_path"] = os.path.join(data_dir, "events.db")
+    config["system"]["cache_snapshot_path"] = os.path.join(data_dir, "activity_cache.json")
+    config["system"]["fast_start"] = {"enabled": False}
+    # 基准测试在一轮内统计推送，不等待聚合窗口
+    config["system"].setdefault("clustering", {}).update({"path": os.path.join(data_dir, "clusters.db"),
+                                                          "window_seconds": 0})
+    config["ai"].setdefault("translation", {})["memory_path"] = os.path.join(data_dir, "translations.db")
+    for section, overrides in workload.get("config", {}).items():
+        config.setdefault(section, {}).update(overrides)
+    return config
+
+
+def run_workload(workload: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one workload and return its metrics"""
+    from src.main import VKTelegramBot
+
+    seed = workload.get("seed", 0)
+    vk = FakeVKServer(posts_per_search=workload.get("posts_per_search", 100),
+                      activity_ratio=workload.get("activity_ratio", 0.2),
+                      latency_ms=workload.get("vk_latency_ms", 0),
+                      rate_limit_rate=workload.get("vk_429_rate", 0), seed=seed).start()
+    ai = FakeAIServer(latency_ms=workload.get("ai_latency_ms", 0),
+                      rate_limit_rate=workload.get("ai_429_rate", 0), seed=seed).start()
+    telegram = FakeTelegramServer(latency_ms=workload.get("telegram_latency_ms", 0),
+                                  rate_limit_rate=workload.get("telegram_429_rate", 0), seed=seed).start()
+
+    data_dir = tempfile.mkdtemp(prefix="vknews-bench-")
+    config_file = tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False, encoding="utf-8")
+    try:
+        yaml.safe_dump(build_config(workload, vk, ai, telegram, data_dir), config_file, allow_unicode=True)
+        config_file.close()
+
+        bot = VKTelegramBot(config_path=config_file.name)
+        for chat_id in range(1, workload.get("subscribers", 10) + 1):
+            bot.state_store.add_subscriber(chat_id)
+
+        cycles = workload.get("cycles", 5)
+        new_posts_per_cycle = workload.get("new_posts_per_cycle", 20)
+        cycle_latencies = []
+        posts_fetched = 0
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        for _ in range(cycles):
+            cycle_start = time.perf_counter()
+            posts_fetched += bot._run_cycle()
+            cycle_latencies.append(time.perf_counter() - cycle_start)
+            vk.advance(new_posts_per_cycle)
+        elapsed = time.perf_counter() - started
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        ai_calls = ai.counters["completions"]
+        return {
+            "name": workload.get("name", "unnamed"),
+            "cycles": cycles,
+            "posts_fetched": posts_fetched,
+            "elapsed_s": round(elapsed, 4),
+            "posts_per_s": round(posts_fetched / elapsed, 2) if elapsed else 0.0,
+            "cycle_latency_p50_s": round(percentile(cycle_latencies, 50), 4),
+            "cycle_latency_p99_s": round(percentile(cycle_latencies, 99), 4),
+            "cycle_latency_mean_s": round(statistics.mean(cycle_latencies), 4) if cycle_latencies else 0.0,
+            "ai_calls": ai_calls,
+            "ai_calls_per_post": round(ai_calls / posts_fetched, 4) if posts_fetched else 0.0,
+            "ai_prompt_tokens": ai.counters["prompt_tokens"],
+            "vk_requests": vk.counters["requests"],
+            "vk_rate_limited": vk.counters["rate_limited"],
+            "telegram_requests": telegram.counters["requests"],
+            "peak_traced_memory_bytes": peak_memory,
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+    finally:
+        os.unlink(config_file.name)
+        shutil.rmtree(data_dir, ignore_errors=True)
+        for server in (vk, ai, telegram):
+            server.stop()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run end-to-end throughput benchmarks against fake servers")
+    parser.add_argument("--workloads", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "workloads.yaml"))
+    parser.add_argument("--only", nargs="*", help="Run only the named workloads")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    with open(args.workloads, "r", encoding="utf-8") as f:
+        workloads = yaml.safe_load(f).get("workloads", [])
+    if args.only:
+        workloads = [w for w in workloads if w.get("name") in args.only]
+
+    results = []
+    for workload in workloads:
+        result = run_workload(workload)
+        results.append(result)
+        print(f"{result['name']}: {result['posts_per_s']} posts/s, "
+              f"p50 {result['cycle_latency_p50_s']}s, p99 {result['cycle_latency_p99_s']}s, "
+              f"{result['ai_calls_per_post']} AI calls/post", file=sys.stderr)
+
+    report = {
+        "timestamp": int(time.time()),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,51 @@
+import json
 import logging
+import re
 import requests
-import time
-import random
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List
 
+from src import rate_governor
+from src.profiling import traced
+from src.prompt_builder import count_message_tokens
+
 logger = logging.getLogger(__name__)
 
+# 推理模型（如DeepSeek-R1）会在回答前输出<think>...</think>
+THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+def parse_json_response(response: str) -> Any:
+    """Parse the first JSON object or array from a model response
+    
+    Strips reasoning blocks and markdown code fences that chat models wrap
+    around structured output.
+    
+    Returns:
+        Parsed JSON value, or None if no valid JSON is found
+    """
+    if not response:
+        return None
+    text = THINK_RE.sub("", response)
+    decoder = json.JSONDecoder()
+    for i, char in enumerate(text):
+        if char in "{[":
+            try:
+                value, _ = decoder.raw_decode(text, i)
+                return value
+            except ValueError:
+                continue
+    return None
+
 # Base AI Provider Abstract Class
 class BaseAIProvider(ABC):
     """Abstract base class for AI providers"""
     
-    def __init__(self, api_key: str, model: str = None):
+    name = "ai"
+
+    def __init__(self, api_key: str, model: str = None, api_url: str = None):
         self.api_key = api_key
         self.model = model
+        self.api_url = api_url
         self.max_retries = 3
     
     @abstractmethod
@@ -21,31 +53,46 @@ class BaseAIProvider(ABC):
         """Call AI API and return the response content"""
         pass
     
+    @property
+    def rate_budget(self) -> str:
+        """Token budget of this provider in the rate governor"""
+        return f"ai:{self.name}"
+
     def _execute_with_retry(self, func, *args, **kwargs) -> str:
-        """Execute API call with retry mechanism"""
+        """Execute API call with retry mechanism
+        
+        Every attempt first takes the estimated prompt and completion tokens
+        from the provider budget; 429 responses pause the budget (Retry-After
+        or exponential backoff) instead of sleeping here.
+        """
+        messages = args[0] if args else kwargs.get("messages", [])
+        cost = count_message_tokens(messages) + kwargs.get("max_tokens", 200)
         retry_count = 0
         while retry_count < self.max_retries:
             try:
-                return func(*args, **kwargs)
+                rate_governor.acquire(self.rate_budget, cost)
+                result = func(*args, **kwargs)
+                rate_governor.feedback(self.rate_budget)
+                return result
             except requests.exceptions.RequestException as e:
                 logger.error(f"{self.__class__.__name__} API request failed: {str(e)}")
                 
                 # Check if it's a 429 Too Many Requests error
-                if hasattr(e, 'response') and e.response and e.response.status_code == 429:
+                if hasattr(e, 'response') and e.response is not None and e.response.status_code == 429:
+                    retry_after = e.response.headers.get("Retry-After", "")
+                    rate_governor.feedback(self.rate_budget, throttled=True,
+                                           retry_after=float(retry_after) if retry_after.isdigit() else None)
                     retry_count += 1
                     if retry_count < self.max_retries:
-                        # Calculate exponential backoff with jitter
-                        base_delay = 2 ** retry_count  # Exponential backoff
-                        jitter = random.uniform(0, 1)  # Add random delay to prevent thundering herd
-                        delay = base_delay + jitter
-                        logger.info(f"Rate limited, retrying in {delay:.2f} seconds... (Attempt {retry_count}/{self.max_retries})")
-                        time.sleep(delay)
+                        logger.info(f"Rate limited, retrying... (Attempt {retry_count}/{self.max_retries})")
                         continue
                     else:
                         logger.error("Max retries reached, giving up.")
+                else:
+                    rate_governor.feedback(self.rate_budget, error=True)
                 
                 # Log detailed error information
-                if hasattr(e, 'response') and e.response:
+                if hasattr(e, 'response') and e.response is not None:
                     try:
                         error_detail = e.response.json()
                         logger.error(f"API Error Details: {error_detail}")
@@ -64,10 +111,12 @@ class BaseAIProvider(ABC):
 class OpenRouterAIProvider(BaseAIProvider):
     """OpenRouter AI provider implementation"""
     
-    def __init__(self, api_key: str, model: str = None):
-        super().__init__(api_key, model)
-        self.api_url = "https://openrouter.ai/api/v1/chat/completions"
+    name = "openrouter"
+
+    def __init__(self, api_key: str, model: str = None, api_url: str = None):
+        super().__init__(api_key, model, api_url or "https://openrouter.ai/api/v1/chat/completions")
     
+    @traced("ai.call_api")
     def _call_api(self, messages: List[Dict], max_tokens: int = 200, temperature: float = 0.3) -> str:
         """Call OpenRouter API"""
         headers = {
@@ -97,10 +146,12 @@ class OpenRouterAIProvider(BaseAIProvider):
 class SiliconFlowAIProvider(BaseAIProvider):
     """SiliconFlow AI provider implementation"""
     
-    def __init__(self, api_key: str, model: str = None):
-        super().__init__(api_key, model or "deepseek-chat")
-        self.api_url = "https://api.siliconflow.cn/v1/chat/completions"
+    name = "siliconflow"
+
+    def __init__(self, api_key: str, model: str = None, api_url: str = None):
+        super().__init__(api_key, model or "deepseek-chat", api_url or "https://api.siliconflow.cn/v1/chat/completions")
     
+    @traced("ai.call_api")
     def _call_api(self, messages: List[Dict], max_tokens: int = 200, temperature: float = 0.3) -> str:
         """Call SiliconFlow API"""
         headers = {
@@ -127,17 +178,34 @@ class AIProviderFactory:
     """Factory class to create AI provider instances"""
     
     @staticmethod
-    def create_provider(provider_type: str, api_key: str, model: str = None) -> BaseAIProvider:
-        """Create and return an AI provider instance based on the provider type"""
+    def create_provider(provider_type: str, api_key: str, model: str = None, api_url: str = None) -> BaseAIProvider:
+        """Create and return an AI provider instance based on the provider type
+        
+        Args:
+            api_url: Optional chat completions endpoint overriding the provider default
+        """
         provider_type = provider_type.lower()
         
         if provider_type == "openrouter":
-            return OpenRouterAIProvider(api_key, model)
+            return OpenRouterAIProvider(api_key, model, api_url)
         elif provider_type == "siliconflow":
-            return SiliconFlowAIProvider(api_key, model)
+            return SiliconFlowAIProvider(api_key, model, api_url)
         else:
             raise ValueError(f"Unsupported AI provider: {provider_type}")
 
+def filter_providers(providers: List[Dict]) -> List[Dict]:
+    """Providers that have a name and a non-empty api_key, the others are skipped with a warning"""
+    valid_providers = []
+    for p in providers or []:
+        if p and isinstance(p, dict):
+            # Check if provider has required fields; an unset ${VAR} placeholder is not a key
+            if 'name' in p and p.get('api_key') and not str(p['api_key']).startswith("${"):
+                valid_providers.append(p)
+            else:
+                provider_name = p.get('name', 'Unknown')
+                logger.warning(f"Skipping invalid provider {provider_name}: missing name or api_key")
+    return valid_providers
+
 # AI Processor Class
 class AIProcessor:
     """Main AI processor class that uses AI provider instances"""
@@ -152,18 +220,7 @@ class AIProcessor:
             providers: List of provider configurations with name, api_key, and model
         """
         # Validate and filter providers to ensure only configured ones are used
-        valid_providers = []
-        
-        # Support for multiple providers
-        if providers and len(providers) > 0:
-            for p in providers:
-                if p and isinstance(p, dict):
-                    # Check if provider has required fields
-                    if 'name' in p and 'api_key' in p and p['api_key']:
-                        valid_providers.append(p)
-                    else:
-                        provider_name = p.get('name', 'Unknown')
-                        logger.warning(f"Skipping invalid provider {provider_name}: missing name or api_key")
+        valid_providers = filter_providers(providers)
         
         # If no valid providers from the list, use backward compatibility with single provider
         if not valid_providers:
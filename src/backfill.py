@@ -0,0 +1,184 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backfill_slices (
+    keyword TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    end_time INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    posts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (keyword, start_time, end_time)
+);
+"""
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_SPLIT = "split"
+
+Slice = Tuple[str, int, int]
+
+
+class BackfillCrawler:
+    """Crawls newsfeed.search over a past time range in parallel slices
+
+    The range is cut into fixed slices aligned to ``slice_seconds`` (so
+    overlapping runs reuse each other's checkpoints) for every keyword. Slices
+    are fetched concurrently; the VK rate budget is enforced by VKAPI itself.
+    A slice that still has pages left after ``max_pages`` is split in half
+    until ``min_slice_seconds``, since newsfeed.search only pages through a
+    limited number of results per query. Finished slices are recorded in
+    SQLite, so an interrupted backfill resumes where it stopped.
+    """
+
+    def __init__(self, vk_api, path: str, slice_seconds: int = 6 * 3600, min_slice_seconds: int = 900,
+                 concurrency: int = 4, page_size: int = 200, max_pages: int = 5):
+        """Initialize crawler
+
+        Args:
+            vk_api: VKAPI instance
+            path: SQLite file holding slice checkpoints
+            slice_seconds: Length of the initial time slices
+            min_slice_seconds: Saturated slices are not split below this length
+            concurrency: Number of slices fetched at the same time
+            page_size: Posts per newsfeed.search request (VK allows up to 200)
+            max_pages: Pages fetched per slice before it counts as saturated
+        """
+        self.vk_api = vk_api
+        self.path = path
+        self.slice_seconds = slice_seconds
+        self.min_slice_seconds = min_slice_seconds
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def plan(self, keywords: List[str], start_time: int, end_time: int) -> List[Slice]:
+        """Record the slices covering the range and return those not finished yet"""
+        boundaries = [start_time]
+        boundary = (start_time // self.slice_seconds + 1) * self.slice_seconds
+        while boundary < end_time:
+            boundaries.append(boundary)
+            boundary += self.slice_seconds
+        boundaries.append(end_time)
+        slices = [(keyword, a, b) for keyword in keywords for a, b in zip(boundaries, boundaries[1:])]
+
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO backfill_slices (keyword, start_time, end_time, updated_at) VALUES (?, ?, ?, ?)",
+                [(keyword, a, b, now) for keyword, a, b in slices]
+            )
+            # 之前拆分过的时间片，继续处理它的子片
+            rows = self._conn.execute(
+                "SELECT keyword, start_time, end_time FROM backfill_slices "
+                "WHERE status = ? AND start_time < ? AND end_time > ? ORDER BY start_time DESC",
+                (STATUS_PENDING, end_time, start_time)
+            ).fetchall()
+        wanted = set(keywords)
+        return [tuple(row) for row in rows if row[0] in wanted and row[1] >= start_time and row[2] <= end_time]
+
+    def _mark(self, item: Slice, status: str, posts: int = 0):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE backfill_slices SET status = ?, posts = ?, updated_at = ? "
+                "WHERE keyword = ? AND start_time = ? AND end_time = ?",
+                (status, posts, time.time(), *item)
+            )
+
+    def _split(self, item: Slice) -> List[Slice]:
+        keyword, start_time, end_time = item
+        middle = (start_time + end_time) // 2
+        halves = [(keyword, start_time, middle), (keyword, middle, end_time)]
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO backfill_slices (keyword, start_time, end_time, updated_at) VALUES (?, ?, ?, ?)",
+                [(*half, now) for half in halves]
+            )
+        self._mark(item, STATUS_SPLIT)
+        return halves
+
+    def _fetch_slice(self, item: Slice) -> Tuple[List[Dict[str, Any]], bool]:
+        """Fetch all pages of one slice, returns (posts, True if pages were left over)"""
+        keyword, start_time, end_time = item
+        posts = []
+        start_from = None
+        for _ in range(self.max_pages):
+            # 请求失败时抛出异常，时间片保持pending，而不是被当作没有帖子而记为完成
+            items, start_from = self.vk_api.get_newsfeed(count=self.page_size, keyword=keyword, start_time=start_time,
+                                                         end_time=end_time, start_from=start_from, raise_errors=True)
+            posts.extend(items)
+            if not start_from or not items:
+                return posts, False
+        return posts, True
+
+    def run(self, keywords: List[str], start_time: int, end_time: int,
+            on_posts: Callable[[List[Dict[str, Any]]], Any]) -> Dict[str, int]:
+        """Crawl the range, passing each slice's posts to on_posts before checkpointing it
+
+        on_posts is called from the calling thread only, one slice at a time.
+        """
+        pending = self.plan(keywords, start_time, end_time)
+        stats = {"slices": 0, "split": 0, "failed": 0, "posts": 0}
+        logger.info(f"Backfill: {len(pending)} slices pending for {len(keywords)} keywords")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            running = {}
+            while pending or running:
+                while pending and len(running) < self.concurrency:
+                    item = pending.pop(0)
+                    running[executor.submit(self._fetch_slice, item)] = item
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = running.pop(future)
+                    try:
+                        posts, saturated = future.result()
+                    except Exception as e:
+                        # 失败的时间片保持pending，下次运行时重试
+                        stats["failed"] += 1
+                        logger.error(f"Backfill slice {item} failed: {str(e)}")
+                        continue
+
+                    if saturated and item[2] - item[1] > self.min_slice_seconds:
+                        # 已取到的帖子照常入队，再拆成两半补齐剩余部分
+                        on_posts(posts)
+                        pending[:0] = self._split(item)
+                        stats["split"] += 1
+                        stats["posts"] += len(posts)
+                        continue
+
+                    on_posts(posts)
+                    self._mark(item, STATUS_DONE, len(posts))
+                    stats["slices"] += 1
+                    stats["posts"] += len(posts)
+                    logger.info(f"Backfill slice {item[0]} {item[1]}-{item[2]}: {len(posts)} posts")
+
+        logger.info(f"Backfill finished: {stats}")
+        return stats
+
+    def progress(self) -> Dict[str, int]:
+        """Number of slices per status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM backfill_slices GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
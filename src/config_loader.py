@@ -0,0 +1,304 @@
+import logging
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+ENV_VAR_RE = re.compile(r"\$\{([^}]+)\}")
+NUMBER = (int, float)
+
+
+class ConfigError(ValueError):
+    """Raised when the configuration file cannot be loaded or does not match the schema"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("Invalid configuration: " + "; ".join(errors))
+
+
+class Field:
+    """Expected type and constraints of one config value"""
+
+    def __init__(self, types, required: bool = False, choices: Tuple = None, minimum: float = None,
+                 item_type=None, item_schema: Dict[str, Any] = None):
+        self.types = types if isinstance(types, tuple) else (types,)
+        self.required = required
+        self.choices = choices
+        self.minimum = minimum
+        self.item_type = item_type
+        self.item_schema = item_schema
+
+    def check(self, value: Any, path: str) -> List[str]:
+        if value is None:
+            return [f"{path} is required"] if self.required else []
+        # bool是int的子类，数值字段不接受true/false
+        if not isinstance(value, self.types) or (isinstance(value, bool) and bool not in self.types):
+            expected = " or ".join(t.__name__ for t in self.types)
+            return [f"{path} must be {expected}, got {type(value).__name__}"]
+        errors = []
+        if self.choices and value not in self.choices:
+            errors.append(f"{path} must be one of {', '.join(map(str, self.choices))}, got {value!r}")
+        if self.minimum is not None and value < self.minimum:
+            errors.append(f"{path} must be >= {self.minimum}, got {value}")
+        if isinstance(value, list):
+            for i, item in enumerate(value):
+                if self.item_schema is not None:
+                    errors.extend(validate_config(item, self.item_schema, f"{path}[{i}]"))
+                elif self.item_type and not isinstance(item, self.item_type):
+                    item_types = self.item_type if isinstance(self.item_type, tuple) else (self.item_type,)
+                    errors.append(f"{path}[{i}] must be {' or '.join(t.__name__ for t in item_types)}")
+        return errors
+
+
+SHADOW_CANDIDATE_SCHEMA = {
+    "name": Field(str, required=True, choices=("local", "siliconflow", "openrouter")),
+    "api_key": Field(str),
+    "model": Field(str),
+    "api_url": Field(str),
+    "price_per_1k_tokens": Field(NUMBER, minimum=0),
+    "min_facts": Field(int, minimum=1),
+}
+
+PROVIDER_SCHEMA = {
+    "name": Field(str, required=True, choices=("siliconflow", "openrouter")),
+    "api_key": Field(str, required=True),
+    "model": Field(str, required=True),
+    "api_url": Field(str),
+}
+
+# 只校验已知的键，未知的键原样保留
+CONFIG_SCHEMA = {
+    "vk": {
+        "access_token": Field(str),
+        "access_tokens": Field(list, item_type=str),
+        "token_quota_cooldown": Field(NUMBER, minimum=0),
+        "token_revoked_cooldown": Field(NUMBER, minimum=0),
+        "api_version": Field(str),
+        "api_base_url": Field(str),
+        "keywords": Field(list, item_type=str),
+        "ingest_mode": Field(str, choices=("poll", "stream")),
+        "archive": {
+            "mode": Field(str, choices=("off", "record", "replay")),
+            "path": Field(str),
+        },
+        "streaming": {
+            "endpoint": Field(str),
+            "key": Field(str),
+            "secure": Field(bool),
+            "reconnect_delay": Field(NUMBER, minimum=0),
+            "max_reconnect_delay": Field(NUMBER, minimum=0),
+            "batch_size": Field(int, minimum=1),
+        },
+    },
+    "telegram": {
+        "bot_token": Field(str, required=True),
+        "webhook_url": Field(str),
+        "webhook_port": Field(int, minimum=1),
+        "api_base_url": Field(str),
+        "admin_chat_ids": Field(list, item_type=(int, str)),
+        "rich_notifications": {
+            "enabled": Field(bool),
+            "media_cache_path": Field(str),
+            "media_retention_days": Field(NUMBER, minimum=0),
+            "max_photos": Field(int, minimum=1),
+            "excerpt_length": Field(int, minimum=0),
+        },
+    },
+    "ai": {
+        "providers": Field(list, required=True, item_schema=PROVIDER_SCHEMA),
+        "prompt": {
+            "token_budget": Field(int, minimum=50),
+            "price_per_1k_tokens": Field(NUMBER, minimum=0),
+            "cached_price_per_1k_tokens": Field(NUMBER, minimum=0),
+            "tokens_per_second": Field(NUMBER, minimum=0),
+        },
+        "translation": {
+            "memory_path": Field(str),
+            "max_batch_tokens": Field(int, minimum=1),
+            "max_output_tokens": Field(int, minimum=1),
+        },
+        "shadow": {
+            "enabled": Field(bool),
+            "sample_rate": Field(NUMBER, minimum=0),
+            "path": Field(str),
+            "max_pending": Field(int, minimum=1),
+            "candidates": Field(list, item_schema=SHADOW_CANDIDATE_SCHEMA),
+        },
+        "extraction": {
+            "enabled": Field(bool),
+            "undated_ttl": Field(NUMBER, minimum=0),
+        },
+        "summary": {
+            "zh_max_length": Field(int, minimum=1),
+            "ru_max_length": Field(int, minimum=1),
+            "ru_mode": Field(str, choices=("extractive", "llm")),
+            "language": Field(str),
+            "batch_size": Field(int, minimum=1),
+            "max_batch_size": Field(int, minimum=1),
+            "target_latency": Field(NUMBER, minimum=0),
+            "max_retries": Field(int, minimum=0),
+        },
+    },
+    "system": {
+        "fetch_interval": Field(NUMBER, minimum=0),
+        "max_content_per_fetch": Field(int, minimum=1),
+        "cache_enabled": Field(bool),
+        "cache_snapshot_path": Field(str),
+        "cache": {
+            "activity_ttl": Field(NUMBER, minimum=0),
+            "non_activity_ttl": Field(NUMBER, minimum=0),
+        },
+        "fast_start": {"enabled": Field(bool)},
+        "config_reload": {
+            "watch": Field(bool),
+            "interval": Field(NUMBER, minimum=0.1),
+        },
+        "log_level": Field(str),
+        "rate_limits": {
+            "vk_requests_per_second": Field(NUMBER, minimum=0),
+            "telegram_messages_per_second": Field(NUMBER, minimum=0),
+            "ai_tokens_per_minute": Field(dict),
+        },
+        "queue": {
+            "path": Field(str),
+            "lease_seconds": Field(NUMBER, minimum=1),
+            "max_attempts": Field(int, minimum=1),
+            "batch_size": Field(int, minimum=1),
+            "poll_interval": Field(NUMBER, minimum=0),
+            "retention_days": Field(NUMBER, minimum=0),
+            "purge_interval": Field(NUMBER, minimum=1),
+        },
+        "priority": {
+            "weights": Field(dict),
+            "freshness_half_life": Field(NUMBER, minimum=1),
+            "urgency_horizon": Field(NUMBER, minimum=1),
+            "backlog_limit": Field(int, minimum=0),
+            "drop_below": Field(NUMBER, minimum=0),
+            "busy_delay": Field(NUMBER, minimum=0),
+            "defer_below": Field(NUMBER, minimum=0),
+            "defer_seconds": Field(NUMBER, minimum=0),
+        },
+        "backfill": {
+            "checkpoint_path": Field(str),
+            "slice_hours": Field(NUMBER, minimum=0.1),
+            "min_slice_minutes": Field(NUMBER, minimum=1),
+            "concurrency": Field(int, minimum=1),
+            "max_pages": Field(int, minimum=1),
+            "priority_penalty": Field(NUMBER, minimum=0),
+        },
+        "post_index": {
+            "enabled": Field(bool),
+            "dim": Field(int, minimum=16),
+            "max_age_hours": Field(NUMBER, minimum=0),
+            "max_items": Field(int, minimum=1),
+            "ann": Field(bool),
+            "results": Field(int, minimum=1),
+            "min_results": Field(int, minimum=0),
+            "min_score": Field(NUMBER, minimum=0),
+            "refresh_interval": Field(NUMBER, minimum=1),
+        },
+        "state_path": Field(str),
+        "catalogue_path": Field(str),
+        "events_per_query": Field(int, minimum=1),
+        "clustering": {
+            "enabled": Field(bool),
+            "path": Field(str),
+            "window_seconds": Field(NUMBER, minimum=0),
+            "threshold": Field(NUMBER, minimum=0),
+            "venue_threshold": Field(NUMBER, minimum=0),
+            "retention_days": Field(NUMBER, minimum=0),
+        },
+        "profiling": {
+            "enabled": Field(bool),
+            "trace_file": Field(str),
+        },
+    },
+}
+
+
+def resolve_env_vars(value: Any, missing: List[str] = None) -> Tuple[Any, List[str]]:
+    """Replace ${NAME} placeholders in the string values of parsed config with environment variables
+
+    Only values are substituted, so placeholders in YAML comments are ignored
+    and a variable's content can never change the structure of the file.
+
+    Returns:
+        (resolved value, names of variables that are not set)
+    """
+    missing = [] if missing is None else missing
+
+    def replace(match):
+        env_value = os.getenv(match.group(1))
+        if env_value is None:
+            missing.append(match.group(1))
+            return match.group(0)
+        return env_value
+
+    if isinstance(value, str):
+        return ENV_VAR_RE.sub(replace, value), missing
+    if isinstance(value, dict):
+        return {key: resolve_env_vars(item, missing)[0] for key, item in value.items()}, missing
+    if isinstance(value, list):
+        return [resolve_env_vars(item, missing)[0] for item in value], missing
+    return value, missing
+
+
+def validate_config(config: Any, schema: Dict[str, Any] = None, path: str = "") -> List[str]:
+    """Check a config dict against the schema, returns a list of error messages"""
+    schema = CONFIG_SCHEMA if schema is None else schema
+    if not isinstance(config, dict):
+        return [f"{path or 'config'} must be a mapping"]
+
+    errors = []
+    for key, expected in schema.items():
+        key_path = f"{path}.{key}" if path else key
+        value = config.get(key)
+        if isinstance(expected, Field):
+            errors.extend(expected.check(value, key_path))
+        elif value is not None:
+            errors.extend(validate_config(value, expected, key_path))
+    return errors
+
+
+def load_config(path: str) -> Dict[str, Any]:
+    """Load config.yaml, resolve environment variables and validate it
+
+    Raises:
+        ConfigError: If the file is missing, is not valid YAML or does not match the schema
+    """
+    if not os.path.exists(path):
+        raise ConfigError([f"config file not found: {path}"])
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+    except yaml.YAMLError as e:
+        raise ConfigError([f"invalid YAML: {str(e)}"])
+
+    # 先解析再替换取值中的占位符，注释中的占位符不会被当作缺失的变量
+    config, missing = resolve_env_vars(config)
+    if missing:
+        # 只记录变量名，不输出任何取值
+        logger.warning(f"Environment variables not set: {', '.join(sorted(set(missing)))}")
+
+    errors = validate_config(config)
+    if errors:
+        raise ConfigError(errors)
+    return config
+
+
+def changed_sections(old: Dict[str, Any], new: Dict[str, Any], prefix: str = "") -> List[str]:
+    """Dotted paths of the leaf values that differ between two configs"""
+    changed = []
+    for key in sorted(set(old or {}) | set(new or {})):
+        old_value = (old or {}).get(key)
+        new_value = (new or {}).get(key)
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            changed.extend(changed_sections(old_value, new_value, path))
+        elif old_value != new_value:
+            changed.append(path)
+    return changed
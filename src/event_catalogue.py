@@ -0,0 +1,201 @@
+import datetime
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    description TEXT,
+    start_ts REAL,
+    end_ts REAL,
+    city TEXT,
+    venue TEXT,
+    category TEXT,
+    price REAL,
+    published_ts REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_city_start ON events (city, start_ts);
+CREATE INDEX IF NOT EXISTS idx_events_start ON events (start_ts);
+CREATE INDEX IF NOT EXISTS idx_events_category_start ON events (category, start_ts);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+    title, description, venue, content='events', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS events_ai AFTER INSERT ON events BEGIN
+    INSERT INTO events_fts (rowid, title, description, venue) VALUES (new.id, new.title, new.description, new.venue);
+END;
+CREATE TRIGGER IF NOT EXISTS events_ad AFTER DELETE ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, title, description, venue) VALUES ('delete', old.id, old.title, old.description, old.venue);
+END;
+CREATE TRIGGER IF NOT EXISTS events_au AFTER UPDATE ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, title, description, venue) VALUES ('delete', old.id, old.title, old.description, old.venue);
+    INSERT INTO events_fts (rowid, title, description, venue) VALUES (new.id, new.title, new.description, new.venue);
+END;
+"""
+
+EVENT_FIELDS = ("url", "title", "description", "start_ts", "end_ts", "city", "venue", "category", "price", "published_ts")
+QUERY_TERM_RE = re.compile(r"\w+")
+# 俄语词形变化多，查询词截断后做前缀匹配
+QUERY_STEM_LENGTH = 5
+
+
+class EventCatalogue:
+    """Local catalogue of extracted events indexed by full text, date, city and category
+
+    Events without a known date are kept for ``undated_ttl`` seconds after
+    they were added; dated events expire once they are over.
+    """
+
+    def __init__(self, path: str, undated_ttl: float = 7 * 86400):
+        self.path = path
+        self.undated_ttl = undated_ttl
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            # SQLite未编译FTS5时退回LIKE查询
+            logger.warning(f"FTS5 not available, falling back to LIKE search: {str(e)}")
+            self.fts_enabled = False
+        logger.info(f"Event catalogue opened: {path}")
+
+    def upsert(self, event: Dict[str, Any]) -> Optional[int]:
+        """Insert or update an event keyed by its source URL, returns the event id"""
+        if not event.get("url") or not event.get("title"):
+            return None
+        values = [event.get(field) for field in EVENT_FIELDS]
+        updates = ", ".join(f"{field} = excluded.{field}" for field in EVENT_FIELDS[1:])
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO events ({', '.join(EVENT_FIELDS)}, created_at) VALUES ({', '.join('?' * len(EVENT_FIELDS))}, ?) "
+                f"ON CONFLICT(url) DO UPDATE SET {updates}",
+                (*values, time.time())
+            )
+            row = self._conn.execute("SELECT id FROM events WHERE url = ?", (event["url"],)).fetchone()
+        return row["id"] if row else None
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM events WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def search(self, query: str = None, city: str = None, category: str = None,
+               start_ts: float = None, end_ts: float = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Find upcoming events
+
+        Args:
+            query: Free text matched against title, description and venue
+            city: Exact (normalized) city name
+            category: Event category
+            start_ts: Only events still running at or after this time (default: now)
+            end_ts: Only events starting before this time
+            limit: Maximum number of events
+        """
+        now = time.time()
+        start_ts = start_ts or now
+        conditions = ["(COALESCE(e.end_ts, e.start_ts) >= ? OR (e.start_ts IS NULL AND e.created_at >= ?))"]
+        params: List[Any] = [start_ts, now - self.undated_ttl]
+        joins = ""
+
+        terms = [t[:QUERY_STEM_LENGTH] for t in QUERY_TERM_RE.findall((query or "").lower())]
+        if terms:
+            if self.fts_enabled:
+                joins = "JOIN events_fts f ON f.rowid = e.id"
+                conditions.append("events_fts MATCH ?")
+                params.append(" ".join(f'"{t}"*' for t in terms))
+            else:
+                for term in terms:
+                    conditions.append("(LOWER(e.title) LIKE ? OR LOWER(e.description) LIKE ? OR LOWER(e.venue) LIKE ?)")
+                    params.extend([f"%{term}%"] * 3)
+        if city:
+            conditions.append("e.city = ?")
+            params.append(city)
+        if category:
+            conditions.append("e.category = ?")
+            params.append(category)
+        if end_ts:
+            conditions.append("e.start_ts < ?")
+            params.append(end_ts)
+
+        sql = (f"SELECT e.* FROM events e {joins} WHERE {' AND '.join(conditions)} "
+               f"ORDER BY e.start_ts IS NULL, e.start_ts LIMIT ?")
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def expire(self, grace: float = 3600) -> int:
+        """Delete events that ended more than grace seconds ago, returns number of deleted events"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM events WHERE COALESCE(end_ts, start_ts) < ? OR (start_ts IS NULL AND created_at < ?)",
+                (now - grace, now - self.undated_ttl)
+            )
+        if cursor.rowcount:
+            logger.info(f"Expired {cursor.rowcount} past events from catalogue")
+        return cursor.rowcount
+
+
+# 查询中的城市、类别和时间提示词
+QUERY_CITIES = {
+    "спб": "Санкт-Петербург", "питер": "Санкт-Петербург", "петербург": "Санкт-Петербург",
+    "санкт": "Санкт-Петербург", "москв": "Москва", "мск": "Москва",
+}
+QUERY_CATEGORIES = {
+    "концерт": "concert", "выставк": "exhibition", "лекци": "lecture", "спектакл": "theatre",
+    "театр": "theatre", "фестивал": "festival", "экскурси": "excursion", "мастер": "workshop",
+}
+
+
+def parse_event_query(text: str, now: float = None) -> Dict[str, Any]:
+    """Turn a free-form user query like "концерты на выходных в спб" into catalogue search filters"""
+    today = datetime.datetime.fromtimestamp(now or time.time()).replace(hour=0, minute=0, second=0, microsecond=0)
+    filters: Dict[str, Any] = {}
+    remaining = []
+
+    for word in QUERY_TERM_RE.findall((text or "").lower()):
+        city = next((name for prefix, name in QUERY_CITIES.items() if word.startswith(prefix)), None)
+        category = next((name for prefix, name in QUERY_CATEGORIES.items() if word.startswith(prefix)), None)
+        if city:
+            filters["city"] = city
+        elif category:
+            filters["category"] = category
+        elif word == "сегодня":
+            filters["end_ts"] = (today + datetime.timedelta(days=1)).timestamp()
+        elif word == "завтра":
+            filters["start_ts"] = (today + datetime.timedelta(days=1)).timestamp()
+            filters["end_ts"] = (today + datetime.timedelta(days=2)).timestamp()
+        elif word.startswith("выходн"):
+            # 周日时saturday为昨天，仍覆盖本周末剩余时间
+            saturday = today + datetime.timedelta(days=5 - today.weekday())
+            filters["start_ts"] = max(saturday.timestamp(), now or time.time())
+            filters["end_ts"] = (saturday + datetime.timedelta(days=2)).timestamp()
+        elif word.startswith("недел"):
+            filters["end_ts"] = (today + datetime.timedelta(days=7)).timestamp()
+        elif word not in ("в", "на", "во", "этой", "эти", "ближайшие", "что", "где", "куда", "сходить"):
+            remaining.append(word)
+
+    filters["query"] = " ".join(remaining)
+    return filters
@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.extractive_summarizer import STOPWORDS
+from src.prompt_builder import clean_post_text
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clusters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    signature BLOB NOT NULL,
+    start_ts REAL,
+    title TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cluster_members (
+    url TEXT PRIMARY KEY,
+    cluster_id INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cluster_members_cluster ON cluster_members (cluster_id, added_at);
+CREATE TABLE IF NOT EXISTS cluster_keys (
+    key TEXT NOT NULL,
+    cluster_id INTEGER NOT NULL,
+    PRIMARY KEY (key, cluster_id)
+);
+"""
+
+WORD_RE = re.compile(r"[^\W_]{2,}")
+STEM_LENGTH = 6
+# 空文本的签名值，大于任何置换后的哈希值（32位）
+EMPTY_HASH = (1 << 61) - 1
+# 同一活动的不同帖子，开始时间相差不超过此值（秒）
+SAME_EVENT_TIME_TOLERANCE = 6 * 3600
+
+
+class EventClusterer:
+    """Groups posts announcing the same event across sources
+
+    Each post gets a MinHash signature over its word shingles. Candidate
+    clusters are found through LSH band keys and a (day, venue) blocking key
+    stored in indexed SQLite tables, so assigning a post costs a few index
+    lookups instead of a comparison with every earlier post.
+    """
+
+    def __init__(self, path: str, num_perm: int = 64, bands: int = 16, threshold: float = 0.5,
+                 venue_threshold: float = 0.15, retention: float = 14 * 86400):
+        """Initialize clusterer
+
+        Args:
+            path: SQLite file holding clusters and their index keys
+            num_perm: MinHash signature length
+            bands: LSH bands (num_perm must be divisible by bands)
+            threshold: Estimated Jaccard similarity needed to join a cluster
+            venue_threshold: Lower similarity accepted when date and venue match
+            retention: Seconds after which clusters are forgotten
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.venue_threshold = venue_threshold
+        self.retention = retention
+        self._lock = threading.Lock()
+
+        # multiply-shift哈希族：(a*x + b) mod 2^64 取高32位，a为奇数；
+        # 系数太小（不取模回绕）时各置换的最小值都落在同一个shingle上，相似度估计失真
+        rng = np.random.RandomState(42)
+        self._a = rng.randint(0, 2 ** 64 - 1, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.randint(0, 2 ** 64 - 1, size=num_perm, dtype=np.uint64)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def shingles(text: str) -> set:
+        """Stemmed words and word bigrams of a post"""
+        words = [w[:STEM_LENGTH] for w in WORD_RE.findall(clean_post_text(text).lower()) if w not in STOPWORDS]
+        return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = self.shingles(text)
+        if not shingles:
+            return np.full(self.num_perm, EMPTY_HASH, dtype=np.uint64)
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+        permuted = (np.outer(hashes, self._a) + self._b) >> np.uint64(32)
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[str]:
+        return [
+            f"b{i}:" + hashlib.md5(signature[i * self.rows:(i + 1) * self.rows].tobytes()).hexdigest()[:16]
+            for i in range(self.bands)
+        ]
+
+    @staticmethod
+    def _venue_key(event: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not event or not event.get("start_ts") or not event.get("venue"):
+            return None
+        venue_words = [w[:STEM_LENGTH] for w in WORD_RE.findall(event["venue"].lower())][:2]
+        if not venue_words:
+            return None
+        day = int(event["start_ts"] // 86400)
+        return f"v:{day}:{'_'.join(venue_words)}"
+
+    def assign(self, url: str, text: str, event: Optional[Dict[str, Any]] = None) -> Tuple[int, bool]:
+        """Put a post into an existing cluster or a new one
+
+        Returns:
+            (cluster id, True if the post started the cluster)
+        """
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+        venue_key = self._venue_key(event)
+        start_ts = (event or {}).get("start_ts")
+
+        with self._lock:
+            row = self._conn.execute("SELECT cluster_id FROM cluster_members WHERE url = ?", (url,)).fetchone()
+            if row:
+                # 重试时仍视创建该簇的帖子为新活动，保证推送任务入队
+                first = self._conn.execute(
+                    "SELECT url FROM cluster_members WHERE cluster_id = ? ORDER BY added_at LIMIT 1", (row[0],)
+                ).fetchone()
+                return row[0], first[0] == url
+
+            keys = band_keys + ([venue_key] if venue_key else [])
+            placeholders = ",".join("?" * len(keys))
+            candidates = self._conn.execute(
+                f"SELECT c.id, c.signature, c.start_ts, k.key FROM cluster_keys k JOIN clusters c ON c.id = k.cluster_id "
+                f"WHERE k.key IN ({placeholders})", keys
+            ).fetchall()
+
+            best_id, best_score = None, 0.0
+            for cluster_id, blob, cluster_start, key in candidates:
+                if start_ts and cluster_start and abs(start_ts - cluster_start) > SAME_EVENT_TIME_TOLERANCE:
+                    continue
+                similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint64) == signature))
+                required = self.venue_threshold if key == venue_key else self.threshold
+                if similarity >= required and similarity > best_score:
+                    best_id, best_score = cluster_id, similarity
+
+            now = time.time()
+            is_new = best_id is None
+            if is_new:
+                cursor = self._conn.execute(
+                    "INSERT INTO clusters (signature, start_ts, title, created_at) VALUES (?, ?, ?, ?)",
+                    (signature.tobytes(), start_ts, (event or {}).get("title"), now)
+                )
+                best_id = cursor.lastrowid
+                self._conn.executemany("INSERT OR IGNORE INTO cluster_keys (key, cluster_id) VALUES (?, ?)",
+                                       [(key, best_id) for key in keys])
+            self._conn.execute("INSERT OR IGNORE INTO cluster_members (url, cluster_id, added_at) VALUES (?, ?, ?)",
+                               (url, best_id, now))
+
+        if not is_new:
+            logger.info(f"Post {url} joined event cluster {best_id} (similarity {best_score:.2f})")
+        return best_id, is_new
+
+    def members(self, cluster_id: int) -> List[str]:
+        """Source URLs of a cluster in the order they were seen"""
+        with self._lock:
+            rows = self._conn.execute("SELECT url FROM cluster_members WHERE cluster_id = ? ORDER BY added_at",
+                                      (cluster_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def expire(self) -> int:
+        """Forget clusters older than the retention period"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM clusters WHERE created_at < ?", (cutoff,))]
+            for cluster_id in ids:
+                self._conn.execute("DELETE FROM cluster_keys WHERE cluster_id = ?", (cluster_id,))
+                self._conn.execute("DELETE FROM cluster_members WHERE cluster_id = ?", (cluster_id,))
+                self._conn.execute("DELETE FROM clusters WHERE id = ?", (cluster_id,))
+        return len(ids)
@@ -0,0 +1,135 @@
+import datetime
+import json
+import logging
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+from src.ai_api import AIProviderFactory, parse_json_response
+from src.profiling import traced
+from src.prompt_builder import compact_post_text
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ("concert", "exhibition", "lecture", "theatre", "festival", "excursion", "sport",
+              "charity", "volunteer", "workshop", "party", "other")
+
+# 城市名规范化：不同写法映射到统一名称
+CITY_ALIASES = {
+    "москва": "Москва", "moscow": "Москва", "мск": "Москва",
+    "санкт-петербург": "Санкт-Петербург", "saint petersburg": "Санкт-Петербург", "st. petersburg": "Санкт-Петербург",
+    "st petersburg": "Санкт-Петербург", "петербург": "Санкт-Петербург", "спб": "Санкт-Петербург",
+    "питер": "Санкт-Петербург",
+}
+
+EXTRACTION_SYSTEM_PROMPT = (
+    "You extract structured event data from Russian social media posts announcing events. "
+    "Return only a JSON object with the keys: "
+    "\"title\" (short event name in the post language), "
+    "\"start\" and \"end\" (ISO 8601 local date-time \"YYYY-MM-DDTHH:MM\", or \"YYYY-MM-DD\" if no time, null if unknown), "
+    "\"city\", \"venue\" (place name and address, null if unknown), "
+    "\"category\" (one of: " + ", ".join(CATEGORIES) + "), "
+    "\"price\" (minimum ticket price in rubles as a number, 0 if free, null if unknown). "
+    "Resolve relative dates against the publication date given in the input. Do not provide any explanations."
+)
+
+NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def normalize_city(city: Optional[str]) -> Optional[str]:
+    if not city or not isinstance(city, str):
+        return None
+    city = city.strip()
+    return CITY_ALIASES.get(city.lower(), city)
+
+
+def parse_datetime(value: Any) -> Optional[float]:
+    """Parse an ISO date or date-time into a Unix timestamp (local time)"""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value.strip().replace(" ", "T")).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_price(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        match = NUMBER_RE.search(value.replace(" ", ""))
+        if match:
+            return float(match.group(0).replace(",", "."))
+    return None
+
+
+class EventExtractor:
+    """Turns activity posts into structured events with one AI call per post"""
+
+    def __init__(self, ai_providers: List[Dict[str, Any]], token_budget: int = 400):
+        self.ai_providers = ai_providers or []
+        self.token_budget = token_budget
+
+    @traced("text.extract_event")
+    def extract(self, content: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Extract an event from formatted VK content
+
+        Args:
+            content: Content produced by VKAPI.format_content
+
+        Returns:
+            Event dict (title, start_ts, end_ts, city, venue, category, price, url, description),
+            or None if extraction failed
+        """
+        if not self.ai_providers:
+            logger.error("No AI providers configured for event extraction")
+            return None
+
+        published = content.get("date") or 0
+        published_text = datetime.datetime.fromtimestamp(published).strftime("%Y-%m-%d %A") if published else "unknown"
+        messages = [
+            {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps({
+                "published": published_text,
+                "text": compact_post_text(content.get("text", ""), self.token_budget)
+            }, ensure_ascii=False)}
+        ]
+
+        try:
+            selected_provider = random.choice(self.ai_providers)
+            provider_instance = AIProviderFactory.create_provider(
+                selected_provider["name"], selected_provider["api_key"], selected_provider["model"],
+                selected_provider.get("api_url")
+            )
+            response = provider_instance._execute_with_retry(provider_instance._call_api, messages,
+                                                             max_tokens=300, temperature=0.1)
+        except Exception as e:
+            logger.error(f"Failed to extract event: {str(e)}")
+            return None
+
+        data = parse_json_response(response)
+        if not isinstance(data, dict) or not data.get("title"):
+            logger.warning(f"Event extraction returned no event for {content.get('url')}")
+            return None
+        return self.normalize(data, content)
+
+    @staticmethod
+    def normalize(data: Dict[str, Any], content: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate model output into the catalogue event structure"""
+        start_ts = parse_datetime(data.get("start"))
+        end_ts = parse_datetime(data.get("end"))
+        if start_ts and end_ts and end_ts < start_ts:
+            end_ts = None
+        category = str(data.get("category") or "other").lower()
+        return {
+            "url": content.get("url", ""),
+            "title": str(data.get("title")).strip()[:200],
+            "description": compact_post_text(content.get("text", ""), 150),
+            "start_ts": start_ts,
+            "end_ts": end_ts,
+            "city": normalize_city(data.get("city")),
+            "venue": (str(data["venue"]).strip()[:200] if data.get("venue") else None),
+            "category": category if category in CATEGORIES else "other",
+            "price": parse_price(data.get("price")),
+            "published_ts": content.get("date") or None,
+        }
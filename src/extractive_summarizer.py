@@ -0,0 +1,126 @@
+import re
+from typing import List
+
+import numpy as np
+
+from src.prompt_builder import KEY_FACT_RE, SENTENCE_SPLIT_RE, clean_post_text
+
+WORD_RE = re.compile(r"[^\W\d_]{2,}")
+
+# 常见俄语停用词，不参与句子打分
+STOPWORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было вот от меня
+еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж вам ведь там
+потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам чтоб без будто чего раз тоже себе
+под будет ж тогда кто этот того потому этого какой совсем ним здесь этом один почти мой тем чтобы нее сейчас были куда
+зачем всех никогда можно при наконец два об другой хоть после над больше тот через эти нас про всего них какая много
+разве три эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более всегда конечно всю между
+это наш наши вас ваш мы вы
+""".split())
+
+# 俄语词形变化多，按前6个字母做粗略词干化
+STEM_LENGTH = 6
+LEAD_BONUS = 1.5
+KEY_FACT_BONUS = 1.3
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split Russian text into sentences without breaking after common abbreviations"""
+    return [s.strip() for s in SENTENCE_SPLIT_RE.split(text) if s and s.strip()]
+
+
+def truncate_words(text: str, max_length: int) -> str:
+    """Cut text to max_length characters on a word boundary"""
+    if len(text) <= max_length:
+        return text
+    cut = text[:max_length - 1]
+    if " " in cut:
+        cut = cut[:cut.rfind(" ")]
+    return cut.rstrip(" ,;:-—") + "…"
+
+
+class ExtractiveSummarizer:
+    """Offline extractive summarizer scoring sentences with TF-IDF over a whole batch
+
+    Every token occurrence of the batch goes into flat NumPy arrays, so
+    document frequencies, per-document term frequencies and sentence scores
+    are computed with a handful of vectorized operations regardless of the
+    number of posts.
+    """
+
+    def summarize_batch(self, texts: List[str], max_length: int = 60) -> List[str]:
+        """Summarize each text into at most max_length characters"""
+        documents = [split_sentences(clean_post_text(text or "")) for text in texts]
+
+        vocabulary = {}
+        token_ids = []
+        sentence_ids = []
+        sentence_doc = []
+        sentence_meta = []  # (doc index, sentence index within doc)
+        for doc_index, sentences in enumerate(documents):
+            for sent_index, sentence in enumerate(sentences):
+                global_sentence = len(sentence_doc)
+                sentence_doc.append(doc_index)
+                sentence_meta.append((doc_index, sent_index))
+                for word in WORD_RE.findall(sentence.lower()):
+                    if word in STOPWORDS:
+                        continue
+                    token_ids.append(vocabulary.setdefault(word[:STEM_LENGTH], len(vocabulary)))
+                    sentence_ids.append(global_sentence)
+
+        scores = self._score_sentences(np.array(token_ids, dtype=np.int64), np.array(sentence_ids, dtype=np.int64),
+                                       np.array(sentence_doc, dtype=np.int64), len(documents), len(vocabulary))
+
+        # 首句和包含日期/地点的句子加权
+        for i, (doc_index, sent_index) in enumerate(sentence_meta):
+            if sent_index == 0:
+                scores[i] *= LEAD_BONUS
+            if KEY_FACT_RE.search(documents[doc_index][sent_index]):
+                scores[i] *= KEY_FACT_BONUS
+
+        summaries = []
+        offset = 0
+        for sentences in documents:
+            doc_scores = scores[offset:offset + len(sentences)]
+            offset += len(sentences)
+            summaries.append(self._select(sentences, doc_scores, max_length))
+        return summaries
+
+    @staticmethod
+    def _score_sentences(token_ids: np.ndarray, sentence_ids: np.ndarray, sentence_doc: np.ndarray,
+                         n_docs: int, n_terms: int) -> np.ndarray:
+        """Mean TF-IDF weight of the terms of every sentence"""
+        n_sentences = len(sentence_doc)
+        if not len(token_ids):
+            return np.zeros(n_sentences)
+
+        token_doc = sentence_doc[sentence_ids]
+        # (文档, 词)组合编码为单个整数，统计文档内词频和文档频率
+        pair_keys = token_doc * n_terms + token_ids
+        unique_pairs, pair_index, pair_counts = np.unique(pair_keys, return_inverse=True, return_counts=True)
+        document_frequency = np.bincount(unique_pairs % n_terms, minlength=n_terms)
+        idf = np.log((1.0 + n_docs) / (1.0 + document_frequency)) + 1.0
+
+        weights = np.log1p(pair_counts[pair_index]) * idf[token_ids]
+        totals = np.bincount(sentence_ids, weights=weights, minlength=n_sentences)
+        lengths = np.bincount(sentence_ids, minlength=n_sentences)
+        return totals / np.sqrt(np.maximum(lengths, 1))
+
+    @staticmethod
+    def _select(sentences: List[str], scores: np.ndarray, max_length: int) -> str:
+        """Pick the best sentences that fit max_length, keeping original order"""
+        if not sentences:
+            return ""
+        order = np.argsort(-scores, kind="stable")
+        best = int(order[0])
+        if len(sentences[best]) >= max_length:
+            return truncate_words(sentences[best], max_length)
+
+        chosen = []
+        used = 0
+        for index in order:
+            length = len(sentences[index]) + (1 if chosen else 0)
+            if used + length <= max_length:
+                chosen.append(int(index))
+                used += length
+        return " ".join(sentences[i] for i in sorted(chosen))
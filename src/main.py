@@ -1,18 +1,22 @@
-import yaml
+import datetime
 import logging
 import asyncio
+import json
 import os
+import threading
 import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 
 # Import modules
-from src.vk_api import VKAPI
-from src.ai_api import AIProcessor
-from src.text_processor import TextProcessor
-from src.telegram_api import TelegramAPI
-from src.vknew_bot import VKNewBot
+# 依赖较重的模块（requests、telegram、flask、numpy等）在_initialize_modules中按需导入，缩短冷启动时间
+from src import profiling, rate_governor
+from src.config_loader import ConfigError, changed_sections, load_config
+from src.work_queue import WorkQueue, STAGE_CLASSIFY, STAGE_NOTIFY
+from src.state_store import StateStore
+from src.subscriptions import SubscriptionIndex
+from src.post_priority import PostPrioritizer
 
 # 配置日志
 logging.basicConfig(
@@ -25,8 +29,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 运行角色：各阶段可拆分为独立进程，通过共享的队列和状态库协作
+ROLE_ALL = "all"
+CLUSTER_KEY_PREFIX = "cluster:"
+# 富文本推送中活动标题的最大长度，保证标题和时间地点总能放进图片说明
+TITLE_CAPTION_LENGTH = 256
+# 热更新后立即生效的配置，其余配置（路径、端口、令牌等）需重启
+RELOADABLE_PREFIXES = ("vk.keywords", "ai.providers", "telegram.admin_chat_ids", "system.cache.", "system.events_per_query",
+                       "system.queue.batch_size", "system.priority.", "system.clustering.window_seconds",
+                       "system.rate_limits.")
+ROLES = ("webhook", "ingest", "classify", "notify", ROLE_ALL)
+
+# 默认的定时任务关键词列表
+DEFAULT_KEYWORDS = ["афиша СПб", "выставка", "экскурсия", "вечер", "лекция"]
+
 class VKTelegramBot:
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, role: str = ROLE_ALL):
+        """Initialize bot
+
+        Args:
+            config_path: Path to config.yaml, detected automatically if None
+            role: Which pipeline stages this process runs (webhook, ingest, classify, notify or all)
+        """
+        if role not in ROLES:
+            raise ValueError(f"Unsupported role: {role}")
+        self.role = role
+
         # 加载环境变量
         load_dotenv()
         
@@ -44,18 +72,95 @@ class VKTelegramBot:
         else:
             self.config_path = config_path
         
-        self.config = self._load_config()
+        self.startup_timings: Dict[str, float] = {}
+        with self._startup_phase("config"):
+            self.config = self._load_config()
+        self._config_mtime = self._get_config_mtime()
+        self._reload_lock = threading.Lock()
+        self.cache_ttls = self._read_cache_ttls(self.config)
+        profiling_config = self.config.get("system", {}).get("profiling", {})
+        profiling.configure(profiling_config.get("enabled", False), profiling_config.get("trace_file"))
+        self._configure_rate_limits(self.config)
+        self.prioritizer = self._create_prioritizer(self.config)
         self.vk_api = None
         self.ai_processor = None
         self.telegram_api = None
         self.text_processor = None
         self.vknew_bot = None
+        self.streaming_client = None
+        self.vk_archive = None
+        self.work_queue = None
+        self.state_store = None
+        self.event_extractor = None
+        self.event_catalogue = None
+        self.event_clusterer = None
+        self.shadow_evaluator = None
+        self.post_index = None
+        self._post_index_cursor = 0  # webhook角色已从队列读入索引的最大任务ID
+        self.subscription_index = SubscriptionIndex()
         
         # 初始化活动帖子缓存
         self.activity_cache = {}  # 缓存格式：{cache_key: (is_activity, timestamp)}
         
-        # 初始化模块
-        self._initialize_modules()
+        # 快速启动：先绑定webhook端口，其余模块在start()中后台初始化
+        self.fast_start = (self.config.get("system", {}).get("fast_start", {}).get("enabled", False)
+                           and role in (ROLE_ALL, "webhook"))
+        if self.fast_start:
+            self.telegram_api = self._create_telegram_api()
+        else:
+            # 初始化模块
+            self._initialize_modules()
+
+    @contextmanager
+    def _startup_phase(self, name: str):
+        """记录启动阶段耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[name] = round(time.perf_counter() - started, 3)
+
+    def _report_startup(self):
+        """输出各启动阶段的耗时"""
+        total = sum(self.startup_timings.values())
+        breakdown = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.startup_timings.items())
+        logger.info(f"Startup finished in {total:.3f}s ({breakdown})")
+        if self.telegram_api:
+            self.telegram_api.startup_report.update(self.startup_timings)
+
+    def _cache_snapshot_path(self) -> str:
+        return self.config.get("system", {}).get("cache_snapshot_path", "data/activity_cache.json")
+
+    def _load_cache_snapshot(self):
+        """从磁盘快照预热活动判断缓存，跳过已过期的条目"""
+        path = self._cache_snapshot_path()
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            self.activity_cache.update({url: (is_activity, timestamp) for url, is_activity, timestamp in entries})
+            self._clean_expired_cache()
+            logger.info(f"Warmed activity cache with {len(self.activity_cache)} entries from {path}")
+        except Exception as e:
+            logger.warning(f"Failed to load activity cache snapshot: {str(e)}")
+
+    def _save_cache_snapshot(self):
+        """将活动判断缓存写入磁盘快照（先写临时文件再替换，避免中途退出留下损坏的文件）"""
+        path = self._cache_snapshot_path()
+        if not path:
+            return
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            entries = [[url, is_activity, timestamp] for url, (is_activity, timestamp) in list(self.activity_cache.items())]
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to save activity cache snapshot: {str(e)}")
         
     def _is_cached(self, url: str) -> bool:
         """检查帖子是否已缓存且未过期"""
@@ -63,15 +168,10 @@ class VKTelegramBot:
         cache_key = url
         if cache_key in self.activity_cache:
             is_activity, timestamp = self.activity_cache[cache_key]
-            # 根据是否为活动设置不同的缓存时间
-            if is_activity:
-                # 活动帖子缓存5小时
-                if time.time() - timestamp < 18000:  # 5小时 = 18000秒
-                    return True
-            else:
-                # 非活动帖子缓存10分钟
-                if time.time() - timestamp < 600:  # 10分钟 = 600秒
-                    return True
+            # 根据是否为活动设置不同的缓存时间（默认活动帖子5小时，非活动帖子10分钟，可热更新）
+            activity_ttl, non_activity_ttl = self.cache_ttls
+            if time.time() - timestamp < (activity_ttl if is_activity else non_activity_ttl):
+                return True
             # 缓存过期，删除
             del self.activity_cache[cache_key]
         return False
@@ -96,89 +196,257 @@ class VKTelegramBot:
     def _clean_expired_cache(self):
         """清理过期缓存"""
         current_time = time.time()
-        expired_keys = []
-        for key, (is_activity, timestamp) in self.activity_cache.items():
-            if is_activity:
-                # 活动帖子缓存5小时
-                if current_time - timestamp >= 18000:  # 5小时 = 18000秒
-                    expired_keys.append(key)
-            else:
-                # 非活动帖子缓存10分钟
-                if current_time - timestamp >= 600:  # 10分钟 = 600秒
-                    expired_keys.append(key)
+        activity_ttl, non_activity_ttl = self.cache_ttls
+        expired_keys = [
+            key for key, (is_activity, timestamp) in list(self.activity_cache.items())
+            if current_time - timestamp >= (activity_ttl if is_activity else non_activity_ttl)
+        ]
         
         # 删除过期缓存
         for key in expired_keys:
-            del self.activity_cache[key]
+            self.activity_cache.pop(key, None)
     
     def _load_config(self) -> Dict[str, Any]:
-        """Load configuration file and resolve environment variables"""
+        """Load configuration file, resolve environment variables and validate it against the schema"""
         try:
-            if not os.path.exists(self.config_path):
-                logger.error(f"Config file not found: {self.config_path}")
-                raise FileNotFoundError(f"Config file not found: {self.config_path}")
-                
-            with open(self.config_path, "r", encoding="utf-8") as f:
-                config_content = f.read()
-            
-            # 解析环境变量占位符
-            def resolve_env_vars(content):
-                import re
-                pattern = r'\$\{([^}]+)\}'
-                matches = re.findall(pattern, content)
-                for match in matches:
-                    env_value = os.getenv(match, f"${{{match}}}")
-                    # 打印获取到的环境变量的前5位
-                    if not env_value.startswith('${'):
-                        print(f"Environment variable '{match}' value (first 5 chars): {env_value[:5]}...")
-                    content = content.replace(f"${{{match}}}", env_value)
-                return content
-            
-            resolved_content = resolve_env_vars(config_content)
-            config = yaml.safe_load(resolved_content)
-            
+            config = load_config(self.config_path)
             logger.info("Config file loaded and environment variables resolved successfully")
             return config
             
         except Exception as e:
             logger.error(f"Failed to load config file: {str(e)}")
             raise
-    
+
+    def reload_config(self) -> List[str]:
+        """重新加载配置文件，原子地替换关键词、AI提供商和缓存时长，保留所有缓存状态
+
+        Returns:
+            Changed config paths
+
+        Raises:
+            ConfigError: If the new file is invalid; the running config is kept
+        """
+        from src.ai_api import filter_providers
+
+        new_config = load_config(self.config_path)
+        # 与启动时一样，只使用配置了api_key的提供商；一个都没有时保留当前配置
+        providers = filter_providers(new_config.get("ai", {}).get("providers", []))
+        if not providers:
+            raise ConfigError(["ai.providers: no provider has an api_key"])
+        with self._reload_lock:
+            self._config_mtime = self._get_config_mtime()
+            changed = changed_sections(self.config, new_config)
+            if not changed:
+                return []
+
+            # 先构造好所有新值，再逐个替换引用；读取方每次只取一次引用，不会看到新旧混合的配置
+            cache_ttls = self._read_cache_ttls(new_config)
+            self.config = new_config
+            self.cache_ttls = cache_ttls
+            self._configure_rate_limits(new_config)
+            self.prioritizer = self._create_prioritizer(new_config)
+            if self.text_processor:
+                self.text_processor.set_ai_providers(providers)
+            if self.event_extractor:
+                self.event_extractor.ai_providers = providers
+            if self.ai_processor:
+                self.ai_processor.providers = providers
+            if self.vknew_bot:
+                self.vknew_bot.set_config(new_config)
+
+        restart_required = [path for path in changed if not path.startswith(RELOADABLE_PREFIXES)]
+        logger.info(f"Config reloaded, changed: {', '.join(changed)}")
+        if restart_required:
+            logger.warning(f"Changes that take effect after restart: {', '.join(restart_required)}")
+        return changed
+
+    @staticmethod
+    def _configure_rate_limits(config: Dict[str, Any]):
+        """将配置中的VK、Telegram和各AI提供商预算换算为每秒速率交给rate_governor"""
+        limits = config.get("system", {}).get("rate_limits", {})
+        rates = {
+            # 按每个VK令牌计算，令牌池中的每个令牌各有一份预算
+            "vk": limits.get("vk_requests_per_second", 3),
+            "telegram": limits.get("telegram_messages_per_second", 25),
+        }
+        for provider, tokens_per_minute in (limits.get("ai_tokens_per_minute") or {}).items():
+            rates[f"ai:{provider}"] = (tokens_per_minute or 0) / 60.0
+        rate_governor.configure(rates)
+
+    @staticmethod
+    def _create_prioritizer(config: Dict[str, Any]) -> PostPrioritizer:
+        priority_config = config.get("system", {}).get("priority", {})
+        return PostPrioritizer(
+            freshness_half_life=priority_config.get("freshness_half_life", 6 * 3600),
+            urgency_horizon=priority_config.get("urgency_horizon", 14 * 86400),
+            weights=priority_config.get("weights")
+        )
+
+    def _get_config_mtime(self) -> float:
+        try:
+            return os.stat(self.config_path).st_mtime
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _read_cache_ttls(config: Dict[str, Any]):
+        """(活动帖子缓存时长, 非活动帖子缓存时长)，单位秒"""
+        cache_config = config.get("system", {}).get("cache", {})
+        return cache_config.get("activity_ttl", 18000), cache_config.get("non_activity_ttl", 600)
+
+    async def _config_watch_task(self):
+        """监视配置文件修改时间，文件变化时自动重新加载"""
+        import asyncio
+        interval = self.config.get("system", {}).get("config_reload", {}).get("interval", 5)
+        logger.info(f"Watching {self.config_path} for changes")
+        while True:
+            await asyncio.sleep(interval)
+            if self._get_config_mtime() == self._config_mtime:
+                continue
+            try:
+                await asyncio.to_thread(self.reload_config)
+            except Exception as e:
+                # 新配置无效时保留当前配置，直到文件再次修改
+                self._config_mtime = self._get_config_mtime()
+                logger.error(f"Config reload failed, keeping current config: {str(e)}")
+
+    def _create_telegram_api(self):
+        from src.telegram_api import TelegramAPI
+
+        telegram_config = self.config.get("telegram", {})
+        return TelegramAPI(
+            bot_token=telegram_config.get("bot_token"),
+            webhook_url=telegram_config.get("webhook_url"),
+            port=telegram_config.get("webhook_port", 8443),
+            base_url=telegram_config.get("api_base_url")
+        )
+
     def _initialize_modules(self):
         """Initialize all modules"""
         try:
-            # Initialize VK API module
-            vk_config = self.config.get("vk", {})
-            self.vk_api = VKAPI(
-                access_token=vk_config.get("access_token"),
-                api_version=vk_config.get("api_version", "5.131")
-            )
-            logger.info("VK API module initialized successfully")
-            
-            # Initialize AI processing module
-            ai_config = self.config.get("ai", {})
-            providers = ai_config.get("providers", [])
-            
-            self.ai_processor = AIProcessor(
-                providers=providers
-            )
-            logger.info("AI processing module initialized successfully")
-            
-            # Initialize Telegram bot module
-            telegram_config = self.config.get("telegram", {})
-            self.telegram_api = TelegramAPI(
-                bot_token=telegram_config.get("bot_token"),
-                webhook_url=telegram_config.get("webhook_url"),
-                port=telegram_config.get("webhook_port", 8443)
-            )
-            logger.info("Telegram API module initialized successfully")
-            
-            # Create and set text processor
-            self.text_processor = TextProcessor(
-                ai_providers=self.config.get("ai", {}).get("providers", [])
-            )
-            logger.info("Text processor module initialized successfully")
-            
+            with self._startup_phase("imports"):
+                from src.vk_api import VKAPI
+                from src.ai_api import AIProcessor
+                from src.text_processor import TextProcessor
+                from src.vknew_bot import VKNewBot
+                from src.event_extractor import EventExtractor
+                from src.event_catalogue import EventCatalogue
+                from src.event_clustering import EventClusterer
+                from src.vk_archive import VKArchive
+                from src.post_index import PostVectorIndex
+                from src.media_cache import MediaCache
+
+            with self._startup_phase("stores"):
+                # Initialize persistent work queue
+                queue_config = self.config.get("system", {}).get("queue", {})
+                self.work_queue = WorkQueue(
+                    path=queue_config.get("path", "data/pipeline.db"),
+                    lease_seconds=queue_config.get("lease_seconds", 300),
+                    max_attempts=queue_config.get("max_attempts", 5)
+                )
+                logger.info("Work queue initialized successfully")
+
+                # Initialize shared state store
+                self.state_store = StateStore(self.config.get("system", {}).get("state_path", "data/state.db"))
+                logger.info("State store initialized successfully")
+
+            with self._startup_phase("clients"):
+                # Initialize VK API module
+                vk_config = self.config.get("vk", {})
+                archive_config = vk_config.get("archive", {})
+                archive_mode = archive_config.get("mode", "off")
+                self.vk_archive = VKArchive(archive_config.get("path", "data/vk_archive")) if archive_mode != "off" else None
+                self.vk_api = VKAPI(
+                    access_token=vk_config.get("access_token"),
+                    api_version=vk_config.get("api_version", "5.131"),
+                    base_url=vk_config.get("api_base_url"),
+                    access_tokens=vk_config.get("access_tokens"),
+                    quota_cooldown=vk_config.get("token_quota_cooldown", 3600),
+                    revoked_cooldown=vk_config.get("token_revoked_cooldown", 6 * 3600),
+                    archive=self.vk_archive,
+                    archive_mode=archive_mode
+                )
+                logger.info("VK API module initialized successfully")
+
+                # Initialize AI processing module
+                ai_config = self.config.get("ai", {})
+                providers = ai_config.get("providers", [])
+
+                self.ai_processor = AIProcessor(
+                    providers=providers
+                )
+                logger.info("AI processing module initialized successfully")
+
+                # Initialize Telegram bot module (already created in fast start mode)
+                if self.telegram_api is None:
+                    self.telegram_api = self._create_telegram_api()
+                rich_config = self.config.get("telegram", {}).get("rich_notifications", {})
+                if rich_config.get("enabled", True):
+                    self.telegram_api.set_media_cache(MediaCache(rich_config.get("media_cache_path", "data/media.db")))
+                logger.info("Telegram API module initialized successfully")
+
+            with self._startup_phase("text_processor"):
+                # Create and set text processor
+                self.text_processor = TextProcessor(
+                    ai_providers=self.ai_processor.providers,
+                    prompt_config=self.config.get("ai", {}).get("prompt", {}),
+                    translation_config=self.config.get("ai", {}).get("translation", {}),
+                    summary_config=self.config.get("ai", {}).get("summary", {})
+                )
+                logger.info("Text processor module initialized successfully")
+
+                # 影子模式：抽样帖子同时交给候选模型分类，对比一致率、延迟和token成本，不影响推送
+                shadow_config = self.config.get("ai", {}).get("shadow", {})
+                if shadow_config.get("enabled", False) and shadow_config.get("candidates"):
+                    from src.shadow_eval import ShadowEvaluator
+                    self.shadow_evaluator = ShadowEvaluator(
+                        self.text_processor,
+                        shadow_config.get("candidates", []),
+                        path=shadow_config.get("path", "data/shadow.db"),
+                        sample_rate=shadow_config.get("sample_rate", 0.1),
+                        max_pending=shadow_config.get("max_pending", 100)
+                    )
+                    logger.info("Shadow classifier evaluation enabled")
+
+            with self._startup_phase("events"):
+                # Initialize event extraction and local event catalogue
+                extraction_config = self.config.get("ai", {}).get("extraction", {})
+                if extraction_config.get("enabled", True):
+                    self.event_extractor = EventExtractor(
+                        ai_providers=self.ai_processor.providers,
+                        token_budget=self.config.get("ai", {}).get("prompt", {}).get("token_budget", 400)
+                    )
+                self.event_catalogue = EventCatalogue(
+                    path=self.config.get("system", {}).get("catalogue_path", "data/events.db"),
+                    undated_ttl=extraction_config.get("undated_ttl", 7 * 86400)
+                )
+                logger.info("Event catalogue initialized successfully")
+
+                # Initialize cross-source event clustering
+                clustering_config = self.config.get("system", {}).get("clustering", {})
+                if clustering_config.get("enabled", True):
+                    self.event_clusterer = EventClusterer(
+                        path=clustering_config.get("path", "data/clusters.db"),
+                        threshold=clustering_config.get("threshold", 0.5),
+                        venue_threshold=clustering_config.get("venue_threshold", 0.15),
+                        retention=clustering_config.get("retention_days", 14) * 86400
+                    )
+                    logger.info("Event clustering initialized successfully")
+
+                # 最近帖子的本地向量索引，用户查询优先从中检索
+                post_index_config = self.config.get("system", {}).get("post_index", {})
+                if post_index_config.get("enabled", True):
+                    self.post_index = PostVectorIndex(
+                        dim=post_index_config.get("dim", 256),
+                        max_age=post_index_config.get("max_age_hours", 72) * 3600,
+                        max_items=post_index_config.get("max_items", 50000),
+                        ann=post_index_config.get("ann", False)
+                    )
+                    logger.info("Post vector index initialized successfully")
+
+            with self._startup_phase("cache_warm"):
+                self._load_cache_snapshot()
+
             # Initialize VKNewBot
             self.vknew_bot = VKNewBot()
             self.vknew_bot.set_telegram_api(self.telegram_api)
@@ -186,6 +454,10 @@ class VKTelegramBot:
             self.vknew_bot.set_ai_processor(self.ai_processor)
             self.vknew_bot.set_text_processor(self.text_processor)
             self.vknew_bot.set_config(self.config)
+            self.vknew_bot.set_state_store(self.state_store)
+            self.vknew_bot.set_event_catalogue(self.event_catalogue)
+            self.vknew_bot.set_post_index(self.post_index)
+            self.vknew_bot.register_reload_callback(self.reload_config)
             logger.info("VKNewBot module initialized successfully")
             
         except Exception as e:
@@ -196,141 +468,650 @@ class VKTelegramBot:
     
 
     
+    def _get_keywords(self) -> List[str]:
+        """获取定时任务使用的关键词列表"""
+        return self.config.get("vk", {}).get("keywords") or DEFAULT_KEYWORDS
+
+    def _fetch_posts(self, keyword: str, start_time: int = None, end_time: int = None, max_pages: int = 5) -> List[Dict[str, Any]]:
+        """按关键词分页获取VK帖子，每页20条"""
+        all_raw_content = []
+        current_page = 0
+        start_from = None
+
+        while current_page < max_pages:
+            # 分页获取帖子
+            raw_content, start_from = self.vk_api.get_newsfeed(count=20, keyword=keyword, start_time=start_time,
+                                                               end_time=end_time, start_from=start_from)
+            logger.info(f"Fetched {len(raw_content)} posts from VK (page {current_page + 1}/{max_pages}) with keyword: {keyword}")
+
+            # 添加到总列表
+            all_raw_content.extend(raw_content)
+
+            # 如果没有更多页，退出循环
+            if not start_from:
+                logger.info("No more pages available, exiting pagination loop")
+                break
+
+            # 增加页码
+            current_page += 1
+
+        return all_raw_content
+
+    def _process_posts(self, all_raw_content: List[Dict[str, Any]]):
+        """判断帖子是否为活动并推送给用户：写入持久化队列，单进程模式下随后依次执行分类和推送阶段"""
+        self._enqueue_posts(all_raw_content)
+        if self.role == ROLE_ALL:
+            self._drain_pipeline()
+
+    def _enqueue_posts(self, all_raw_content: List[Dict[str, Any]], priority_offset: float = 0.0) -> int:
+        """采集阶段：按优先级将帖子写入分类队列，返回新入队的帖子数
+
+        Args:
+            all_raw_content: Raw VK posts
+            priority_offset: Added to every post's priority (negative for historical backfill)
+        """
+        priority_config = self.config.get("system", {}).get("priority", {})
+        backlog_limit = priority_config.get("backlog_limit", 500)
+        drop_below = priority_config.get("drop_below", 0.3)
+        backlog = self.work_queue.pending_count(STAGE_CLASSIFY)
+        prioritizer = self.prioritizer
+        enqueued = 0
+        dropped = 0
+        for raw_content in all_raw_content:
+            # 格式化帖子内容
+            content = self.vk_api.format_content(raw_content)
+
+            # 获取帖子URL
+            post_url = content.get("url", "")
+            if not post_url:
+                continue
+
+            # 检查是否有文本内容
+            text = content.get("text", "")
+            if not text:
+                continue
+
+            # 所有采集到的帖子都进入本地向量索引（包括已分类过的）
+            if self.post_index:
+                self.post_index.add(content)
+
+            # 检查是否已缓存
+            if self._is_cached(post_url):
+                logger.info(f"Post already processed, skipping: {post_url}")
+                continue
+
+            # 新鲜、互动多、临近活动日期的帖子优先分类；积压过多时丢弃低价值帖子
+            priority = prioritizer.score(content)
+            if backlog + enqueued >= backlog_limit and priority < drop_below:
+                dropped += 1
+                continue
+
+            if self.work_queue.enqueue(STAGE_CLASSIFY, post_url, content, priority=priority + priority_offset):
+                enqueued += 1
+
+        logger.info(f"Enqueued {enqueued} posts for classification" + (f", dropped {dropped} low-priority posts" if dropped else ""))
+        return enqueued
+
+    def _classify_pending(self) -> int:
+        """分类阶段：处理分类队列中的帖子，活动帖子进入推送队列，返回处理的任务数"""
+        processed = 0
+        batch_size = self.config.get("system", {}).get("queue", {}).get("batch_size", 20)
+        priority_config = self.config.get("system", {}).get("priority", {})
+        while True:
+            jobs = self.work_queue.lease(STAGE_CLASSIFY, batch_size)
+            if not jobs:
+                break
+
+            # AI预算紧张时推迟低价值帖子，把额度留给优先级高的帖子
+            busy = self._ai_backlog_delay() > priority_config.get("busy_delay", 10)
+            for job in jobs:
+                content = job["payload"]
+                post_url = job["key"]
+                if busy and job["priority"] < priority_config.get("defer_below", 0.8):
+                    self.work_queue.defer(job, priority_config.get("defer_seconds", 300))
+                    continue
+                try:
+                    if self._is_cached(post_url):
+                        is_activity = self._get_cached_result(post_url)
+                    else:
+                        # 调用AI判断是否为活动
+                        result = self.text_processor.classify_activity(content.get("text", ""))
+                        is_activity = result["is_activity"]
+                        # 缓存结果
+                        self._cache_result(post_url, is_activity)
+                        if self.shadow_evaluator:
+                            self.shadow_evaluator.observe(post_url, content.get("text", ""), result)
+
+                    # 如果是活动，提取结构化活动信息存入本地目录，然后进入推送队列
+                    if is_activity:
+                        logger.info(f"Detected activity: {post_url}")
+                        if self.event_extractor:
+                            event = self.event_extractor.extract(content)
+                            if event:
+                                self.event_catalogue.upsert(event)
+                                content["event"] = event
+                        notify_key, is_new = self._cluster_activity(post_url, content)
+                        if is_new:
+                            # 推送延迟一个聚合窗口，期间其他来源的同一活动并入同一条消息
+                            self.work_queue.enqueue(STAGE_NOTIFY, notify_key, content, delay=self._cluster_window())
+                    self.work_queue.ack(job["id"])
+                except Exception as e:
+                    logger.error(f"Failed to classify post {post_url}: {str(e)}")
+                    self.work_queue.retry(job, str(e))
+                processed += 1
+
+        if processed:
+            # 持久化判断缓存，重启后无需重新调用AI
+            self._save_cache_snapshot()
+        return processed
+
+    def _ai_backlog_delay(self) -> float:
+        """AI提供商预算的预计等待秒数（取最空闲的提供商）"""
+        providers = self.ai_processor.providers if self.ai_processor else []
+        if not providers:
+            return 0.0
+        cost = self.config.get("ai", {}).get("prompt", {}).get("token_budget", 400) + 10
+        return min(rate_governor.get_budget(f"ai:{p.get('name')}").delay(cost) for p in providers)
+
+    def _cluster_window(self) -> float:
+        if not self.event_clusterer:
+            return 0
+        return self.config.get("system", {}).get("clustering", {}).get("window_seconds", 0)
+
+    def _cluster_activity(self, post_url: str, content: Dict[str, Any]):
+        """将活动帖子归入活动簇，返回(推送任务键, 是否为新活动)"""
+        if not self.event_clusterer:
+            return post_url, True
+        cluster_id, is_new = self.event_clusterer.assign(post_url, content.get("text", ""), content.get("event"))
+        return f"{CLUSTER_KEY_PREFIX}{cluster_id}", is_new
+
+    def _build_notification(self, job_key: str, content: Dict[str, Any]) -> str:
+        """推送消息：首个来源的链接，同一活动的其他来源附在后面"""
+        post_url = content.get("url") or job_key
+        message = f"🔗 <a href='{post_url}'>Обнаружено мероприятие: </a>"
+        if self.event_clusterer and job_key.startswith(CLUSTER_KEY_PREFIX):
+            sources = [url for url in self.event_clusterer.members(int(job_key[len(CLUSTER_KEY_PREFIX):]))
+                       if url != post_url]
+            if sources:
+                links = ", ".join(f"<a href='{url}'>{i}</a>" for i, url in enumerate(sources, 2))
+                message += f"\nДругие источники: {links}"
+        return message
+
+    def _build_rich_notification(self, job_key: str, content: Dict[str, Any]) -> Dict[str, Any]:
+        """富文本推送：活动信息和帖子摘录作为图片说明，原帖和其他来源作为内联按钮"""
+        import html
+        from src.message_renderer import build_caption, truncate_text
+        from src.prompt_builder import clean_post_text
+
+        rich_config = self.config.get("telegram", {}).get("rich_notifications", {})
+        post_url = content.get("url") or job_key
+        event = content.get("event") or {}
+        lines = []
+        if event.get("title"):
+            lines.append(f"<b>{html.escape(truncate_text(event['title'], TITLE_CAPTION_LENGTH))}</b>")
+        details = []
+        if event.get("start_ts"):
+            details.append("🗓 " + datetime.datetime.fromtimestamp(event["start_ts"]).strftime("%d.%m %H:%M").replace(" 00:00", ""))
+        place = ", ".join(part for part in (event.get("venue"), event.get("city")) if part)
+        if place:
+            details.append(f"📍 {html.escape(place)}")
+        if event.get("price") is not None:
+            details.append("💳 " + ("бесплатно" if event["price"] == 0 else f"от {event['price']:.0f} ₽"))
+        if details:
+            lines.append("\n".join(details))
+
+        # 图片说明最多1024个可见字符，只截断帖子摘录
+        caption = build_caption("\n".join(lines), clean_post_text(content.get("text", "")),
+                                rich_config.get("excerpt_length", 400))
+
+        buttons = [[{"text": "Открыть пост", "url": post_url}]]
+        if self.event_clusterer and job_key.startswith(CLUSTER_KEY_PREFIX):
+            sources = [url for url in self.event_clusterer.members(int(job_key[len(CLUSTER_KEY_PREFIX):]))
+                       if url != post_url]
+            if sources:
+                buttons.append([{"text": f"Источник {i}", "url": url} for i, url in enumerate(sources[:4], 2)])
+
+        return {
+            "caption": caption or html.escape(post_url),
+            "photos": (content.get("photos") or [])[:rich_config.get("max_photos", 10)],
+            "buttons": buttons
+        }
+
+    def _get_recipients(self, event: Dict[str, Any], text: str) -> List[int]:
+        """按订阅条件筛选接收者，订阅条件变化（可能来自webhook进程）时重建索引"""
+        version = self.state_store.get_version("subscriptions")
+        if version != self.subscription_index.version:
+            self.subscription_index.rebuild(self.state_store.get_subscriptions(), version)
+        return self.subscription_index.recipients(self.state_store.get_subscribers(), event, text)
+
+    def _notify_pending(self) -> int:
+        """推送阶段：将活动推送给订阅条件匹配的用户，每个(帖子, 用户)只发送一次，返回处理的任务数"""
+        processed = 0
+        batch_size = self.config.get("system", {}).get("queue", {}).get("batch_size", 20)
+        while True:
+            jobs = self.work_queue.lease(STAGE_NOTIFY, batch_size)
+            if not jobs:
+                break
+
+            for job in jobs:
+                job_key = job["key"]
+
+                # 创建包含链接的消息，同一活动的多个来源合并为一条
+                payload = job["payload"]
+                rich = self.telegram_api.media_cache is not None
+                if rich:
+                    notification = self._build_rich_notification(job_key, payload)
+                else:
+                    message = self._build_notification(job_key, payload)
+
+                # 发送给订阅条件匹配的用户（没有订阅条件的用户接收全部活动）
+                failed = 0
+                chat_ids = self._get_recipients(payload.get("event"), payload.get("text", ""))
+                with profiling.span("telegram.send_loop", recipients=len(chat_ids)):
+                    for chat_id in chat_ids:
+                        if self.work_queue.is_delivered(job_key, chat_id):
+                            continue
+                        try:
+                            # 使用Telegram API发送消息；图片只在首次发送时由Telegram下载，之后复用file_id
+                            if rich:
+                                self.telegram_api.send_notification(chat_id, **notification)
+                            else:
+                                self.telegram_api.send_message(chat_id, message, parse_mode='HTML')
+                            self.work_queue.mark_delivered(job_key, chat_id)
+                            logger.info(f"Sent activity to user {chat_id}")
+                        except Exception as e:
+                            failed += 1
+                            logger.error(f"Failed to send activity to user {chat_id}: {str(e)}")
+
+                if failed:
+                    self.work_queue.retry(job, f"{failed} deliveries failed")
+                else:
+                    self.work_queue.ack(job["id"])
+                processed += 1
+
+        return processed
+
+    def _drain_pipeline(self):
+        """依次执行分类和推送阶段，直到队列中没有就绪任务"""
+        self._classify_pending()
+        self._notify_pending()
+
+    def _run_cycle(self, keyword: str = None) -> int:
+        """执行一轮定时任务，返回获取到的帖子数"""
+        import random
+
+        # 随机选择一个关键词
+        keyword = keyword or random.choice(self._get_keywords())
+        logger.info(f"Using keyword: {keyword}")
+
+        with profiling.span("scheduler.cycle", keyword=keyword) as cycle_span:
+            # 从VK获取最新帖子，使用选择的关键词作为过滤条件，分页获取，每次取20条，取5页
+            all_raw_content = self._fetch_posts(keyword)
+            logger.info(f"Total posts fetched: {len(all_raw_content)}")
+            cycle_span.set_attribute("posts", len(all_raw_content))
+
+            # 处理每个帖子
+            self._process_posts(all_raw_content)
+
+        # 清理已结束的活动和过期的活动簇
+        self.event_catalogue.expire()
+        if self.event_clusterer:
+            self.event_clusterer.expire()
+        if self.post_index:
+            self.post_index.expire()
+        return len(all_raw_content)
+
     async def _scheduled_task(self):
         """定时任务：每分钟从VK获取最新帖子，判断是否为活动并推送给用户"""
         import asyncio
-        import random
         logger.info("Starting scheduled task")
-        
-        # 关键词列表
-        keywords = ["афиша СПб", "выставка", "экскурсия", "вечер", "лекция"]
-        
+
         while True:
             try:
                 logger.info("Running scheduled task: checking for new activities")
-                
-                # 随机选择一个关键词
-                keyword = random.choice(keywords)
-                logger.info(f"Using keyword: {keyword}")
-                
-                # 从VK获取最新帖子，使用选择的关键词作为过滤条件，分页获取，每次取20条，取5页
-                all_raw_content = []
-                max_pages = 5
-                current_page = 0
-                start_from = None
-                
-                while current_page < max_pages:
-                    # 分页获取帖子
-                    raw_content, start_from = self.vk_api.get_newsfeed(count=20, keyword=keyword, start_from=start_from)
-                    logger.info(f"Fetched {len(raw_content)} posts from VK (page {current_page + 1}/{max_pages}) with keyword: {keyword}")
-                    
-                    # 添加到总列表
-                    all_raw_content.extend(raw_content)
-                    
-                    # 如果没有更多页，退出循环
-                    if not start_from:
-                        logger.info("No more pages available, exiting pagination loop")
-                        break
-                    
-                    # 增加页码
-                    current_page += 1
-                
-                logger.info(f"Total posts fetched: {len(all_raw_content)}")
-                
-                # 处理每个帖子
-                for raw_content in all_raw_content:
-                    # 格式化帖子内容
-                    content = self.vk_api.format_content(raw_content)
-                    
-                    # 获取帖子URL
-                    post_url = content.get("url", "")
-                    if not post_url:
-                        continue
-                    
-                    # 检查是否有文本内容
-                    text = content.get("text", "")
-                    if not text:
-                        continue
-                    
-                    # 检查是否已缓存
-                    if self._is_cached(post_url):
-                        logger.info(f"Post already processed, skipping: {post_url}")
-                        continue
-                    
-                    # 调用AI判断是否为活动
-                    is_activity = self.text_processor.is_activity(text)
-                    
-                    # 缓存结果
-                    self._cache_result(post_url, is_activity)
-                    
-                    # 如果是活动，推送给用户
-                    if is_activity:
-                        logger.info(f"Detected activity: {post_url}")
-                        
-                        # 直接创建包含链接的消息
-                        message = f"🔗 <a href='{post_url}'>Обнаружено мероприятие: </a>"
-                        
-                        # 发送给所有注册用户
-                        if self.vknew_bot.user_chat_ids:
-                            for chat_id in self.vknew_bot.user_chat_ids:
-                                try:
-                                    # 使用Telegram API发送消息
-                                    self.telegram_api.updater.bot.send_message(
-                                        chat_id=chat_id,
-                                        text=message,
-                                        parse_mode='HTML'
-                                    )
-                                    logger.info(f"Sent activity to user {chat_id}")
-                                except Exception as e:
-                                    logger.error(f"Failed to send activity to user {chat_id}: {str(e)}")
-            
+                # 抓取和分类在线程中执行，避免阻塞事件循环
+                await asyncio.to_thread(self._run_cycle)
+
             except Exception as e:
                 logger.error(f"Error in scheduled task: {str(e)}")
-            
+
             # 等待1分钟
             await asyncio.sleep(60)
-    
+
+    def _sync_post_index(self) -> int:
+        """不采集帖子的进程（webhook角色）从共享队列中读入其他进程采集的最近帖子，返回新增数"""
+        added = 0
+        since = time.time() - self.post_index.max_age
+        while True:
+            rows = self.work_queue.payloads(STAGE_CLASSIFY, after_id=self._post_index_cursor, since=since)
+            if not rows:
+                break
+            for job_id, content in rows:
+                if self.post_index.add(content):
+                    added += 1
+            self._post_index_cursor = rows[-1][0]
+        self.post_index.expire()
+        return added
+
+    async def _post_index_sync_task(self):
+        """定期同步本地向量索引（webhook角色）"""
+        import asyncio
+        while True:
+            try:
+                added = await asyncio.to_thread(self._sync_post_index)
+                if added:
+                    logger.info(f"Added {added} posts from the work queue to the post index")
+            except Exception as e:
+                logger.error(f"Error syncing post index: {str(e)}")
+            await asyncio.sleep(self.config.get("system", {}).get("post_index", {}).get("refresh_interval", 60))
+
+    async def _purge_task(self):
+        """定期清理队列中已完成/失败的任务和推送记录，以及长期未使用的图片file_id；清理前同一帖子的任务键一直去重"""
+        import asyncio
+        queue_config = self.config.get("system", {}).get("queue", {})
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.work_queue.purge, queue_config.get("retention_days", 7) * 86400)
+                if purged:
+                    logger.info(f"Purged {purged} finished jobs from the work queue")
+            except Exception as e:
+                logger.error(f"Error purging work queue: {str(e)}")
+            media_cache = self.telegram_api.media_cache if self.telegram_api else None
+            if media_cache:
+                rich_config = self.config.get("telegram", {}).get("rich_notifications", {})
+                try:
+                    purged = await asyncio.to_thread(media_cache.purge, rich_config.get("media_retention_days", 30) * 86400)
+                    if purged:
+                        logger.info(f"Purged {purged} unused entries from the media cache")
+                except Exception as e:
+                    logger.error(f"Error purging media cache: {str(e)}")
+            await asyncio.sleep(queue_config.get("purge_interval", 3600))
+
+    def _backfill_gap(self, start_time: int, end_time: int) -> List[Dict[str, Any]]:
+        """用newsfeed.search获取实时流断开期间的帖子（只获取，由流的消费者统一处理）"""
+        posts = []
+        for keyword in self._get_keywords():
+            try:
+                raw_content = self._fetch_posts(keyword, start_time=start_time, end_time=end_time)
+                logger.info(f"Backfilled {len(raw_content)} posts for keyword: {keyword}")
+                posts.extend(raw_content)
+            except Exception as e:
+                logger.error(f"Failed to backfill keyword {keyword}: {str(e)}")
+        return posts
+
+    def run_backfill(self, start_time: int, end_time: int) -> Dict[str, int]:
+        """历史回补：按时间片并发抓取指定时间范围内的帖子，以低于实时帖子的优先级写入分类队列"""
+        from src.backfill import BackfillCrawler
+
+        backfill_config = self.config.get("system", {}).get("backfill", {})
+        crawler = BackfillCrawler(
+            self.vk_api,
+            path=backfill_config.get("checkpoint_path", "data/backfill.db"),
+            slice_seconds=int(backfill_config.get("slice_hours", 6) * 3600),
+            min_slice_seconds=int(backfill_config.get("min_slice_minutes", 15) * 60),
+            concurrency=backfill_config.get("concurrency", 4),
+            max_pages=backfill_config.get("max_pages", 5)
+        )
+        priority_offset = -backfill_config.get("priority_penalty", 10)
+        try:
+            stats = crawler.run(self._get_keywords(), start_time, end_time,
+                                lambda posts: self._enqueue_posts(posts, priority_offset=priority_offset))
+        finally:
+            crawler.close()
+        self._save_cache_snapshot()
+        return stats
+
+    def replay_archive(self, path: str = None, batch_size: int = 200, post_ids: List[Tuple[int, int]] = None) -> int:
+        """将归档中的帖子按批写入分类队列（不访问VK），返回帖子数
+
+        Args:
+            path: Archive directory (default: vk.archive.path)
+            batch_size: Posts enqueued at a time
+            post_ids: Only replay these (owner_id, post_id), looked up through the post index
+        """
+        from src.vk_archive import VKArchive
+
+        archive = VKArchive(path or self.config.get("vk", {}).get("archive", {}).get("path", "data/vk_archive"))
+        total = 0
+        batch = []
+        try:
+            if post_ids is None:
+                items = archive.iter_posts()
+            else:
+                items = self._archived_posts(archive, post_ids)
+            for item in items:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    self._enqueue_posts(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                self._enqueue_posts(batch)
+                total += len(batch)
+        finally:
+            archive.close()
+        logger.info(f"Replayed {total} archived posts")
+        return total
+
+    @staticmethod
+    def _archived_posts(archive, post_ids: List[Tuple[int, int]]):
+        """按帖子索引查找指定的帖子，跳过归档中没有的"""
+        for owner_id, post_id in post_ids:
+            post = archive.get_post(owner_id, post_id)
+            if post is None:
+                logger.warning(f"Post {owner_id}_{post_id} is not in the archive")
+                continue
+            yield post
+
+    async def _streaming_task(self):
+        """实时流任务：通过VK Streaming API接收新帖子，替代分钟级轮询"""
+        import asyncio
+        logger.info("Starting streaming task")
+
+        streaming_config = self.config.get("vk", {}).get("streaming", {})
+        from src.vk_streaming import VKStreamingClient
+        self.streaming_client = VKStreamingClient(
+            self.vk_api,
+            endpoint=streaming_config.get("endpoint"),
+            key=streaming_config.get("key"),
+            secure=streaming_config.get("secure", True),
+            reconnect_delay=streaming_config.get("reconnect_delay", 5),
+            max_reconnect_delay=streaming_config.get("max_reconnect_delay", 300)
+        )
+        batch_size = streaming_config.get("batch_size", 20)
+        post_queue = asyncio.Queue()
+
+        async def on_gap(start_time, end_time):
+            # 回补的帖子和实时帖子进入同一队列，只有consume()调用_process_posts，避免两个线程同时修改缓存和入队
+            for post in await asyncio.to_thread(self._backfill_gap, start_time, end_time):
+                post_queue.put_nowait(post)
+
+        async def consume():
+            # 批量取出帖子，在线程中处理，避免阻塞websocket读取
+            while True:
+                posts = [await post_queue.get()]
+                while not post_queue.empty() and len(posts) < batch_size:
+                    posts.append(post_queue.get_nowait())
+                try:
+                    await asyncio.to_thread(self._process_posts, posts)
+                except Exception as e:
+                    logger.error(f"Error processing streamed posts: {str(e)}")
+
+        consumer = asyncio.create_task(consume())
+        try:
+            await self.streaming_client.run(self._get_keywords, post_queue.put_nowait, on_gap)
+        finally:
+            consumer.cancel()
+
+    async def _stage_loop(self, stage_func, name: str):
+        """独立进程模式下持续执行某个阶段，队列为空时等待"""
+        import asyncio
+        poll_interval = self.config.get("system", {}).get("queue", {}).get("poll_interval", 2)
+        logger.info(f"Starting {name} stage loop")
+        while True:
+            try:
+                processed = await asyncio.to_thread(stage_func)
+                if processed:
+                    logger.info(f"{name} stage processed {processed} jobs")
+                    continue
+            except Exception as e:
+                logger.error(f"Error in {name} stage: {str(e)}")
+            await asyncio.sleep(poll_interval)
+
     async def start(self):
         """Start the bot"""
         try:
-            logger.info("Starting VK to Telegram News Summary & Translation Bot...")
+            logger.info(f"Starting VK to Telegram News Summary & Translation Bot (role: {self.role})...")
             
             # 启动Telegram bot
             import threading
-            threading.Thread(target=self.telegram_api.start, args=(self.vknew_bot,), daemon=True).start()
-            logger.info("Telegram bot started successfully")
-            
-            # 启动定时任务
             import asyncio
-            asyncio.create_task(self._scheduled_task())
-            logger.info("Scheduled task started successfully")
+            if self.fast_start:
+                # 先绑定端口响应健康检查，其余模块在后台线程中初始化，完成后再接收更新
+                with self._startup_phase("server_bind"):
+                    threading.Thread(target=self.telegram_api.serve, daemon=True).start()
+                await asyncio.to_thread(self._initialize_modules)
+                self.telegram_api.attach(self.vknew_bot)
+                logger.info("Telegram bot started successfully (fast start)")
+            elif self.role in (ROLE_ALL, "webhook"):
+                threading.Thread(target=self.telegram_api.start, args=(self.vknew_bot,), daemon=True).start()
+                logger.info("Telegram bot started successfully")
+            self._report_startup()
+            
+            if self.role == ROLE_ALL:
+                # 从检查点恢复：重新处理上次退出时未完成的分类和推送任务
+                # 多进程模式下由租约超时回收，避免抢占其他进程正在处理的任务
+                self.work_queue.recover()
+                await asyncio.to_thread(self._drain_pipeline)
+
+            # 启动定时任务或实时流任务
+            if self.role in (ROLE_ALL, "ingest"):
+                if self.config.get("vk", {}).get("ingest_mode", "poll") == "stream":
+                    asyncio.create_task(self._streaming_task())
+                    logger.info("Streaming task started successfully")
+                else:
+                    asyncio.create_task(self._scheduled_task())
+                    logger.info("Scheduled task started successfully")
+                # 清理由唯一的采集进程负责
+                asyncio.create_task(self._purge_task())
+            elif self.role == "webhook" and self.post_index:
+                # webhook进程不采集帖子，本地检索用的索引从共享队列中读取
+                asyncio.create_task(self._post_index_sync_task())
+
+            if self.config.get("system", {}).get("config_reload", {}).get("watch", False):
+                asyncio.create_task(self._config_watch_task())
+            if self.role == ROLE_ALL and self._cluster_window():
+                # 聚合窗口到期的推送任务不依赖下一轮抓取
+                asyncio.create_task(self._stage_loop(self._notify_pending, "notify"))
+            if self.role == "classify":
+                asyncio.create_task(self._stage_loop(self._classify_pending, "classify"))
+            elif self.role == "notify":
+                asyncio.create_task(self._stage_loop(self._notify_pending, "notify"))
             
             # 保持主程序运行
             while True:
                 await asyncio.sleep(3600)  # 每小时检查一次
         
         except KeyboardInterrupt:
-            logger.info("Bot stopped")
+            logger.info("Bot interrupted")
         except Exception as e:
             logger.error(f"Failed to start bot: {str(e)}")
             raise
+        finally:
+            await self.stop()
     
     async def stop(self):
         """Stop the bot"""
         try:
+            if self.vk_archive:
+                # 关闭归档时写出排序后的帖子索引，之后按帖子查找不必扫描未排序的部分
+                self.vk_archive.close()
+                self.vk_archive = None
+            if self.telegram_api and self.telegram_api.media_cache:
+                # 写回内存中累计的图片使用记录
+                self.telegram_api.media_cache.flush()
             logger.info("Bot stopped")
             
         except Exception as e:
             logger.error(f"Failed to stop bot: {str(e)}")
 
+def _run_worker(config_path: str, role: str):
+    """Entry point of a worker process started with --workers"""
+    asyncio.run(VKTelegramBot(config_path=config_path, role=role).start())
+
+def _parse_time(value: str) -> int:
+    """Parse "48h", "3d" (relative to now) or "2026-10-01[ 12:00]" into a Unix timestamp"""
+    value = value.strip()
+    units = {"m": 60, "h": 3600, "d": 86400}
+    if value[-1:] in units and value[:-1].isdigit():
+        return int(time.time() - int(value[:-1]) * units[value[-1]])
+    return int(datetime.datetime.fromisoformat(value).timestamp())
+
+def _parse_post_ids(value: str) -> List[Tuple[int, int]]:
+    """Parse "-1_123,-1_124" (VK wall post ids) into (owner_id, post_id) pairs"""
+    post_ids = []
+    for part in value.split(","):
+        owner_id, _, post_id = part.strip().removeprefix("wall").rpartition("_")
+        post_ids.append((int(owner_id), int(post_id)))
+    return post_ids
+
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description="VK to Telegram activity bot")
+    parser.add_argument("--config", default=None, help="Path to config.yaml")
+    parser.add_argument("--role", default=ROLE_ALL, choices=ROLES,
+                        help="Pipeline stages to run in this process (default: all)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes for the classify/notify roles")
+    parser.add_argument("--backfill", metavar="SINCE", default=None,
+                        help="Crawl historical posts since SINCE (e.g. 48h, 3d or 2026-10-01) into the queue and exit")
+    parser.add_argument("--backfill-until", metavar="UNTIL", default=None,
+                        help="End of the backfill range (default: now)")
+    parser.add_argument("--replay-archive", metavar="PATH", nargs="?", const="", default=None,
+                        help="Enqueue every post of a VK response archive (default: vk.archive.path) and exit")
+    parser.add_argument("--archive-posts", metavar="IDS", default=None,
+                        help="With --replay-archive, only enqueue these posts, e.g. -1_123,-1_124")
+    return parser.parse_args()
+
 async def main():
     """Main function"""
     try:
-        bot = VKTelegramBot()
+        args = parse_args()
+        if args.backfill:
+            # 回补只负责采集入队，由运行中的分类进程（或下次启动）按优先级处理
+            bot = VKTelegramBot(config_path=args.config, role="ingest")
+            end_time = _parse_time(args.backfill_until) if args.backfill_until else int(time.time())
+            try:
+                await asyncio.to_thread(bot.run_backfill, _parse_time(args.backfill), end_time)
+            finally:
+                await bot.stop()
+            return
+        if args.replay_archive is not None:
+            bot = VKTelegramBot(config_path=args.config, role="ingest")
+            post_ids = _parse_post_ids(args.archive_posts) if args.archive_posts else None
+            try:
+                await asyncio.to_thread(bot.replay_archive, args.replay_archive or None, post_ids=post_ids)
+            finally:
+                await bot.stop()
+            return
+
+        if args.workers > 1 and args.role in ("classify", "notify"):
+            import multiprocessing
+            processes = [
+                multiprocessing.Process(target=_run_worker, args=(args.config, args.role), daemon=True)
+                for _ in range(args.workers)
+            ]
+            for process in processes:
+                process.start()
+            logger.info(f"Started {args.workers} {args.role} worker processes")
+            await asyncio.to_thread(lambda: [process.join() for process in processes])
+            return
+
+        bot = VKTelegramBot(config_path=args.config, role=args.role)
         await bot.start()
     except Exception as e:
         logger.error(f"Program exited with exception: {str(e)}")
         exit(1)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    url TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# 命中记录先在内存中累计，达到条数或间隔后批量写入
+FLUSH_SIZE = 100
+FLUSH_INTERVAL = 60.0
+
+
+class MediaCache:
+    """Persistent map from source image URL to Telegram file_id
+
+    The first send of an image lets Telegram fetch it by URL; the file_id
+    returned in that message is stored here and reused for every later
+    recipient, so each image crosses the network once regardless of the
+    number of subscribers.
+
+    Hits only update an in-memory tally (last use, count) that is written
+    back in batches, so a cached send costs no database write.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory: Dict[str, str] = {}
+        self._usage: Dict[str, Tuple[float, int]] = {}
+        self._flushed_at = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+    def flush(self):
+        """Write the buffered hit counts to the database"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._flushed_at = time.monotonic()
+        if not self._usage:
+            return
+        usage = [(used_at, uses, url) for url, (used_at, uses) in self._usage.items()]
+        self._usage.clear()
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany("UPDATE media SET used_at = MAX(used_at, ?), uses = uses + ? WHERE url = ?", usage)
+            self._conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            # 使用记录只影响清理顺序，写入失败时丢弃本批
+            self._conn.execute("ROLLBACK")
+            logger.warning(f"Failed to record media cache usage: {str(e)}")
+
+    def get(self, url: str) -> Optional[str]:
+        """Cached file_id of an image URL, or None"""
+        with self._lock:
+            file_id = self._memory.get(url)
+            if file_id is None:
+                row = self._conn.execute("SELECT file_id FROM media WHERE url = ?", (url,)).fetchone()
+                if row:
+                    file_id = self._memory[url] = row[0]
+            if file_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            uses = self._usage.get(url, (0.0, 0))[1]
+            self._usage[url] = (time.time(), uses + 1)
+            if len(self._usage) >= FLUSH_SIZE or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL:
+                self._flush()
+            return file_id
+
+    def put(self, url: str, file_id: str):
+        now = time.time()
+        with self._lock:
+            self._memory[url] = file_id
+            self._conn.execute(
+                "INSERT INTO media (url, file_id, created_at, used_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET file_id = excluded.file_id, used_at = excluded.used_at",
+                (url, file_id, now, now)
+            )
+
+    def forget(self, urls: Iterable[str]):
+        """Drop file_ids Telegram no longer accepts"""
+        with self._lock:
+            for url in urls:
+                self._memory.pop(url, None)
+                self._usage.pop(url, None)
+                self._conn.execute("DELETE FROM media WHERE url = ?", (url,))
+
+    def purge(self, older_than: float = 30 * 86400) -> int:
+        """Remove entries not used for a while"""
+        with self._lock:
+            self._flush()
+            cursor = self._conn.execute("DELETE FROM media WHERE used_at < ?", (time.time() - older_than,))
+            self._memory.clear()
+        return cursor.rowcount
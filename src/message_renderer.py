@@ -0,0 +1,137 @@
+import datetime
+import html
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Telegram单条消息的最大长度（按UTF-16代码单元计算）
+TELEGRAM_MESSAGE_LIMIT = 4096
+# 图片说明的上限按解析HTML后的可见文本计算
+TELEGRAM_CAPTION_LIMIT = 1024
+TAG_RE = re.compile(r"<[^>]*>")
+ITEM_SEPARATOR = "\n"
+TITLE_LENGTH = 50
+
+# 预编译的模板：绑定好的format方法，渲染时不再解析模板字符串
+ITEM_TEMPLATE = (
+    "🔗 <a href='{url}'><strong>{title}</strong></a>\n"
+    "<code>{summary}（{published}）</code>"
+).format
+TRUNCATED_MARK = "…"
+
+
+def message_length(text: str) -> int:
+    """Length as Telegram counts it (UTF-16 code units); HTML tags are counted too, which only errs on the safe side"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def visible_length(markup: str) -> int:
+    """Length of the text Telegram shows for HTML markup (tags removed, entities decoded)"""
+    return message_length(html.unescape(TAG_RE.sub("", markup)))
+
+
+def truncate_text(text: str, limit: int) -> str:
+    """Plain text cut to at most limit UTF-16 code units, ending with an ellipsis when cut"""
+    if message_length(text) <= limit:
+        return text
+    if limit <= 0:
+        return ""
+    text = text[:limit - 1]
+    while text and message_length(text) > limit - 1:
+        text = text[:-1]
+    return text.rstrip() + TRUNCATED_MARK
+
+
+def build_caption(header: str, excerpt: str, excerpt_length: int = 400, limit: int = TELEGRAM_CAPTION_LIMIT) -> str:
+    """Photo caption of an HTML header and a plain text excerpt, cutting only the excerpt to fit the limit"""
+    room = limit - visible_length(header) - (2 if header else 0)
+    excerpt = truncate_text(excerpt, min(room, excerpt_length))
+    return "\n\n".join(part for part in (header, html.escape(excerpt)) if part)
+
+
+def pack_messages(fragments: Iterable[str], limit: int = TELEGRAM_MESSAGE_LIMIT,
+                  separator: str = ITEM_SEPARATOR) -> List[str]:
+    """Join rendered fragments into as few messages as possible without splitting a fragment"""
+    messages = []
+    current: List[str] = []
+    current_length = 0
+    separator_length = message_length(separator)
+    for fragment in fragments:
+        length = message_length(fragment)
+        if current and current_length + separator_length + length > limit:
+            messages.append(separator.join(current))
+            current, current_length = [], 0
+        current_length += (separator_length if current else 0) + length
+        current.append(fragment)
+    if current:
+        messages.append(separator.join(current))
+    return messages
+
+
+class MessageRenderer:
+    """Renders search results into Telegram HTML messages
+
+    Each post is rendered once into an escaped fragment and kept in an LRU
+    cache keyed by its URL, summary and date, so repeated searches returning
+    the same posts only join cached strings. Fragments are packed into
+    messages on item boundaries, never cutting a post in half.
+    """
+
+    def __init__(self, cache_size: int = 2048, limit: int = TELEGRAM_MESSAGE_LIMIT):
+        self.cache_size = cache_size
+        self.limit = limit
+        self._cache: "OrderedDict[Tuple[str, str, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _format_time(timestamp: int) -> str:
+        if not timestamp:
+            return ""
+        try:
+            return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+        except (OverflowError, OSError, ValueError) as e:
+            logger.error(f"Failed to convert timestamp {timestamp}: {e}")
+            return ""
+
+    def _render(self, url: str, summary: str, timestamp: int) -> str:
+        fields = {
+            "url": html.escape(url, quote=True),
+            "title": html.escape(summary[:TITLE_LENGTH]),
+            "published": self._format_time(timestamp),
+        }
+        fragment = ITEM_TEMPLATE(summary=html.escape(summary), **fields)
+        keep = len(summary)
+        base = message_length(ITEM_TEMPLATE(summary=TRUNCATED_MARK, **fields))
+        # 单个帖子超过消息上限时按转义后的长度比例截短摘要，直到放得下
+        while keep > 0 and message_length(fragment) > self.limit:
+            escaped = message_length(fragment) - base
+            keep = max(0, min(keep - 1, keep * (self.limit - base) // max(escaped, 1)))
+            fragment = ITEM_TEMPLATE(summary=html.escape(summary[:keep]) + TRUNCATED_MARK, **fields)
+        return fragment
+
+    def render_item(self, content: Dict[str, Any]) -> str:
+        """Escaped HTML fragment of one processed post (url, ru_summary, date)"""
+        key = (content.get("url", ""), content.get("ru_summary", ""), content.get("date", 0) or 0)
+        with self._lock:
+            fragment = self._cache.get(key)
+            if fragment is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return fragment
+        fragment = self._render(*key)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = fragment
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return fragment
+
+    def render(self, contents: Iterable[Dict[str, Any]]) -> List[str]:
+        """Messages (each within the Telegram limit) listing the given posts in order"""
+        return pack_messages((self.render_item(content) for content in contents), self.limit)
@@ -0,0 +1,208 @@
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.extractive_summarizer import STOPWORDS
+from src.prompt_builder import clean_post_text
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"[^\W_]{2,}")
+NGRAM_SIZES = (3, 4)
+MAX_WORD_LENGTH = 12
+# 近义词概念：同一概念的词共享一个额外特征，使“концерт”能匹配“выступление”
+CONCEPTS = {
+    "music": ("концерт", "выступлен", "гиг", "музык", "джаз", "рок", "оркестр", "квартет", "хор", "опер", "рэп",
+              "песн", "диджей", "dj"),
+    "exhibition": ("выставк", "экспозиц", "вернисаж", "галере", "инсталляц", "музе"),
+    "lecture": ("лекци", "доклад", "семинар", "беседа", "дискусси", "презентац", "лекторий", "конференц", "митап"),
+    "theatre": ("спектакл", "театр", "постановк", "премьер", "мюзикл", "балет", "стендап", "импров"),
+    "festival": ("фестивал", "фест", "опен-эйр", "open"),
+    "excursion": ("экскурси", "прогулк", "поход", "тур", "путешеств"),
+    "workshop": ("мастер-класс", "мастеркласс", "воркшоп", "практикум", "тренинг", "курс"),
+    "party": ("вечеринк", "тусовк", "дискотек", "party", "рейв"),
+    "cinema": ("кино", "фильм", "кинопоказ", "показ", "screening"),
+    "market": ("ярмарк", "маркет", "базар", "барахолк", "гаражн"),
+    "sport": ("забег", "марафон", "турнир", "матч", "соревнован", "йога", "велопрогул"),
+    "kids": ("детск", "дети", "ребен", "семейн"),
+    "free": ("бесплатн", "свободный вход", "вход свободный"),
+}
+CONCEPT_WEIGHT = 6.0
+
+
+def _concept_of(word: str) -> Optional[str]:
+    for concept, prefixes in CONCEPTS.items():
+        if word.startswith(prefixes):
+            return concept
+    return None
+
+
+class PostVectorIndex:
+    """In-process vector index over recently ingested posts
+
+    Posts are embedded with a hashing trick over character 3/4-grams of
+    their words plus a small synonym concept lexicon, so no model has to be
+    downloaded and embedding a post takes well under a millisecond. Search is
+    a brute-force dot product over the L2-normalised matrix; with ``ann``
+    enabled and enough posts, random-hyperplane LSH tables narrow the
+    candidates first. Posts older than ``max_age`` are evicted.
+    """
+
+    def __init__(self, dim: int = 256, max_age: float = 72 * 3600, max_items: int = 50000, ann: bool = False,
+                 ann_tables: int = 8, ann_bits: int = 12, ann_min_items: int = 20000):
+        """Initialize index
+
+        Args:
+            dim: Embedding dimension
+            max_age: Seconds after which a post is evicted (by its publication date)
+            max_items: Oldest posts are evicted beyond this number
+            ann: Use LSH tables to pick candidates instead of scanning every post
+            ann_tables: Number of LSH tables
+            ann_bits: Hyperplanes per table
+            ann_min_items: Brute force is used below this many posts even with ann enabled
+        """
+        self.dim = dim
+        self.max_age = max_age
+        self.max_items = max_items
+        self.ann = ann
+        self.ann_min_items = ann_min_items
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((1024, dim), dtype=np.float32)
+        self._timestamps = np.zeros(1024, dtype=np.float64)
+        self._items: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._size = 0
+
+        rng = np.random.RandomState(7)
+        self._planes = rng.standard_normal((ann_tables, ann_bits, dim)).astype(np.float32)
+        self._bit_weights = (1 << np.arange(ann_bits)).astype(np.int64)
+        self._tables: List[Dict[int, List[int]]] = [defaultdict(list) for _ in range(ann_tables)]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def embed(self, text: str) -> np.ndarray:
+        """L2-normalised hashing embedding of a text"""
+        features = []
+        weights = []
+        for word in set(WORD_RE.findall(clean_post_text(text).lower())):
+            if word in STOPWORDS:
+                continue
+            padded = f"<{word[:MAX_WORD_LENGTH]}>"
+            for n in NGRAM_SIZES:
+                for i in range(len(padded) - n + 1):
+                    features.append(padded[i:i + n])
+                    weights.append(1.0)
+            concept = _concept_of(word)
+            if concept:
+                features.append(f"#{concept}")
+                weights.append(CONCEPT_WEIGHT)
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            return vector
+        hashes = np.array([zlib.crc32(feature.encode("utf-8")) for feature in features], dtype=np.int64)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, hashes % self.dim, signs * np.array(weights, dtype=np.float32))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _lsh_keys(self, vectors: np.ndarray) -> np.ndarray:
+        """Bucket key of each vector in every table, shape (tables, len(vectors))"""
+        bits = np.einsum("tbd,nd->tnb", self._planes, vectors) > 0
+        return bits.astype(np.int64) @ self._bit_weights
+
+    def add(self, item: Dict[str, Any]) -> bool:
+        """Index a formatted post (VKAPI.format_content), returns False if it has no text or url"""
+        url, text = item.get("url"), item.get("text")
+        if not url or not text:
+            return False
+        vector = self.embed(text)
+        timestamp = item.get("date") or time.time()
+        stored = {key: value for key, value in item.items() if key != "raw"}
+
+        with self._lock:
+            row = self._rows.get(url)
+            if row is None:
+                if self._size == len(self._vectors):
+                    self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+                    self._timestamps = np.concatenate([self._timestamps, np.zeros_like(self._timestamps)])
+                row = self._size
+                self._size += 1
+                self._items.append(None)
+                self._rows[url] = row
+            # 更新过的帖子在旧桶中的条目保留，检索时按实际向量重新打分
+            for table, key in zip(self._tables, self._lsh_keys(vector[None, :])[:, 0].tolist()):
+                table[key].append(row)
+            self._vectors[row] = vector
+            self._timestamps[row] = timestamp
+            self._items[row] = stored
+            # 超出上限10%时才压缩，避免每次写入都重建
+            if len(self._rows) > self.max_items * 1.1:
+                self._compact()
+        return True
+
+    def _compact(self):
+        """Drop evicted rows and rebuild the LSH tables (caller holds the lock)"""
+        live = np.array(sorted(self._rows.values()), dtype=np.int64)
+        if len(live) > self.max_items:
+            live = live[np.argsort(self._timestamps[live], kind="stable")[len(live) - self.max_items:]]
+            live.sort()
+        capacity = max(1024, 2 * len(live))
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        timestamps = np.zeros(capacity, dtype=np.float64)
+        vectors[:len(live)] = self._vectors[live]
+        timestamps[:len(live)] = self._timestamps[live]
+        self._items = [self._items[row] for row in live.tolist()]
+        self._rows = {item["url"]: i for i, item in enumerate(self._items)}
+        self._vectors, self._timestamps, self._size = vectors, timestamps, len(live)
+        self._tables = [defaultdict(list) for _ in self._tables]
+        if len(live):
+            keys = self._lsh_keys(vectors[:len(live)])
+            for table, table_keys in zip(self._tables, keys):
+                for row, key in enumerate(table_keys.tolist()):
+                    table[key].append(row)
+
+    def expire(self, now: float = None) -> int:
+        """Evict posts older than max_age"""
+        cutoff = (now or time.time()) - self.max_age
+        with self._lock:
+            expired = [url for url, row in self._rows.items() if self._timestamps[row] < cutoff]
+            for url in expired:
+                self._items[self._rows.pop(url)] = None
+            if expired:
+                self._compact()
+        return len(expired)
+
+    def search(self, query: str, k: int = 10, min_score: float = 0.1, now: float = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """Most similar recent posts as (score, post) pairs, best first"""
+        vector = self.embed(query)
+        if not vector.any():
+            return []
+        cutoff = (now or time.time()) - self.max_age
+        with self._lock:
+            if not self._rows:
+                return []
+            if self.ann and len(self._rows) >= self.ann_min_items:
+                keys = self._lsh_keys(vector[None, :])[:, 0].tolist()
+                candidates = np.unique(np.fromiter(
+                    (row for table, key in zip(self._tables, keys) for row in table.get(key, ())), dtype=np.int64
+                ))
+            else:
+                candidates = np.arange(self._size)
+            if not len(candidates):
+                return []
+            scores = self._vectors[candidates] @ vector
+            # 已删除或过期的行不参与排序
+            valid = (self._timestamps[candidates] >= cutoff) & (scores >= min_score)
+            candidates, scores = candidates[valid], scores[valid]
+            best = np.argpartition(-scores, k)[:k] if len(scores) > k else np.arange(len(scores))
+            top = best[np.argsort(-scores[best], kind="stable")]
+            results = [(float(scores[i]), self._items[candidates[i]]) for i in top.tolist()]
+        return [(score, item) for score, item in results if item is not None]
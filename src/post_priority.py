@@ -0,0 +1,104 @@
+import datetime
+import math
+import re
+import time
+from typing import Any, Dict, Optional
+
+# 帖子中提到的日期：12.05 / 12.05.2026 / 12 мая
+MONTH_NUMBERS = {
+    "январ": 1, "феврал": 2, "март": 3, "апрел": 4, "ма": 5, "июн": 6,
+    "июл": 7, "август": 8, "сентябр": 9, "октябр": 10, "ноябр": 11, "декабр": 12,
+}
+NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})\.(\d{1,2})(?:\.(\d{2,4}))?\b")
+TEXT_DATE_RE = re.compile(r"\b(\d{1,2})\s+(январ|феврал|март|апрел|ма[яй]|июн|июл|август|сентябр|октябр|ноябр|декабр)",
+                          re.IGNORECASE)
+RELATIVE_DAYS = {"сегодня": 0, "завтра": 1, "послезавтра": 2}
+RELATIVE_RE = re.compile(r"\b(сегодня|завтра|послезавтра)\b", re.IGNORECASE)
+
+
+def _count(item: Dict[str, Any], field: str) -> int:
+    value = item.get(field)
+    if isinstance(value, dict):
+        value = value.get("count")
+    return value if isinstance(value, int) else 0
+
+
+def mentioned_date(text: str, published: float) -> Optional[float]:
+    """Earliest date mentioned in a post that is not before its publication day, as a timestamp"""
+    base = datetime.datetime.fromtimestamp(published).replace(hour=0, minute=0, second=0, microsecond=0)
+    candidates = []
+    for day, month, year in NUMERIC_DATE_RE.findall(text):
+        year = int(year) + (2000 if len(year) == 2 else 0) if year else base.year
+        candidates.append((year, int(month), int(day)))
+    for day, month in TEXT_DATE_RE.findall(text):
+        month_number = next(n for prefix, n in MONTH_NUMBERS.items() if month.lower().startswith(prefix))
+        candidates.append((base.year, month_number, int(day)))
+
+    dates = []
+    for year, month, day in candidates:
+        try:
+            date = datetime.datetime(year, month, day)
+        except ValueError:
+            continue
+        # 没有年份的日期早于发布日期时指明年（例如12月发布的1月活动）
+        if date < base and date.year == base.year and (base - date).days > 31:
+            date = date.replace(year=year + 1)
+        if date >= base:
+            dates.append(date)
+    for word in RELATIVE_RE.findall(text):
+        dates.append(base + datetime.timedelta(days=RELATIVE_DAYS[word.lower()]))
+    return min(dates).timestamp() if dates else None
+
+
+class PostPrioritizer:
+    """Scores posts for classification order
+
+    The score adds up three parts in [0, 1], each multiplied by its weight:
+    freshness (exponential decay with post age), engagement (views, likes,
+    reposts and comments relative to community size, log-scaled) and urgency
+    (how soon the earliest date mentioned in the post is). Posts that only
+    mention past dates score zero urgency.
+    """
+
+    def __init__(self, freshness_half_life: float = 6 * 3600, urgency_horizon: float = 14 * 86400,
+                 weights: Dict[str, float] = None):
+        self.freshness_half_life = freshness_half_life
+        self.urgency_horizon = urgency_horizon
+        self.weights = {"freshness": 1.0, "engagement": 1.0, "urgency": 1.0, **(weights or {})}
+
+    def freshness(self, published: float, now: float) -> float:
+        if not published:
+            return 0.0
+        age = max(0.0, now - published)
+        return 0.5 ** (age / self.freshness_half_life)
+
+    @staticmethod
+    def engagement(item: Dict[str, Any]) -> float:
+        views = _count(item, "views")
+        interactions = _count(item, "likes") + 3 * _count(item, "reposts") + 2 * _count(item, "comments")
+        community_size = item.get("community_size") or 0
+        # 大社区的帖子即使互动率一般也值得优先处理；绝对量和相对量取对数后各占一半
+        reach = math.log1p(views + community_size / 100) / math.log1p(1_000_000)
+        rate = math.log1p(interactions) / math.log1p(max(views, 10) / 10)
+        return min(1.0, 0.5 * reach + 0.5 * min(1.0, rate))
+
+    def urgency(self, text: str, published: float, now: float) -> float:
+        date = mentioned_date(text, published or now)
+        if date is None:
+            return 0.3
+        until = date - now
+        if until < -86400:
+            return 0.0
+        return max(0.0, 1.0 - max(0.0, until) / self.urgency_horizon)
+
+    def score(self, content: Dict[str, Any], now: float = None) -> float:
+        """Priority of formatted VK content (VKAPI.format_content), higher is classified earlier"""
+        now = now or time.time()
+        item = content.get("raw") or {}
+        published = content.get("date") or 0
+        return round(
+            self.weights["freshness"] * self.freshness(published, now)
+            + self.weights["engagement"] * self.engagement(item)
+            + self.weights["urgency"] * self.urgency(content.get("text", ""), published, now),
+            4
+        )
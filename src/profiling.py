@@ -0,0 +1,218 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 性能统计开关，关闭时span()直接返回空上下文，开销接近于零
+_enabled = False
+_lock = threading.Lock()
+_stats: Dict[str, "StageStats"] = {}
+_trace_file = None
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# 每个阶段保留的最近样本数，用于计算分位数
+SAMPLE_WINDOW = 1024
+
+
+class StageStats:
+    """Aggregated timings of one pipeline stage"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+
+    def add(self, duration: float, error: bool = False):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.samples.append(duration)
+        if error:
+            self.errors += 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100.0))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_s": round(self.total, 6),
+            "mean_s": round(self.total / self.count, 6) if self.count else 0.0,
+            "p50_s": round(self.percentile(50), 6),
+            "p99_s": round(self.percentile(99), 6),
+            "max_s": round(self.max, 6),
+        }
+
+
+class _NullSpan:
+    """Span used while profiling is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Timed section of the pipeline, nested spans share one trace"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.trace_id = None
+        self.span_id = None
+        self.start_ns = 0
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.trace_id = self.parent.trace_id if self.parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        with _lock:
+            stats = _stats.get(self.name)
+            if stats is None:
+                stats = _stats[self.name] = StageStats()
+            stats.add(duration, error=exc_type is not None)
+        if _trace_file:
+            _export(self, self.start_ns + int(duration * 1e9), exc)
+        return False
+
+
+def configure(enabled: bool, trace_file: str = None):
+    """Enable or disable profiling
+
+    Args:
+        enabled: Collect per-stage timings
+        trace_file: Optional path, finished spans are appended as OTLP/JSON lines
+    """
+    global _enabled, _trace_file
+    _enabled = bool(enabled)
+    _trace_file = trace_file if enabled and trace_file else None
+    logger.info(f"Profiling {'enabled' if _enabled else 'disabled'}" + (f", exporting traces to {_trace_file}" if _trace_file else ""))
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, **attributes):
+    """Context manager timing a pipeline stage
+
+    Example:
+        with span("vk.request", method="newsfeed.search"):
+            ...
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def traced(name: str = None) -> Callable:
+    """Decorator timing every call of the wrapped function"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-stage aggregates"""
+    with _lock:
+        return {name: stats.to_dict() for name, stats in _stats.items()}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def format_report(limit: int = 20) -> str:
+    """Human readable hot-path breakdown sorted by total time"""
+    stats = get_stats()
+    if not stats:
+        return "No profiling data" if _enabled else "Profiling is disabled"
+
+    lines = [f"{'stage':<28}{'count':>7}{'total':>10}{'mean':>9}{'p99':>9}{'err':>5}"]
+    ordered = sorted(stats.items(), key=lambda item: item[1]["total_s"], reverse=True)
+    for name, s in ordered[:limit]:
+        lines.append(f"{name[:27]:<28}{s['count']:>7}{s['total_s']:>9.2f}s{s['mean_s']:>8.3f}s{s['p99_s']:>8.3f}s{s['errors']:>5}")
+    return "\n".join(lines)
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _export(finished: Span, end_ns: int, exc: Optional[BaseException]):
+    """Append a finished span to the trace file in OTLP/JSON format"""
+    otel_span = {
+        "traceId": finished.trace_id,
+        "spanId": finished.span_id,
+        "name": finished.name,
+        "kind": 1,
+        "startTimeUnixNano": str(finished.start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": [{"key": k, "value": _attribute_value(v)} for k, v in finished.attributes.items()],
+        "status": {"code": 2, "message": str(exc)} if exc else {"code": 1},
+    }
+    if finished.parent:
+        otel_span["parentSpanId"] = finished.parent.span_id
+
+    record = {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "vknews"}}]},
+            "scopeSpans": [{"scope": {"name": "src.profiling"}, "spans": [otel_span]}]
+        }]
+    }
+    try:
+        with _lock:
+            with open(_trace_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except Exception as e:
+        logger.error(f"Failed to export trace span: {str(e)}")
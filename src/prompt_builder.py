@@ -0,0 +1,183 @@
+import math
+import re
+from typing import Any, Dict, List
+
+# 活动判断的系统提示词：保持逐字不变，使提供商侧的前缀缓存能够命中
+ACTIVITY_SYSTEM_PROMPT = (
+    "You are a professional content classifier. Please determine if the given text is an announcement for an upcoming "
+    "activity or event that meets all the following criteria:\n"
+    "1. It is an announcement for an activity or event.\n"
+    "2. The activity has not yet occurred (it is scheduled for the future).\n"
+    "3. The activity is located in either Moscow or Saint Petersburg.\n"
+    "4. The activity is a public event that the general public can participate in, such as exhibitions, charity galas, "
+    "book exchanges, travel, lectures, concerts, public welfare activities, volunteer activities, mountain climbing, "
+    "skiing, etc.\n"
+    "5. Shopping mall promotional activities are NOT considered as activities.\n\n"
+    "Return only 'YES' if all criteria are met, otherwise return 'NO'. Do not provide any explanations."
+)
+
+# 预编译的清洗规则
+URL_RE = re.compile(r"(https?://|www\.)\S+|\b(vk\.com|vk\.cc|t\.me)/\S+", re.IGNORECASE)
+VK_MENTION_RE = re.compile(r"\[(?:id|club|public)\d+\|([^\]]*)\]")
+HASHTAG_LINE_RE = re.compile(r"^\s*(#\S+\s*)+$", re.MULTILINE)
+HASHTAG_RE = re.compile(r"#(\w+)(@\w+)?")
+EMOJI_RE = re.compile("[\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D]+")
+SPACES_RE = re.compile(r"[ \t]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+# 不在常见缩写（ул. пр. г. д. м. и т.д.）后断句
+ABBREVIATIONS = ("ул", "пр", "просп", "наб", "пер", "пл", "г", "д", "м", "ст", "им", "т", "см", "руб", "тел", "р")
+SENTENCE_SPLIT_RE = re.compile(
+    "".join(rf"(?<!\b{abbr}\.)" for abbr in ABBREVIATIONS) + r"(?<=[.!?…])\s+|\n+",
+    re.IGNORECASE
+)
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# 包含日期、时间、地点信息的句子优先保留
+MONTHS = "январ|феврал|март|апрел|ма[яй]|июн|июл|август|сентябр|октябр|ноябр|декабр"
+WEEKDAYS = "понедельник|вторник|сред[аеу]|четверг|пятниц|суббот|воскресень"
+KEY_FACT_RE = re.compile(
+    r"\b\d{1,2}[./]\d{1,2}([./]\d{2,4})?\b"          # 12.05, 12/05/2025
+    r"|\b\d{1,2}:\d{2}\b"                            # 19:00
+    r"|\b\d{1,2}\s+(" + MONTHS + r")"               # 12 мая
+    r"|\b(" + WEEKDAYS + r")"
+    r"|\b(сегодня|завтра|послезавтра)\b"
+    r"|(москв|петербург|спб|питер|ленобл)"
+    r"|\b(ул\.|улица|пр\.|проспект|наб\.|набережн|площад|пер\.|метро|м\.\s)"
+    r"|\b(адрес|место|где|вход|билет|регистрац|стоимость|бесплатн|руб)",
+    re.IGNORECASE
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text without calling a tokenizer
+
+    BPE tokenizers split Cyrillic into shorter pieces than Latin text, so
+    words are weighted by script: roughly 3 characters per token for Cyrillic
+    and digits, 4 for Latin, and 1 token per punctuation mark.
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for match in TOKEN_RE.finditer(text):
+        piece = match.group(0)
+        if not piece[0].isalnum() and piece[0] != "_":
+            tokens += 1
+        elif piece.isascii() and not piece.isdigit():
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            tokens += math.ceil(len(piece) / 3)
+    return tokens
+
+
+def count_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate prompt tokens of a chat completions message list (4 tokens overhead per message)"""
+    return sum(estimate_tokens(message.get("content", "")) + 4 for message in messages) + 2
+
+
+def clean_post_text(text: str) -> str:
+    """Remove links, emoji, hashtag blocks and VK mention markup from a post"""
+    if not text:
+        return ""
+    text = VK_MENTION_RE.sub(r"\1", text)
+    text = URL_RE.sub(" ", text)
+    text = HASHTAG_LINE_RE.sub("", text)
+    text = HASHTAG_RE.sub(r"\1", text)
+    text = EMOJI_RE.sub(" ", text)
+    text = SPACES_RE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    text = BLANK_LINES_RE.sub("\n\n", text)
+    return text.strip()
+
+
+def truncate_to_tokens(text: str, token_budget: int) -> str:
+    """Cut a text on a word boundary so that it fits the token budget"""
+    if estimate_tokens(text) <= token_budget:
+        return text
+    result = []
+    used = 0
+    for word in text.split(" "):
+        cost = estimate_tokens(word)
+        if used + cost > token_budget:
+            break
+        result.append(word)
+        used += cost
+    return " ".join(result)
+
+
+def compact_post_text(text: str, token_budget: int) -> str:
+    """Clean a post and fit it into the token budget
+
+    The lead paragraph is always kept, then sentences mentioning dates,
+    times, places or tickets, then the remaining sentences in original
+    order until the budget is used up.
+    """
+    text = clean_post_text(text)
+    if estimate_tokens(text) <= token_budget:
+        return text
+
+    paragraphs = [p for p in text.split("\n\n") if p.strip()]
+    lead = truncate_to_tokens(paragraphs[0], token_budget)
+    remaining = token_budget - estimate_tokens(lead)
+
+    sentences = [s.strip() for s in SENTENCE_SPLIT_RE.split("\n\n".join(paragraphs[1:])) if s and s.strip()]
+    costs = [estimate_tokens(s) for s in sentences]
+    key_facts = [i for i, s in enumerate(sentences) if KEY_FACT_RE.search(s)]
+    key_set = set(key_facts)
+    others = [i for i in range(len(sentences)) if i not in key_set]
+
+    selected = set()
+    for i in key_facts + others:
+        if costs[i] <= remaining:
+            selected.add(i)
+            remaining -= costs[i]
+
+    body = " ".join(sentences[i] for i in sorted(selected))
+    return f"{lead}\n{body}" if body else lead
+
+
+class PromptBuilder:
+    """Builds AI prompts with a stable system prefix and token-budgeted post text"""
+
+    def __init__(self, token_budget: int = 400, price_per_1k_tokens: float = 0.0,
+                 cached_price_per_1k_tokens: float = None, tokens_per_second: float = 0.0):
+        """Initialize prompt builder
+
+        Args:
+            token_budget: Maximum estimated tokens of post text sent per prompt
+            price_per_1k_tokens: Prompt price used for cost estimates
+            cached_price_per_1k_tokens: Price of prompt tokens served from the provider prefix cache
+            tokens_per_second: Prompt processing throughput used for latency estimates
+        """
+        self.token_budget = token_budget
+        self.price_per_1k_tokens = price_per_1k_tokens
+        self.cached_price_per_1k_tokens = price_per_1k_tokens if cached_price_per_1k_tokens is None else cached_price_per_1k_tokens
+        self.tokens_per_second = tokens_per_second
+        self.system_prefix_tokens = count_message_tokens([{"role": "system", "content": ACTIVITY_SYSTEM_PROMPT}])
+
+    def build_activity_messages(self, text: str) -> List[Dict[str, str]]:
+        """Messages for activity detection, only the user message varies between posts"""
+        return [
+            {"role": "system", "content": ACTIVITY_SYSTEM_PROMPT},
+            {"role": "user", "content": compact_post_text(text, self.token_budget)}
+        ]
+
+    def estimate_activity_batch(self, texts: List[str]) -> Dict[str, Any]:
+        """Predict prompt tokens, cost and latency of classifying a batch of posts"""
+        prompt_tokens = 0
+        raw_tokens = 0
+        for text in texts:
+            prompt_tokens += count_message_tokens(self.build_activity_messages(text))
+            raw_tokens += estimate_tokens(text)
+
+        cached_tokens = self.system_prefix_tokens * max(0, len(texts) - 1)
+        uncached_tokens = prompt_tokens - cached_tokens
+        cost = (uncached_tokens * self.price_per_1k_tokens + cached_tokens * self.cached_price_per_1k_tokens) / 1000
+        latency = prompt_tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+        return {
+            "posts": len(texts),
+            "raw_text_tokens": raw_tokens,
+            "prompt_tokens": prompt_tokens,
+            "cacheable_prefix_tokens": cached_tokens,
+            "estimated_cost": round(cost, 6),
+            "estimated_latency_s": round(latency, 3)
+        }
@@ -0,0 +1,202 @@
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# 当前调用的优先级，用户主动刷新时设为interactive，其余调用默认为background
+_priority = contextvars.ContextVar("rate_priority", default=PRIORITY_BACKGROUND)
+_lock = threading.Lock()
+_buckets: Dict[str, "Budget"] = {}
+_rates: Dict[str, float] = {}
+
+# 429后的退避：按连续被限流次数指数增长，上限MAX_BACKOFF秒
+MAX_BACKOFF = 60.0
+# AIMD参数：成功时每次增加上限的ADDITIVE_STEP，限流时速率减半，其他错误时乘以ERROR_FACTOR
+ADDITIVE_STEP = 0.05
+THROTTLE_FACTOR = 0.5
+ERROR_FACTOR = 0.8
+MIN_RATE_FRACTION = 0.05
+
+
+class Budget:
+    """Token bucket with AIMD rate adjustment and interactive-first admission
+
+    ``max_rate`` is the configured budget in units per second (0 means no
+    limit, only 429 back-off is applied). The effective rate starts at the
+    budget, is halved on every throttling response and grows back additively
+    with successful calls. While an interactive caller is waiting, background
+    callers are held back.
+    """
+
+    def __init__(self, name: str, max_rate: float = 0, burst: float = None):
+        self.name = name
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+        self._paused_until = 0.0
+        self._consecutive_throttles = 0
+        self.throttled = 0
+        self.waited = 0.0
+        self.rate = 0
+        self.configure(max_rate, burst)
+
+    def configure(self, max_rate: float, burst: float = None):
+        """Change the budget; a rate lowered by AIMD is kept (capped at the new budget) and tokens are not refilled"""
+        with self._cond:
+            max_rate = max_rate or 0
+            capacity = burst or max(1.0, max_rate)
+            now = time.monotonic()
+            if self.rate and max_rate:
+                self._refill(now)
+                self.rate = min(self.rate, max_rate)
+                self.tokens = min(self.tokens, capacity)
+            else:
+                self.rate = max_rate
+                self.tokens = capacity
+            self.max_rate = max_rate
+            self.capacity = capacity
+            self._updated = now
+            self._cond.notify_all()
+
+    def _refill(self, now: float):
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, cost: float = 1, priority: int = None, timeout: float = None) -> bool:
+        """Wait until cost units may be spent, returns False if timeout expired first"""
+        priority = _priority.get() if priority is None else priority
+        interactive = priority == PRIORITY_INTERACTIVE
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else None
+
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    held_back = not interactive and self._interactive_waiting > 0
+                    if now < self._paused_until:
+                        wait = self._paused_until - now
+                    elif held_back:
+                        wait = 0.05
+                    elif not self.rate or self.tokens >= min(cost, self.capacity):
+                        # 超过桶容量的请求（大批量AI调用）先放行，欠下的额度由后续调用等待补齐
+                        if self.rate:
+                            self.tokens -= cost
+                        self.waited += now - started
+                        return True
+                    else:
+                        wait = (min(cost, self.capacity) - self.tokens) / self.rate
+                    if deadline is not None and now + wait > deadline:
+                        return False
+                    self._cond.wait(wait)
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def delay(self, cost: float = 1) -> float:
+        """Estimated seconds until cost units could be spent, used to pick the least loaded budget"""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._paused_until - now)
+            if self.rate and self.tokens < min(cost, self.capacity):
+                wait = max(wait, (min(cost, self.capacity) - self.tokens) / self.rate)
+            return wait
+
+    def feedback(self, throttled: bool = False, error: bool = False, retry_after: float = None):
+        """Report the outcome of a call: success grows the rate, throttling halves it and pauses the budget"""
+        with self._cond:
+            if throttled:
+                self.throttled += 1
+                self._consecutive_throttles += 1
+                if self.max_rate:
+                    self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate * THROTTLE_FACTOR)
+                backoff = retry_after if retry_after else min(MAX_BACKOFF, 2 ** self._consecutive_throttles) + random.uniform(0, 1)
+                self._paused_until = max(self._paused_until, time.monotonic() + backoff)
+                logger.warning(f"Rate budget {self.name} throttled, pausing {backoff:.1f}s (rate {self.rate:.2f}/s)")
+            elif error:
+                if self.max_rate:
+                    self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate * ERROR_FACTOR)
+            else:
+                self._consecutive_throttles = 0
+                if self.max_rate:
+                    self.rate = min(self.max_rate, self.rate + self.max_rate * ADDITIVE_STEP)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_rate": round(self.max_rate, 3),
+                "rate": round(self.rate, 3),
+                "throttled": self.throttled,
+                "waited_s": round(self.waited, 3),
+                "paused_s": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            }
+
+
+def configure(rates: Dict[str, float]):
+    """Set budgets in units per second, e.g. {"vk": 3, "telegram": 25, "ai:siliconflow": 1000}
+
+    A budget "name:sub" not listed here uses the rate of "name"; other
+    budgets have no rate limit but still back off on 429.
+    Existing budgets whose rate changed are updated in place so waiting
+    callers pick up the new rate; the others keep their state.
+    """
+    with _lock:
+        _rates.clear()
+        _rates.update({name: rate for name, rate in rates.items() if rate})
+        for name, bucket in _buckets.items():
+            rate = _rate_for(name)
+            if rate != bucket.max_rate:
+                bucket.configure(rate)
+    logger.info(f"Rate budgets: {', '.join(f'{name}={rate:g}/s' for name, rate in _rates.items()) or 'unlimited'}")
+
+
+def _rate_for(name: str) -> float:
+    # "vk:2"这类子预算未单独配置时使用"vk"的速率
+    return _rates.get(name, _rates.get(name.split(":")[0], 0))
+
+
+def get_budget(name: str) -> Budget:
+    with _lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            bucket = _buckets[name] = Budget(name, _rate_for(name))
+        return bucket
+
+
+def acquire(name: str, cost: float = 1, priority: int = None, timeout: float = None) -> bool:
+    """Ask the governor before making a call against a budget"""
+    return get_budget(name).acquire(cost, priority, timeout)
+
+
+def feedback(name: str, throttled: bool = False, error: bool = False, retry_after: Optional[float] = None):
+    get_budget(name).feedback(throttled, error, retry_after)
+
+
+@contextlib.contextmanager
+def interactive():
+    """Run the enclosed calls (e.g. a user-triggered refresh) ahead of background work"""
+    token = _priority.set(PRIORITY_INTERACTIVE)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    with _lock:
+        buckets = list(_buckets.items())
+    return {name: bucket.stats() for name, bucket in buckets}
@@ -0,0 +1,267 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from src import profiling, rate_governor
+from src.event_catalogue import QUERY_CATEGORIES
+from src.prompt_builder import KEY_FACT_RE, clean_post_text
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shadow_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    model TEXT NOT NULL,
+    label INTEGER,
+    reference INTEGER,
+    ok INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    tokens INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_shadow_results_source ON shadow_results (source, created_at);
+"""
+
+SOURCE_SHADOW = "shadow"
+SOURCE_OFFLINE = "offline"
+LOCAL_MODEL = "local:prefilter"
+
+
+def candidate_id(candidate: Dict[str, Any]) -> str:
+    if candidate.get("name") == "local":
+        return LOCAL_MODEL
+    return f"{candidate.get('name')}:{candidate.get('model')}"
+
+
+def local_activity(text: str, min_facts: int = 3) -> bool:
+    """Rule-based prefilter: enough distinct date, time, place and ticket facts, or a category word plus a date"""
+    cleaned = clean_post_text(text).lower()
+    facts = {match.group(0).strip() for match in KEY_FACT_RE.finditer(cleaned)}
+    has_category = any(stem in cleaned for stem in QUERY_CATEGORIES)
+    return len(facts) >= min_facts or (has_category and len(facts) >= min_facts - 1)
+
+
+class ShadowEvaluator:
+    """Runs candidate classifiers next to the live one and records how they compare
+
+    For a sampled fraction of posts every candidate (another provider/model,
+    or ``{"name": "local"}`` for the rule-based prefilter) classifies the same
+    text on a small background pool, after the live decision has been made,
+    so delivery never waits for it. Samples are skipped while the pool is
+    full or the candidate's AI rate budget has no spare capacity. Labels,
+    latency and estimated tokens are stored in SQLite; offline runs over a
+    labelled dataset use the same table with the true label as reference.
+    """
+
+    def __init__(self, text_processor, candidates: List[Dict[str, Any]], path: str, sample_rate: float = 0.1,
+                 max_workers: int = 2, max_pending: int = 100):
+        """Initialize evaluator
+
+        Args:
+            text_processor: TextProcessor used for AI classification
+            candidates: Provider configurations to compare against the live classifier
+            path: SQLite file for the results
+            sample_rate: Fraction of live posts sent to the candidates
+            max_workers: Background threads running candidate calls
+            max_pending: Samples are dropped while this many are waiting
+        """
+        self.text_processor = text_processor
+        self.candidates = candidates or []
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shadow")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+    def classify(self, candidate: Dict[str, Any], text: str) -> Dict[str, Any]:
+        """Classify with one candidate, same result shape as TextProcessor.classify_activity
+
+        Calls are timed under their own "shadow.<name>" profiling span, apart from the live classifier.
+        """
+        span_name = f"shadow.{candidate.get('name')}"
+        if candidate.get("name") == "local":
+            with profiling.span(span_name):
+                started = time.time()
+                is_activity = local_activity(text, candidate.get("min_facts", 3))
+            return {"is_activity": is_activity, "model": LOCAL_MODEL, "ok": True,
+                    "latency": time.time() - started, "tokens": 0}
+        return self.text_processor.classify_activity(text, provider=candidate, span_name=span_name)
+
+    def _record(self, source: str, item_key: str, result: Dict[str, Any], reference: Optional[bool]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO shadow_results (created_at, source, item_key, model, label, reference, ok, latency, tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), source, item_key, result.get("model") or "unknown", int(result["is_activity"]),
+                 None if reference is None else int(reference), int(result["ok"]), result["latency"], result["tokens"])
+            )
+
+    def _has_budget(self, candidate: Dict[str, Any], cost: float) -> bool:
+        # 影子调用只使用空闲的AI额度，不与实时分类争抢
+        if candidate.get("name") == "local":
+            return True
+        return rate_governor.get_budget(f"ai:{candidate.get('name')}").delay(cost) == 0
+
+    def observe(self, item_key: str, text: str, live_result: Dict[str, Any]):
+        """Record a live classification and maybe send the post to the candidates in the background"""
+        if not self.candidates or random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return
+            self._pending += 1
+        self._executor.submit(self._run_sample, item_key, text, live_result)
+
+    def _run_sample(self, item_key: str, text: str, live_result: Dict[str, Any]):
+        try:
+            reference = live_result["is_activity"] if live_result.get("ok") else None
+            self._record(SOURCE_SHADOW, item_key, live_result, reference)
+            for candidate in self.candidates:
+                if not self._has_budget(candidate, live_result.get("tokens") or 1):
+                    continue
+                self._record(SOURCE_SHADOW, item_key, self.classify(candidate, text), reference)
+        except Exception as e:
+            logger.error(f"Shadow evaluation failed for {item_key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def evaluate_dataset(self, path: str, models: List[Dict[str, Any]], max_workers: int = 4) -> int:
+        """Classify a labelled JSONL dataset ({"text": ..., "is_activity": true}) with every model
+
+        Returns:
+            Number of labelled examples evaluated
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            examples = [json.loads(line) for line in f if line.strip()]
+        examples = [example for example in examples if "text" in example and "is_activity" in example]
+
+        def run(index_example):
+            index, example = index_example
+            item_key = str(example.get("id", index))
+            for model in models:
+                self._record(SOURCE_OFFLINE, item_key, self.classify(model, example["text"]), bool(example["is_activity"]))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(run, enumerate(examples)))
+        return len(examples)
+
+    def report(self, source: str = SOURCE_SHADOW, since: float = None,
+               prices: Dict[str, float] = None) -> List[Dict[str, Any]]:
+        """Per-model comparison: agreement with the reference label, precision/recall, latency and token cost
+
+        Args:
+            source: "shadow" (reference is the live label) or "offline" (reference is the true label)
+            since: Only results recorded after this timestamp
+            prices: Price per 1k tokens by model id, for the cost column
+        """
+        prices = prices or {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT model, label, reference, ok, latency, tokens FROM shadow_results "
+                "WHERE source = ? AND created_at >= ?", (source, since or 0)
+            ).fetchall()
+
+        by_model: Dict[str, List] = {}
+        for row in rows:
+            by_model.setdefault(row[0], []).append(row[1:])
+
+        report = []
+        for model, results in sorted(by_model.items()):
+            latencies = sorted(latency for _, _, _, latency, _ in results)
+            judged = [(label, reference) for label, reference, ok, _, _ in results if ok and reference is not None]
+            true_positive = sum(1 for label, reference in judged if label and reference)
+            predicted = sum(1 for label, _ in judged if label)
+            actual = sum(1 for _, reference in judged if reference)
+            tokens = sum(result[4] for result in results) / len(results)
+            report.append({
+                "model": model,
+                "samples": len(results),
+                "errors": sum(1 for result in results if not result[2]),
+                "agreement": round(sum(1 for label, reference in judged if label == reference) / len(judged), 4) if judged else None,
+                "precision": round(true_positive / predicted, 4) if predicted else None,
+                "recall": round(true_positive / actual, 4) if actual else None,
+                "latency_p50": round(latencies[len(latencies) // 2], 3),
+                "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                "tokens_per_post": round(tokens, 1),
+                "cost_per_1k_posts": round(tokens * prices.get(model, 0.0), 4),
+            })
+        return report
+
+
+def format_report(report: List[Dict[str, Any]]) -> str:
+    """Plain text table of a report"""
+    columns = ["model", "samples", "errors", "agreement", "precision", "recall", "latency_p50", "latency_p95",
+               "tokens_per_post", "cost_per_1k_posts"]
+    rows = [columns] + [["-" if entry[column] is None else str(entry[column]) for column in columns] for entry in report]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "\n".join("  ".join(value.ljust(width) for value, width in zip(row, widths)) for row in rows)
+
+
+def model_prices(config: Dict[str, Any]) -> Dict[str, float]:
+    """Price per 1k tokens of every configured live and candidate model"""
+    default_price = config.get("ai", {}).get("prompt", {}).get("price_per_1k_tokens", 0.0)
+    shadow_config = config.get("ai", {}).get("shadow", {})
+    return {
+        candidate_id(model): model.get("price_per_1k_tokens", default_price)
+        for model in config.get("ai", {}).get("providers", []) + shadow_config.get("candidates", [])
+    }
+
+
+def main():
+    from dotenv import load_dotenv
+    from src.config_loader import load_config
+    from src.text_processor import TextProcessor
+
+    parser = argparse.ArgumentParser(description="Compare activity classifiers (shadow mode results or a labelled dataset)")
+    parser.add_argument("--config", default="src/config/config.yaml", help="Path to config.yaml")
+    parser.add_argument("--dataset", default=None,
+                        help="Labelled JSONL ({\"text\": ..., \"is_activity\": true}) to evaluate live and candidate models on")
+    parser.add_argument("--days", type=float, default=7, help="Report shadow results of the last N days")
+    args = parser.parse_args()
+
+    load_dotenv()
+    config = load_config(args.config)
+    shadow_config = config.get("ai", {}).get("shadow", {})
+    text_processor = TextProcessor(ai_providers=config.get("ai", {}).get("providers", []),
+                                   prompt_config=config.get("ai", {}).get("prompt", {}))
+    evaluator = ShadowEvaluator(text_processor, shadow_config.get("candidates", []),
+                                path=shadow_config.get("path", "data/shadow.db"))
+    try:
+        if args.dataset:
+            started = time.time()
+            count = evaluator.evaluate_dataset(args.dataset,
+                                               config.get("ai", {}).get("providers", []) + evaluator.candidates)
+            report = evaluator.report(SOURCE_OFFLINE, since=started, prices=model_prices(config))
+            print(f"Evaluated {count} labelled examples (agreement = accuracy against the labels)")
+        else:
+            report = evaluator.report(SOURCE_SHADOW, since=time.time() - args.days * 86400, prices=model_prices(config))
+            print(f"Shadow results of the last {args.days:g} days (agreement with the live classifier)")
+        print(format_report(report))
+    finally:
+        evaluator.close()
+
+
+if __name__ == "__main__":
+    main()
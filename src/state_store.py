@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    chat_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    filter TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_chat ON subscriptions (chat_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class StateStore:
+    """SQLite-backed state shared by the webhook, ingest, classify and notify processes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        logger.info(f"State store opened: {path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add_subscriber(self, chat_id):
+        """Register a chat to receive activity notifications"""
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO subscribers (chat_id, created_at) VALUES (?, ?)",
+                               (str(chat_id), time.time()))
+
+    def remove_subscriber(self, chat_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM subscribers WHERE chat_id = ?", (str(chat_id),))
+
+    def get_subscribers(self) -> List[int]:
+        """All registered chat ids"""
+        with self._lock:
+            rows = self._conn.execute("SELECT chat_id FROM subscribers").fetchall()
+        return [int(row[0]) for row in rows]
+
+    def add_subscription(self, chat_id, subscription_filter: Dict[str, Any]) -> int:
+        """Store a notification filter for a chat, returns the subscription id"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO subscriptions (chat_id, filter, created_at) VALUES (?, ?, ?)",
+                (str(chat_id), json.dumps(subscription_filter, ensure_ascii=False), time.time())
+            )
+            self._bump_version("subscriptions")
+        return cursor.lastrowid
+
+    def remove_subscriptions(self, chat_id, subscription_id: int = None) -> int:
+        """Delete one subscription of a chat, or all of them if subscription_id is None"""
+        with self._lock:
+            if subscription_id is None:
+                cursor = self._conn.execute("DELETE FROM subscriptions WHERE chat_id = ?", (str(chat_id),))
+            else:
+                cursor = self._conn.execute("DELETE FROM subscriptions WHERE chat_id = ? AND id = ?",
+                                            (str(chat_id), subscription_id))
+            if cursor.rowcount:
+                self._bump_version("subscriptions")
+        return cursor.rowcount
+
+    def get_subscriptions(self, chat_id=None) -> List[Dict[str, Any]]:
+        """Subscriptions of one chat, or of all chats if chat_id is None"""
+        with self._lock:
+            if chat_id is None:
+                rows = self._conn.execute("SELECT id, chat_id, filter FROM subscriptions ORDER BY id").fetchall()
+            else:
+                rows = self._conn.execute("SELECT id, chat_id, filter FROM subscriptions WHERE chat_id = ? ORDER BY id",
+                                          (str(chat_id),)).fetchall()
+        return [{"id": row[0], "chat_id": int(row[1]), "filter": json.loads(row[2])} for row in rows]
+
+    def get_version(self, key: str) -> int:
+        """Change counter of a piece of state, lets other processes detect updates cheaply"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump_version(self, key: str):
+        self._conn.execute("INSERT INTO meta (key, value) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET value = value + 1",
+                           (key,))
@@ -0,0 +1,178 @@
+import datetime
+import html
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.event_catalogue import QUERY_CATEGORIES, QUERY_CITIES, QUERY_STEM_LENGTH, QUERY_TERM_RE
+
+PRICE_RE = re.compile(r"до\s+(\d+)")
+DATE_RANGE_RE = re.compile(r"(?:с\s+)?(\d{1,2})\.(\d{1,2})(?:\s*(?:-|–|по)\s*(\d{1,2})\.(\d{1,2}))?")
+FILTER_STOPWORDS = frozenset(("в", "на", "во", "и", "с", "по", "до", "про", "для", "все", "любые", "руб", "рублей", "р"))
+
+
+def _stems(text: str) -> Set[str]:
+    """Word stems of a text plus their shorter prefixes, so a keyword shorter than the stem («джаз») matches «джазовый»"""
+    stems = {word[:QUERY_STEM_LENGTH] for word in QUERY_TERM_RE.findall((text or "").lower()) if len(word) > 1}
+    return stems | {stem[:length] for stem in stems for length in range(2, len(stem))}
+
+
+def parse_subscription_filter(text: str, now: float = None) -> Dict[str, Any]:
+    """Parse "/subscribe концерты спб до 1000 с 01.05 по 31.05 джаз" into a subscription filter
+
+    Recognized parts: city, category, "до N" (maximum price), "бесплатно",
+    a date or date range "DD.MM[-DD.MM]"; all remaining words are keywords
+    that must all occur in the event text.
+    """
+    text = (text or "").lower()
+    today = datetime.datetime.fromtimestamp(now or time.time()).replace(hour=0, minute=0, second=0, microsecond=0)
+    subscription_filter: Dict[str, Any] = {}
+
+    price_match = PRICE_RE.search(text)
+    if price_match:
+        subscription_filter["max_price"] = float(price_match.group(1))
+        text = text[:price_match.start()] + " " + text[price_match.end():]
+
+    date_match = DATE_RANGE_RE.search(text)
+    if date_match:
+        day, month, end_day, end_month = date_match.groups()
+        try:
+            start = today.replace(month=int(month), day=int(day))
+            end = today.replace(month=int(end_month or month), day=int(end_day or day))
+            # 已经过去的日期指明年
+            if end < today:
+                start, end = start.replace(year=start.year + 1), end.replace(year=end.year + 1)
+            if end < start:
+                end = end.replace(year=end.year + 1)
+            subscription_filter["start_ts"] = start.timestamp()
+            subscription_filter["end_ts"] = (end + datetime.timedelta(days=1)).timestamp()
+        except ValueError:
+            pass
+        text = text[:date_match.start()] + " " + text[date_match.end():]
+
+    keywords = []
+    for word in QUERY_TERM_RE.findall(text):
+        city = next((name for prefix, name in QUERY_CITIES.items() if word.startswith(prefix)), None)
+        category = next((name for prefix, name in QUERY_CATEGORIES.items() if word.startswith(prefix)), None)
+        if city:
+            subscription_filter["city"] = city
+        elif category:
+            subscription_filter["category"] = category
+        elif word.startswith("бесплат"):
+            subscription_filter["max_price"] = 0.0
+        elif word not in FILTER_STOPWORDS and not word.isdigit():
+            keywords.append(word[:QUERY_STEM_LENGTH])
+
+    if keywords:
+        subscription_filter["keywords"] = sorted(set(keywords))
+    return subscription_filter
+
+
+def describe_filter(subscription_filter: Dict[str, Any]) -> str:
+    """Human readable (HTML escaped) description of a subscription filter"""
+    parts = []
+    if subscription_filter.get("city"):
+        parts.append(f"📍 {subscription_filter['city']}")
+    if subscription_filter.get("category"):
+        parts.append(f"🏷 {subscription_filter['category']}")
+    if subscription_filter.get("keywords"):
+        parts.append("🔎 " + " ".join(subscription_filter["keywords"]))
+    if subscription_filter.get("max_price") is not None:
+        parts.append("💳 " + ("бесплатно" if subscription_filter["max_price"] == 0
+                              else f"до {subscription_filter['max_price']:.0f} ₽"))
+    if subscription_filter.get("start_ts"):
+        start = datetime.datetime.fromtimestamp(subscription_filter["start_ts"]).strftime("%d.%m")
+        end = datetime.datetime.fromtimestamp(subscription_filter["end_ts"] - 1).strftime("%d.%m")
+        parts.append(f"🗓 {start}" + (f"–{end}" if end != start else ""))
+    return html.escape(", ".join(parts) or "все мероприятия")
+
+
+class SubscriptionIndex:
+    """In-memory inverted index over subscription filters
+
+    Every filter is posted under exactly one of its terms — its longest
+    keyword, else its category, else its city, else a wildcard list — so an
+    event only looks at the filters posted under its own terms, city and
+    category and verifies those candidates in full. Chats without any
+    subscription keep receiving every activity.
+    """
+
+    def __init__(self):
+        self._filters: Dict[int, Dict[str, Any]] = {}
+        self._by_keyword: Dict[str, List[int]] = defaultdict(list)
+        self._by_category: Dict[str, List[int]] = defaultdict(list)
+        self._by_city: Dict[str, List[int]] = defaultdict(list)
+        self._wildcard: List[int] = []
+        self._filtered_chats: Set[int] = set()
+        self._lock = threading.Lock()
+        self.version = None
+
+    def rebuild(self, subscriptions: Iterable[Dict[str, Any]], version: int = None):
+        """Replace the index with the given subscriptions (as returned by StateStore.get_subscriptions)"""
+        filters, by_keyword, by_category, by_city = {}, defaultdict(list), defaultdict(list), defaultdict(list)
+        wildcard, filtered_chats = [], set()
+        for subscription in subscriptions:
+            subscription_filter = dict(subscription["filter"], chat_id=subscription["chat_id"])
+            filters[subscription["id"]] = subscription_filter
+            filtered_chats.add(subscription["chat_id"])
+            if subscription_filter.get("keywords"):
+                by_keyword[max(subscription_filter["keywords"], key=len)].append(subscription["id"])
+            elif subscription_filter.get("category"):
+                by_category[subscription_filter["category"]].append(subscription["id"])
+            elif subscription_filter.get("city"):
+                by_city[subscription_filter["city"]].append(subscription["id"])
+            else:
+                wildcard.append(subscription["id"])
+
+        with self._lock:
+            self._filters, self._by_keyword, self._by_category, self._by_city = filters, by_keyword, by_category, by_city
+            self._wildcard, self._filtered_chats = wildcard, filtered_chats
+            self.version = version
+
+    @staticmethod
+    def matches(subscription_filter: Dict[str, Any], event: Dict[str, Any], terms: Set[str]) -> bool:
+        """Check every condition of a filter against an event"""
+        if subscription_filter.get("city") and subscription_filter["city"] != event.get("city"):
+            return False
+        if subscription_filter.get("category") and subscription_filter["category"] != event.get("category"):
+            return False
+        if any(keyword not in terms for keyword in subscription_filter.get("keywords", ())):
+            return False
+        if subscription_filter.get("max_price") is not None:
+            if event.get("price") is None or event["price"] > subscription_filter["max_price"]:
+                return False
+        if subscription_filter.get("start_ts"):
+            if not event.get("start_ts"):
+                return False
+            if not subscription_filter["start_ts"] <= event["start_ts"] < subscription_filter["end_ts"]:
+                return False
+        return True
+
+    def match(self, event: Optional[Dict[str, Any]], text: str = "") -> Set[int]:
+        """Chat ids with at least one subscription matching the event"""
+        event = event or {}
+        terms = _stems(" ".join(filter(None, (text, event.get("title"), event.get("venue")))))
+        with self._lock:
+            candidates = list(self._wildcard)
+            for term in terms:
+                candidates.extend(self._by_keyword.get(term, ()))
+            candidates.extend(self._by_category.get(event.get("category"), ()))
+            candidates.extend(self._by_city.get(event.get("city"), ()))
+            filters = self._filters
+
+        chat_ids = set()
+        for subscription_id in candidates:
+            subscription_filter = filters[subscription_id]
+            if subscription_filter["chat_id"] not in chat_ids and self.matches(subscription_filter, event, terms):
+                chat_ids.add(subscription_filter["chat_id"])
+        return chat_ids
+
+    def recipients(self, subscribers: Iterable[int], event: Optional[Dict[str, Any]], text: str = "") -> List[int]:
+        """Subscribers that should receive an activity: chats without filters plus chats whose filters match"""
+        matched = self.match(event, text)
+        with self._lock:
+            filtered_chats = self._filtered_chats
+        recipients = [chat_id for chat_id in subscribers if chat_id not in filtered_chats]
+        return recipients + sorted(matched)
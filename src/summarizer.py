@@ -0,0 +1,177 @@
+import json
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.ai_api import AIProviderFactory, parse_json_response
+from src.prompt_builder import compact_post_text, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_NAMES = {
+    "zh": "Simplified Chinese",
+    "ru": "Russian",
+    "en": "English",
+}
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You are a professional text summarization assistant. You receive a JSON array of objects with \"id\" and "
+    "\"text\". For every object write a summary in {language} of at most {max_length} characters that keeps the "
+    "core information (what, when, where). Return only a JSON array of objects with \"id\" (copied unchanged) "
+    "and \"summary\", one per input, without explanations."
+)
+
+
+class AdaptiveBatchSizer:
+    """Chooses the summarization batch size from observed latency, failures and token limits
+
+    Additive increase while batches complete fully and within the latency
+    target, multiplicative decrease on failures, missing results or slow
+    responses (AIMD).
+    """
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 32, target_latency: float = 20.0,
+                 max_input_tokens: int = 6000, max_output_tokens: int = 4096):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.latency_ewma = 0.0
+        self.failure_rate = 0.0
+        self._lock = threading.Lock()
+
+    def next_batch(self, token_costs: List[int], output_tokens_per_item: int) -> int:
+        """Number of leading items to put into the next request"""
+        with self._lock:
+            size = self.size
+        count = 0
+        input_tokens = 0
+        for cost in token_costs[:size]:
+            if count and (input_tokens + cost > self.max_input_tokens
+                          or (count + 1) * output_tokens_per_item > self.max_output_tokens):
+                break
+            input_tokens += cost
+            count += 1
+        return max(1, count)
+
+    def record(self, batch_size: int, latency: float, completed: int):
+        """Feed back the outcome of one request"""
+        failure = 1.0 - (completed / batch_size if batch_size else 0.0)
+        with self._lock:
+            self.latency_ewma = latency if not self.latency_ewma else 0.8 * self.latency_ewma + 0.2 * latency
+            self.failure_rate = 0.8 * self.failure_rate + 0.2 * failure
+            if failure > 0 or latency > self.target_latency:
+                self.size = max(self.minimum, self.size // 2)
+            elif batch_size >= self.size:
+                self.size = min(self.maximum, self.size + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"batch_size": self.size, "latency_ewma_s": round(self.latency_ewma, 3),
+                    "failure_rate": round(self.failure_rate, 3)}
+
+
+class SummarizationEngine:
+    """Batch summarization with ID-tagged inputs and ID-tagged JSON output
+
+    A summary can only ever be attached to the post whose id it carries, and
+    ids missing from a response are retried on their own instead of
+    discarding the whole batch.
+    """
+
+    def __init__(self, ai_providers: List[Dict[str, Any]], max_retries: int = 2, token_budget: int = 400,
+                 sizer: Optional[AdaptiveBatchSizer] = None):
+        """Initialize summarization engine
+
+        Args:
+            ai_providers: List of AI provider configurations
+            max_retries: Extra rounds for ids missing from a response
+            token_budget: Estimated tokens of each input text after compaction
+            sizer: Batch sizer, a default AdaptiveBatchSizer if None
+        """
+        self.ai_providers = ai_providers or []
+        self.max_retries = max_retries
+        self.token_budget = token_budget
+        self.sizer = sizer or AdaptiveBatchSizer()
+
+    def summarize(self, texts: List[str], max_length: int = 30, language: str = "zh") -> List[str]:
+        """Summarize texts, returning "" for texts that could not be summarized"""
+        if not texts:
+            return []
+        if not self.ai_providers:
+            logger.error("No AI providers configured for summary generation")
+            return ["" for _ in texts]
+
+        inputs = {str(i + 1): compact_post_text(text, self.token_budget) for i, text in enumerate(texts) if text}
+        summaries: Dict[str, str] = {}
+        # 中文每个字约1个token，其他语言按字符数估算，再加上JSON结构开销
+        output_tokens_per_item = (max_length if language == "zh" else max_length // 2) + 20
+
+        for attempt in range(self.max_retries + 1):
+            pending = [item_id for item_id in inputs if item_id not in summaries]
+            if not pending:
+                break
+            if attempt:
+                logger.info(f"Retrying {len(pending)} missing summaries (round {attempt})")
+
+            while pending:
+                costs = [estimate_tokens(inputs[item_id]) for item_id in pending]
+                size = self.sizer.next_batch(costs, output_tokens_per_item)
+                batch, pending = pending[:size], pending[size:]
+                summaries.update(self._summarize_batch({i: inputs[i] for i in batch}, max_length, language,
+                                                       output_tokens_per_item))
+
+        logger.info(f"Generated {len(summaries)}/{len(inputs)} summaries (sizer: {self.sizer.stats()})")
+        return [summaries.get(str(i + 1), "") for i in range(len(texts))]
+
+    def _summarize_batch(self, batch: Dict[str, str], max_length: int, language: str,
+                         output_tokens_per_item: int) -> Dict[str, str]:
+        """Summarize one batch in a single request, returns {id: summary} for the ids present in the response"""
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT.format(
+                language=LANGUAGE_NAMES.get(language, language), max_length=max_length)},
+            {"role": "user", "content": json.dumps([{"id": i, "text": t} for i, t in batch.items()], ensure_ascii=False)}
+        ]
+
+        started = time.perf_counter()
+        response = ""
+        try:
+            selected_provider = random.choice(self.ai_providers)
+            provider_instance = AIProviderFactory.create_provider(
+                selected_provider["name"], selected_provider["api_key"], selected_provider["model"],
+                selected_provider.get("api_url")
+            )
+            response = provider_instance._execute_with_retry(
+                provider_instance._call_api, messages,
+                max_tokens=output_tokens_per_item * len(batch) + 50, temperature=0.3
+            )
+        except Exception as e:
+            logger.error(f"Failed to generate batch summaries: {str(e)}")
+
+        result = self.parse_summaries(response, batch.keys())
+        self.sizer.record(len(batch), time.perf_counter() - started, len(result))
+        if len(result) < len(batch):
+            logger.warning(f"Summary response covered {len(result)} of {len(batch)} ids")
+        return result
+
+    @staticmethod
+    def parse_summaries(response: str, expected_ids) -> Dict[str, str]:
+        """Extract {id: summary} from a JSON array of {id, summary} objects (or a JSON object keyed by id)"""
+        parsed = parse_json_response(response)
+        expected = {str(i) for i in expected_ids}
+        pairs = []
+        if isinstance(parsed, list):
+            pairs = [(item.get("id"), item.get("summary")) for item in parsed if isinstance(item, dict)]
+        elif isinstance(parsed, dict):
+            pairs = list(parsed.items())
+
+        result = {}
+        for item_id, summary in pairs:
+            item_id = str(item_id)
+            if item_id in expected and isinstance(summary, str) and summary.strip():
+                result[item_id] = summary.strip()
+        return result
@@ -1,29 +1,138 @@
 import logging
 import datetime
-from telegram import Update, BotCommand
-from telegram.ext import Updater, CommandHandler, CallbackContext, MessageHandler, Filters, Dispatcher
-from typing import Dict, Any, Callable, List
-from flask import Flask, request
+import html
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Any, Callable, List
+
+from src import rate_governor
+
+if TYPE_CHECKING:
+    from telegram import Bot
 
 logger = logging.getLogger(__name__)
 
+# 与图片本身有关的BadRequest（file_id失效、图片地址无法下载），其余错误改发纯文本也无济于事
+MEDIA_ERRORS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "file reference expired",
+    "failed to get http url content",
+    "wrong type of the web page content",
+    "wrong file_id",
+    "photo_invalid_dimensions",
+    "image_process_failed",
+)
+
+
+def is_media_error(message: str) -> bool:
+    message = message.lower()
+    return any(error in message for error in MEDIA_ERRORS)
+
 class TelegramAPI:
-    def __init__(self, bot_token: str, webhook_url: str, port: int = 8443):
+    def __init__(self, bot_token: str, webhook_url: str, port: int = 8443, base_url: str = None):
         self.bot_token = bot_token
         self.updater = None
         self.webhook_url = webhook_url
         self.port = port
-        self.flask_app = Flask(__name__)
+        self.base_url = base_url  # Bot API地址，默认https://api.telegram.org/bot
+        self.flask_app = None
+        self._bot = None
+        # 快速启动：端口先于其他模块就绪，handlers注册完成前webhook返回503让Telegram重试
+        self.ready = threading.Event()
+        self.startup_report: Dict[str, Any] = {}
+        self.media_cache = None
+
+    def set_media_cache(self, media_cache):
+        """设置图片file_id缓存，富文本推送时复用已上传的图片"""
+        self.media_cache = media_cache
+
+    @property
+    def bot(self) -> "Bot":
+        """Bot instance used for sending, available before the webhook server starts"""
+        if self.updater:
+            return self.updater.bot
+        if self._bot is None:
+            from telegram import Bot
+            self._bot = Bot(token=self.bot_token, base_url=self.base_url)
+        return self._bot
+
+    def send_message(self, chat_id, text: str, parse_mode: str = 'HTML'):
+        """发送消息，发送速率由rate_governor的telegram预算控制"""
+        return self._send_with_budget(self.bot.send_message, chat_id=chat_id, text=text, parse_mode=parse_mode)
+
+    def _send_with_budget(self, method: Callable, cost: int = 1, **kwargs):
+        from telegram.error import RetryAfter
+
+        rate_governor.acquire("telegram", cost=cost)
+        try:
+            result = method(**kwargs)
+        except RetryAfter as e:
+            rate_governor.feedback("telegram", throttled=True, retry_after=e.retry_after)
+            raise
+        rate_governor.feedback("telegram")
+        return result
+
+    def _remember_file_ids(self, urls: List[str], messages: List[Any]):
+        # Telegram返回的每张图片有多个尺寸，最后一个是最大的
+        for url, message in zip(urls, messages):
+            if getattr(message, "photo", None):
+                self.media_cache.put(url, message.photo[-1].file_id)
+
+    def send_notification(self, chat_id, caption: str, photos: List[str] = None, buttons: List[List[Dict[str, str]]] = None):
+        """发送富文本推送：图片+说明+内联按钮，多张图片合并为相册
+
+        Args:
+            chat_id: Recipient chat
+            caption: HTML caption (at most 1024 characters when photos are attached)
+            photos: Image URLs; Telegram fetches each URL once, later sends reuse the cached file_id
+            buttons: Rows of {"text": ..., "url": ...} inline buttons (not supported by albums)
+        """
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+        from telegram.error import BadRequest
+
+        reply_markup = None
+        if buttons:
+            reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton(b["text"], url=b["url"]) for b in row]
+                                                 for row in buttons])
+        if not photos:
+            return self._send_with_budget(self.bot.send_message, chat_id=chat_id, text=caption, parse_mode="HTML",
+                                          reply_markup=reply_markup)
+
+        cached = [self.media_cache.get(url) if self.media_cache else None for url in photos]
+        media = [file_id or url for file_id, url in zip(cached, photos)]
+        try:
+            if len(media) == 1:
+                message = self._send_with_budget(self.bot.send_photo, chat_id=chat_id, photo=media[0], caption=caption,
+                                                 parse_mode="HTML", reply_markup=reply_markup)
+                messages = [message]
+            else:
+                # 相册不支持内联按钮，按钮链接改为附在说明末尾
+                if buttons:
+                    caption += "\n" + " · ".join(f"<a href='{html.escape(b['url'], quote=True)}'>{html.escape(b['text'])}</a>"
+                                                  for row in buttons for b in row)
+                album = [InputMediaPhoto(item, caption=caption if i == 0 else None, parse_mode="HTML")
+                         for i, item in enumerate(media)]
+                messages = self._send_with_budget(self.bot.send_media_group, cost=len(album), chat_id=chat_id, media=album)
+        except BadRequest as e:
+            # 只有file_id失效或Telegram无法下载图片时才清除缓存并改发纯文本，其他错误照常抛出
+            if not is_media_error(str(e)):
+                raise
+            logger.warning(f"Failed to send photos to {chat_id}, falling back to text: {str(e)}")
+            if self.media_cache:
+                self.media_cache.forget(url for url, file_id in zip(photos, cached) if file_id)
+            return self._send_with_budget(self.bot.send_message, chat_id=chat_id, text=caption, parse_mode="HTML",
+                                          reply_markup=reply_markup)
+
+        if self.media_cache:
+            self._remember_file_ids([url for url, file_id in zip(photos, cached) if not file_id],
+                                    [message for message, file_id in zip(messages, cached) if not file_id])
+        return messages
 
     def start(self, bot):
         """Start Telegram bot"""
         try:
-            self.updater = Updater(token=self.bot_token, use_context=True)
-            
-            # Register handlers to Telegram API
-            dispatcher = self.updater.dispatcher
-            dispatcher.add_handler(CommandHandler("start", bot.start_handler))
-            dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command, bot.keyboard_handler))
+            self.attach(bot)
 
             # 使用webhook模式
             logger.info("Starting bot in webhook mode...")
@@ -35,12 +144,54 @@ class TelegramAPI:
             logger.error(f"Failed to start Telegram bot: {str(e)}")
             raise
 
+    def attach(self, bot):
+        """Register handlers of a VKNewBot and start accepting updates"""
+        from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
+
+        self.updater = Updater(token=self.bot_token, base_url=self.base_url, use_context=True)
+
+        # Register handlers to Telegram API
+        dispatcher = self.updater.dispatcher
+        dispatcher.add_handler(CommandHandler("start", bot.start_handler))
+        dispatcher.add_handler(CommandHandler("profile", bot.profile_handler))
+        dispatcher.add_handler(CommandHandler("reload", bot.reload_handler))
+        dispatcher.add_handler(CommandHandler("events", bot.events_handler))
+        dispatcher.add_handler(CommandHandler("subscribe", bot.subscribe_handler))
+        dispatcher.add_handler(CommandHandler("subscriptions", bot.subscriptions_handler))
+        dispatcher.add_handler(CommandHandler("unsubscribe", bot.unsubscribe_handler))
+        dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command, bot.keyboard_handler))
+        self.ready.set()
+
+    def serve(self):
+        """Fast start: bind the webhook port right away and set the webhook in the background
+
+        Health checks are answered immediately; updates are rejected with 503
+        (and redelivered by Telegram) until attach() has been called.
+        """
+        if not self.webhook_url:
+            logger.error("Webhook URL not configured")
+            return
+
+        started = time.perf_counter()
+        self._setup_flask_app()
+        self.startup_report["flask_import_s"] = round(time.perf_counter() - started, 3)
+        threading.Thread(target=self.set_webhook, daemon=True).start()
+        logger.info(f"Starting webhook server on port {self.port} (fast start)")
+        self.flask_app.run(host='0.0.0.0', port=self.port, ssl_context=None)
+
 
     def _setup_flask_app(self):
         """设置Flask应用和webhook路由"""
+        from flask import Flask, request
+        from telegram import Update
+
+        self.flask_app = Flask(__name__)
+
         @self.flask_app.route(f'/{self.bot_token}', methods=['POST'])
         def webhook():
             """处理webhook请求"""
+            if not self.ready.is_set():
+                return 'Initializing', 503
             update = Update.de_json(request.get_json(force=True), self.updater.bot)
             self.updater.dispatcher.process_update(update)
             return 'OK', 200
@@ -50,22 +201,24 @@ class TelegramAPI:
         @self.flask_app.route('/ping')
         def health_check():
             """健康检查端点，用于外部定时调用"""
+            ready = self.ready.is_set()
             return {
-                'status': 'ok',
+                'status': 'ok' if ready else 'initializing',
                 'service': 'VK Telegram Bot',
                 'timestamp': datetime.datetime.now().isoformat(),
-                'message': 'Service is running'
+                'message': 'Service is running' if ready else 'Service is starting',
+                'startup': self.startup_report
             }, 200, {'Content-Type': 'application/json'}
 
     def set_webhook(self):
         """设置webhook"""
-        if not self.updater or not self.webhook_url:
-            logger.error("Updater or webhook_url not configured")
+        if not self.webhook_url:
+            logger.error("webhook_url not configured")
             return False
         
         try:
             # 设置webhook URL
-            self.updater.bot.set_webhook(
+            self.bot.set_webhook(
                 url=f"{self.webhook_url}/{self.bot_token}",
                 drop_pending_updates=True
             )
@@ -77,11 +230,8 @@ class TelegramAPI:
 
     def delete_webhook(self):
         """删除webhook"""
-        if not self.updater:
-            return
-        
         try:
-            self.updater.bot.delete_webhook()
+            self.bot.delete_webhook()
             logger.info("Webhook deleted")
         except Exception as e:
             logger.error(f"Failed to delete webhook: {str(e)}")
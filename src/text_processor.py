@@ -1,9 +1,15 @@
 import logging
 import random
+import time
 from typing import List, Dict, Any, Optional
 
 # Import AI processor modules
 from src.ai_api import AIProviderFactory
+from src import profiling
+from src.prompt_builder import PromptBuilder, count_message_tokens, estimate_tokens
+from src.translation import TranslationService
+from src.summarizer import SummarizationEngine, AdaptiveBatchSizer
+from src.extractive_summarizer import ExtractiveSummarizer
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,13 +17,45 @@ logger = logging.getLogger(__name__)
 class TextProcessor:
     """Text processing utility class for translation and other text operations"""
     
-    def __init__(self, ai_providers: Optional[List[Dict[str, Any]]] = None):
+    def __init__(self, ai_providers: Optional[List[Dict[str, Any]]] = None, prompt_config: Optional[Dict[str, Any]] = None,
+                 translation_config: Optional[Dict[str, Any]] = None, summary_config: Optional[Dict[str, Any]] = None):
         """Initialize TextProcessor with AI providers
         
         Args:
             ai_providers: List of AI provider configurations
+            prompt_config: Prompt compaction settings (token_budget, pricing and throughput for estimates)
+            translation_config: Translation memory path and batch limits
+            summary_config: Summarization retry and adaptive batch size settings
         """
         self.ai_providers = ai_providers or []
+        translation_config = translation_config or {}
+        self.translation_service = TranslationService(
+            self.ai_providers,
+            memory_path=translation_config.get("memory_path"),
+            max_batch_tokens=translation_config.get("max_batch_tokens", 1500),
+            max_output_tokens=translation_config.get("max_output_tokens", 4096)
+        )
+        prompt_config = prompt_config or {}
+        self.prompt_builder = PromptBuilder(
+            token_budget=prompt_config.get("token_budget", 400),
+            price_per_1k_tokens=prompt_config.get("price_per_1k_tokens", 0.0),
+            cached_price_per_1k_tokens=prompt_config.get("cached_price_per_1k_tokens"),
+            tokens_per_second=prompt_config.get("tokens_per_second", 0.0)
+        )
+        self.extractive_summarizer = ExtractiveSummarizer()
+        summary_config = summary_config or {}
+        self.summarization_engine = SummarizationEngine(
+            self.ai_providers,
+            max_retries=summary_config.get("max_retries", 2),
+            token_budget=prompt_config.get("token_budget", 400),
+            sizer=AdaptiveBatchSizer(
+                initial=summary_config.get("batch_size", 8),
+                maximum=summary_config.get("max_batch_size", 32),
+                target_latency=summary_config.get("target_latency", 20.0),
+                max_input_tokens=summary_config.get("max_input_tokens", 6000),
+                max_output_tokens=summary_config.get("max_output_tokens", 4096)
+            )
+        )
     
     def set_ai_providers(self, ai_providers: List[Dict[str, Any]]):
         """Set AI providers for translation
@@ -26,70 +64,25 @@ class TextProcessor:
             ai_providers: List of AI provider configurations
         """
         self.ai_providers = ai_providers
+        self.translation_service.ai_providers = ai_providers
+        self.summarization_engine.ai_providers = ai_providers
     
     def generate_summaries_batch(self, texts: List[str], max_length: int = 30, language: str = "zh") -> List[str]:
-        """Generate summaries for multiple texts in a single API call to reduce QPS usage"""
+        """Generate summaries for multiple texts with as few API calls as possible
+        
+        Args:
+            texts: Texts to summarize
+            max_length: Maximum summary length in characters
+            language: Summary language code
+            
+        Returns:
+            Summaries in input order, "" for texts that could not be summarized
+        """
         if not texts:
             return []
             
-        if not self.ai_providers:
-            logger.error("No AI providers configured for summary generation")
-            return ["" for _ in texts]
-            
         try:
-            # Randomly select a provider
-            selected_provider = random.choice(self.ai_providers)
-            provider_name = selected_provider["name"]
-            api_key = selected_provider["api_key"]
-            model = selected_provider["model"]
-            logger.info(f"generate summary using model: {provider_name} {model}")
-            # Create provider instance on the fly
-            provider_instance = AIProviderFactory.create_provider(provider_name, api_key, model)
-            
-            # Prepare the batch prompt
-            batch_prompt = "请为以下每个文本分别生成中文摘要，限制在{max_length}字符以内，保留核心信息。\n\n"
-            for i, text in enumerate(texts):
-                batch_prompt += f"--- 文本 {i+1} ---\n"
-                batch_prompt += f"{text}\n\n"
-            
-            batch_prompt += "--- 要求 ---\n"
-            batch_prompt += f"1. 请严格按照文本顺序，为每个文本生成一个摘要\n"
-            batch_prompt += f"2. 每个摘要限制在{max_length}字符以内\n"
-            batch_prompt += "3. 输出格式：每行一个摘要，按顺序排列\n"
-            batch_prompt += "4. Answer only with the final result, no explanations."
-            
-            messages = [
-                {"role": "system", "content": "You are a professional text summarization assistant. You will receive multiple texts and must generate a summary for each one."},
-                {"role": "user", "content": batch_prompt.format(max_length=max_length)}
-            ]
-            
-            # Calculate appropriate max_tokens based on number of texts
-            batch_max_tokens = max_length * len(texts) + 100  # Add buffer
-            
-            response = provider_instance._execute_with_retry(provider_instance._call_api, messages, max_tokens=batch_max_tokens, temperature=0.3)
-            
-            if not response:
-                logger.error("Batch summarization failed, returning empty summaries")
-                return ["" for _ in texts]
-            
-            # Parse the response
-            summaries = []
-            for line in response.strip().split("\n"):
-                line = line.strip()
-                if line:
-                    summaries.append(line)
-            
-            # Ensure we have the same number of summaries as texts
-            # If not, fill missing summaries with empty strings
-            while len(summaries) < len(texts):
-                summaries.append("")
-            
-            # Truncate to match the number of texts if we got more
-            summaries = summaries[:len(texts)]
-            
-            logger.info(f"Successfully generated {len(summaries)} summaries in batch using {provider_name}")
-            return summaries
-            
+            return self.summarization_engine.summarize(texts, max_length=max_length, language=language)
         except Exception as e:
             logger.error(f"Failed to generate batch summaries: {str(e)}")
             return ["" for _ in texts]
@@ -119,17 +112,21 @@ class TextProcessor:
         # Create result list with the same order as input
         results = contents.copy()
         
+        # 本地抽取式摘要：不调用AI，去除话题标签、表情和链接后选取最重要的句子
+        texts = [content["text"] for content in valid_contents]
+        ru_summaries = self.extractive_summarizer.summarize_batch(texts, max_length=ru_max_length)
+        
+        # 可选的AI摘要：成功的替换本地摘要，失败的保留本地摘要
+        if summary_config.get("ru_mode", "extractive") == "llm" and self.ai_providers:
+            ai_summaries = self.generate_summaries_batch(texts, max_length=ru_max_length, language="ru")
+            ru_summaries = [ai or local for ai, local in zip(ai_summaries, ru_summaries)]
+        
         # Process valid contents
         for i, content in enumerate(valid_contents):
-            original_text = content["text"]
-            
-            # Directly truncate original text for Russian summary (no AI generation)
-            ru_summary = original_text[:ru_max_length] + "..." if len(original_text) > ru_max_length else original_text
-            
             # Update the content in the results list
             results[valid_indices[i]] = {
                 **content,
-                "ru_summary": ru_summary
+                "ru_summary": ru_summaries[i]
             }
         
         return results
@@ -143,39 +140,28 @@ class TextProcessor:
         Returns:
             Translated text in Russian
         """
-        if not self.ai_providers:
-            logger.error("No AI providers configured for translation")
-            return ""
-        
         try:
-            # Randomly select an AI provider
-            selected_provider = random.choice(self.ai_providers)
-            provider_name = selected_provider["name"]
-            api_key = selected_provider["api_key"]
-            model = selected_provider["model"]
-            
-            # Create provider instance
-            provider_instance = AIProviderFactory.create_provider(provider_name, api_key, model)
-            
-            # Prepare translation request
-            messages = [
-                {"role": "system", "content": "你是一个专业的翻译助手，请将用户输入的内容准确翻译成俄语，只返回翻译结果，不要添加任何额外说明。"},
-                {"role": "user", "content": text}
-            ]
-            
-            # Call API for translation
-            translated_text = provider_instance._execute_with_retry(
-                provider_instance._call_api, 
-                messages, 
-                max_tokens=50, 
-                temperature=0.1
-            )
-            
-            return translated_text.strip() if translated_text else ""
+            return await self.translation_service.translate(text, "ru")
         except Exception as e:
             logger.error(f"Translation error: {str(e)}")
             return ""
     
+    async def translate_batch(self, texts: List[str], target_language: str = "ru") -> List[str]:
+        """Translate multiple texts in as few API calls as possible
+        
+        Args:
+            texts: Texts to translate
+            target_language: Target language code
+            
+        Returns:
+            Translations in input order, "" for texts that could not be translated
+        """
+        try:
+            return await self.translation_service.translate_batch(texts, target_language)
+        except Exception as e:
+            logger.error(f"Batch translation error: {str(e)}")
+            return ["" for _ in texts]
+    
     def is_activity(self, text: str) -> bool:
         """Check if the given text is an activity/event announcement
         
@@ -185,36 +171,70 @@ class TextProcessor:
         Returns:
             True if the text is an activity, False otherwise
         """
-        if not self.ai_providers:
+        return self.classify_activity(text)["is_activity"]
+    
+    def classify_activity(self, text: str, provider: Optional[Dict[str, Any]] = None,
+                          span_name: str = "text.is_activity") -> Dict[str, Any]:
+        """Classify a post with one provider and report what the call cost
+        
+        Args:
+            text: The text to check
+            provider: Provider configuration to use, a random configured provider if None
+            span_name: Profiling span the call is timed under, so shadow calls do not skew the live stage
+            
+        Returns:
+            Dict with is_activity, model ("provider:model"), ok, latency in seconds and estimated tokens
+        """
+        with profiling.span(span_name):
+            return self._classify_activity(text, provider)
+    
+    def _classify_activity(self, text: str, provider: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        result = {"is_activity": False, "model": None, "ok": False, "latency": 0.0, "tokens": 0}
+        if provider is None and not self.ai_providers:
             logger.error("No AI providers configured for activity detection")
-            return False
+            return result
             
+        started = time.time()
         try:
             # Randomly select a provider
-            selected_provider = random.choice(self.ai_providers)
+            selected_provider = provider or random.choice(self.ai_providers)
             provider_name = selected_provider["name"]
             api_key = selected_provider["api_key"]
             model = selected_provider["model"]
+            result["model"] = f"{provider_name}:{model}"
             
             # Create provider instance on the fly
-            provider_instance = AIProviderFactory.create_provider(provider_name, api_key, model)
+            provider_instance = AIProviderFactory.create_provider(provider_name, api_key, model, selected_provider.get("api_url"))
             
-            # Prepare the prompt for activity detection
-            messages = [
-                {"role": "system", "content": "You are a professional content classifier. Please determine if the given text is an announcement for an upcoming activity or event that meets all the following criteria:\n1. It is an announcement for an activity or event.\n2. The activity has not yet occurred (it is scheduled for the future).\n3. The activity is located in either Moscow or Saint Petersburg.\n4. The activity is a public event that the general public can participate in, such as exhibitions, charity galas, book exchanges, travel, lectures, concerts, public welfare activities, volunteer activities, mountain climbing, skiing, etc.\n5. Shopping mall promotional activities are NOT considered as activities.\n\nReturn only 'YES' if all criteria are met, otherwise return 'NO'. Do not provide any explanations."},
-                {"role": "user", "content": text}
-            ]
+            # Prepare the prompt for activity detection: stable system prefix, compacted post text
+            messages = self.prompt_builder.build_activity_messages(text)
             
             # Call the AI API
             response = provider_instance._execute_with_retry(provider_instance._call_api, messages, max_tokens=10, temperature=0.1)
+            result["tokens"] = count_message_tokens(messages) + estimate_tokens(response or "")
             
             if not response:
                 logger.error("Activity detection failed, returning False")
-                return False
+                return result
             
             # Check the response
-            return response.strip().upper() == "YES"
+            result["is_activity"] = response.strip().upper() == "YES"
+            result["ok"] = True
+            return result
             
         except Exception as e:
             logger.error(f"Failed to detect activity: {str(e)}")
-            return False
+            return result
+        finally:
+            result["latency"] = time.time() - started
+    
+    def estimate_activity_batch(self, texts: List[str]) -> Dict[str, Any]:
+        """Predict prompt tokens, cost and latency of classifying the given posts
+        
+        Args:
+            texts: Post texts to classify
+            
+        Returns:
+            Estimated token counts, cost and latency for the batch
+        """
+        return self.prompt_builder.estimate_activity_batch(texts)
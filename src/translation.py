@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.ai_api import AIProviderFactory, parse_json_response
+from src.prompt_builder import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_NAMES = {
+    "ru": "Russian",
+    "zh": "Simplified Chinese",
+    "en": "English",
+}
+
+TRANSLATION_SYSTEM_PROMPT = (
+    "You are a professional translator. You receive a JSON object whose values are text segments. "
+    "Translate every value into {language} and return a JSON object with exactly the same keys and the "
+    "translations as values. Return only the JSON object, without explanations."
+)
+
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TranslationMemory:
+    """Persistent cache of translations keyed by (source hash, target language)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "source_hash TEXT NOT NULL, target_lang TEXT NOT NULL, translation TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (source_hash, target_lang))"
+        )
+
+    def get_many(self, hashes: List[str], target_lang: str) -> Dict[str, str]:
+        if not hashes:
+            return {}
+        placeholders = ",".join("?" * len(hashes))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT source_hash, translation FROM translations WHERE target_lang = ? AND source_hash IN ({placeholders})",
+                (target_lang, *hashes)
+            ).fetchall()
+        return dict(rows)
+
+    def put_many(self, translations: Dict[str, str], target_lang: str):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations (source_hash, target_lang, translation, created_at) VALUES (?, ?, ?, ?)",
+                [(h, target_lang, t, now) for h, t in translations.items()]
+            )
+
+
+class TranslationService:
+    """Asynchronous translation that batches segments into one structured request
+
+    Blocking provider calls run in worker threads so awaiting a translation
+    never stalls the event loop. Translations are served from the translation
+    memory whenever the same source text was translated before.
+    """
+
+    def __init__(self, ai_providers: List[Dict[str, Any]], memory_path: Optional[str] = None,
+                 max_batch_tokens: int = 1500, max_output_tokens: int = 4096):
+        """Initialize translation service
+
+        Args:
+            ai_providers: List of AI provider configurations
+            memory_path: SQLite path of the translation memory, no persistent cache if None
+            max_batch_tokens: Estimated source tokens per request, larger inputs are split
+            max_output_tokens: Upper bound for max_tokens of a single request
+        """
+        self.ai_providers = ai_providers or []
+        self.memory = TranslationMemory(memory_path) if memory_path else None
+        self.max_batch_tokens = max_batch_tokens
+        self.max_output_tokens = max_output_tokens
+
+    async def translate(self, text: str, target_language: str = "ru") -> str:
+        """Translate one text"""
+        return (await self.translate_batch([text], target_language))[0]
+
+    async def translate_batch(self, texts: List[str], target_language: str = "ru") -> List[str]:
+        """Translate texts, returning "" for texts that could not be translated"""
+        results = ["" for _ in texts]
+        hashes = [source_hash(text) if text else "" for text in texts]
+
+        cached = self.memory.get_many([h for h in set(hashes) if h], target_language) if self.memory else {}
+
+        # 去重后只翻译缓存中没有的文本
+        missing = {}
+        for text, h in zip(texts, hashes):
+            if h and h not in cached and h not in missing:
+                missing[h] = text
+
+        if missing:
+            if not self.ai_providers:
+                logger.error("No AI providers configured for translation")
+            else:
+                chunks = self._split_chunks(list(missing.items()))
+                translated_chunks = await asyncio.gather(
+                    *(self._translate_chunk(chunk, target_language) for chunk in chunks)
+                )
+                translated = {}
+                for chunk_result in translated_chunks:
+                    translated.update(chunk_result)
+                if translated and self.memory:
+                    self.memory.put_many(translated, target_language)
+                cached.update(translated)
+
+        for i, h in enumerate(hashes):
+            if h:
+                results[i] = cached.get(h, "")
+        return results
+
+    def _split_chunks(self, items: List[tuple]) -> List[List[tuple]]:
+        """Group (hash, text) pairs into requests of at most max_batch_tokens source tokens"""
+        chunks = []
+        current = []
+        current_tokens = 0
+        for item in items:
+            tokens = estimate_tokens(item[1])
+            if current and current_tokens + tokens > self.max_batch_tokens:
+                chunks.append(current)
+                current = []
+                current_tokens = 0
+            current.append(item)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _translate_chunk(self, chunk: List[tuple], target_language: str) -> Dict[str, str]:
+        """Translate one chunk in a single request, returns {source hash: translation}"""
+        segments = {str(i + 1): text for i, (_, text) in enumerate(chunk)}
+        language = LANGUAGE_NAMES.get(target_language, target_language)
+        messages = [
+            {"role": "system", "content": TRANSLATION_SYSTEM_PROMPT.format(language=language)},
+            {"role": "user", "content": json.dumps(segments, ensure_ascii=False)}
+        ]
+
+        # 输出长度按输入估算：译文约为原文的2倍token，再加上JSON结构开销
+        source_tokens = sum(estimate_tokens(text) for _, text in chunk)
+        max_tokens = min(self.max_output_tokens, source_tokens * 2 + 10 * len(chunk) + 50)
+
+        try:
+            selected_provider = random.choice(self.ai_providers)
+            provider_instance = AIProviderFactory.create_provider(
+                selected_provider["name"], selected_provider["api_key"], selected_provider["model"],
+                selected_provider.get("api_url")
+            )
+            response = await asyncio.to_thread(
+                provider_instance._execute_with_retry, provider_instance._call_api, messages,
+                max_tokens=max_tokens, temperature=0.1
+            )
+        except Exception as e:
+            logger.error(f"Translation error: {str(e)}")
+            return {}
+
+        parsed = parse_json_response(response)
+        if not isinstance(parsed, dict):
+            # 单个文本时允许模型直接返回译文
+            if len(chunk) == 1 and response and not response.lstrip().startswith(("{", "[")):
+                return {chunk[0][0]: response.strip()}
+            logger.error(f"Failed to parse translation response: {(response or '')[:200]}")
+            return {}
+
+        result = {}
+        for key, (h, _) in zip(segments, chunk):
+            value = parsed.get(key)
+            if isinstance(value, str) and value.strip():
+                result[h] = value.strip()
+        if len(result) < len(chunk):
+            logger.warning(f"Translation returned {len(result)} of {len(chunk)} segments")
+        return result
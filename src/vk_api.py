@@ -1,47 +1,165 @@
 import requests
-import time
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from src import rate_governor
+from src.profiling import traced
 
 logger = logging.getLogger(__name__)
 
+# VK限流相关错误码：6 每秒请求过多，9 洪水控制，29 达到方法调用上限
+RATE_LIMIT_ERROR_CODES = (6, 9, 29)
+# 令牌级错误：5 授权失败（令牌被撤销），6 令牌每秒请求过多，29 令牌达到调用上限；换用其他令牌重试
+TOKEN_ERROR_CODES = (5, 6, 29)
+
+
+class VKAPIError(Exception):
+    """A VK request failed: transport error, HTTP error status or VK API error"""
+
+
+class TokenState:
+    """One service token of the pool with its own rate budget and error state"""
+
+    def __init__(self, index: int, token: str):
+        self.index = index
+        self.token = token
+        self.budget = f"vk:{index}"
+        self.in_flight = 0
+        self.disabled_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.last_error = None
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.disabled_until
+
+
 class VKAPI:
-    def __init__(self, access_token: str, api_version: str = "5.131"):
-        self.access_token = access_token  # 服务令牌
+    def __init__(self, access_token: str = None, api_version: str = "5.131", base_url: str = None,
+                 access_tokens: List[str] = None, throttle_cooldown: float = 1.0, quota_cooldown: float = 3600,
+                 revoked_cooldown: float = 6 * 3600, archive=None, archive_mode: str = "off"):
+        """Initialize VK API client
+
+        Args:
+            access_token: Service token
+            api_version: VK API version
+            base_url: API endpoint, https://api.vk.com/method by default
+            access_tokens: Pool of service tokens; each token has its own rate budget (vk:<index>)
+            throttle_cooldown: Seconds a token is out of rotation after error 6 (too many requests per second)
+            quota_cooldown: Seconds a token is out of rotation after error 29 (rate limit reached)
+            revoked_cooldown: Seconds a token is out of rotation after error 5 (authorization failed)
+            archive: VKArchive used to record or replay responses
+            archive_mode: "off", "record" (archive every successful response) or "replay" (answer from the archive, no network)
+        """
+        tokens = [t for t in (access_tokens or []) + ([access_token] if access_token else []) if t]
+        # 未设置的环境变量占位符不是有效令牌
+        tokens = list(dict.fromkeys(t for t in tokens if not t.startswith("${")))
+        if not tokens:
+            logger.error("No VK access token configured")
+        self.tokens = [TokenState(i, token) for i, token in enumerate(tokens)]
         self.api_version = api_version
-        self.base_url = "https://api.vk.com/method"
-        self.rate_limit_delay = 0.34  # VK API rate limit: 3 requests per second
+        self.base_url = base_url or "https://api.vk.com/method"
+        self.cooldowns = {5: revoked_cooldown, 6: throttle_cooldown, 29: quota_cooldown}
+        self._lock = threading.Lock()
+        self.archive = archive
+        self.archive_mode = archive_mode if archive is not None else "off"
+        logger.info(f"VK API initialized with {len(self.tokens)} access token(s)")
+
+    def _acquire_token(self, exclude: set) -> Optional[TokenState]:
+        """选择负载最低的可用令牌：预计等待时间最短，其次是进行中的请求最少"""
+        now = time.time()
+        with self._lock:
+            candidates = [t for t in self.tokens if t.index not in exclude and t.healthy(now)]
+            if not candidates:
+                return None
+            state = min(candidates, key=lambda t: (rate_governor.get_budget(t.budget).delay(), t.in_flight, t.requests))
+            state.in_flight += 1
+            state.requests += 1
+            return state
+
+    def _disable_token(self, state: TokenState, error_code: int, error_msg: str):
+        cooldown = self.cooldowns.get(error_code, 0)
+        with self._lock:
+            state.errors += 1
+            state.last_error = error_code
+            state.disabled_until = max(state.disabled_until, time.time() + cooldown)
+        logger.warning(f"VK token #{state.index} out of rotation for {cooldown:.0f}s after error {error_code}: {error_msg}")
+
+    def token_stats(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [{"token": t.index, "healthy": t.healthy(now), "in_flight": t.in_flight, "requests": t.requests,
+                     "errors": t.errors, "last_error": t.last_error} for t in self.tokens]
     
-    def _make_request(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def _failed(message: str, raise_errors: bool) -> Dict[str, Any]:
+        if raise_errors:
+            raise VKAPIError(message)
+        return {}
+
+    @traced("vk.request")
+    def _make_request(self, method: str, params: Dict[str, Any], raise_errors: bool = False) -> Dict[str, Any]:
         """发送VK API请求并处理响应
         
         Args:
             method: VK API方法名
             params: 请求参数
+            raise_errors: 失败时抛出VKAPIError，而不是返回空字典（需要区分"没有结果"和"请求失败"的调用方使用）
         """
-        params.update({
-            "access_token": self.access_token,
-            "v": self.api_version
-        })
-        
-        try:
-            response = requests.get(f"{self.base_url}/{method}", params=params)
-            time.sleep(self.rate_limit_delay)
-            
-            if response.status_code != 200:
-                logger.error(f"VK API请求失败，状态码: {response.status_code}")
-                return {}
-            
-            data = response.json()
-            if "error" in data:
-                logger.error(f"VK API错误: {data['error']['error_msg']}")
-                return {}
-            
-            return data.get("response", {})
-            
-        except Exception as e:
-            logger.error(f"VK API request exception: {str(e)}")
-            return {}
+        if self.archive_mode == "replay":
+            response = self.archive.replay(method, params)
+            if response is None:
+                logger.warning(f"No archived response for {method} {params}")
+                return self._failed(f"no archived response for {method}", raise_errors)
+            return response
+
+        tried = set()
+        while True:
+            state = self._acquire_token(tried)
+            if state is None:
+                logger.error(f"VK API请求失败: no healthy access token for {method}")
+                return self._failed(f"no healthy access token for {method}", raise_errors)
+            tried.add(state.index)
+
+            try:
+                rate_governor.acquire(state.budget)
+                response = requests.get(f"{self.base_url}/{method}",
+                                        params={**params, "access_token": state.token, "v": self.api_version})
+                
+                if response.status_code != 200:
+                    logger.error(f"VK API请求失败，状态码: {response.status_code}")
+                    rate_governor.feedback(state.budget, throttled=response.status_code == 429,
+                                           error=response.status_code >= 500)
+                    return self._failed(f"HTTP {response.status_code} from {method}", raise_errors)
+                
+                data = response.json()
+                if "error" in data:
+                    error_code = data["error"].get("error_code")
+                    logger.error(f"VK API错误: {data['error']['error_msg']}")
+                    rate_governor.feedback(state.budget, throttled=error_code in RATE_LIMIT_ERROR_CODES)
+                    if error_code in TOKEN_ERROR_CODES:
+                        self._disable_token(state, error_code, data["error"].get("error_msg", ""))
+                        continue
+                    return self._failed(f"VK error {error_code} from {method}: {data['error'].get('error_msg', '')}",
+                                        raise_errors)
+                
+                rate_governor.feedback(state.budget)
+                result = data.get("response", {})
+                if self.archive_mode == "record":
+                    self.archive.record(method, params, result)
+                return result
+                
+            except VKAPIError:
+                raise
+            except Exception as e:
+                logger.error(f"VK API request exception: {str(e)}")
+                rate_governor.feedback(state.budget, error=True)
+                return self._failed(f"{method} request failed: {str(e)}", raise_errors)
+            finally:
+                with self._lock:
+                    state.in_flight -= 1
     
     def resolve_screen_name(self, screen_name: str) -> str:
         """Resolve a screen name to its corresponding object ID"""
@@ -95,7 +213,8 @@ class VKAPI:
         response = self._make_request("wall.get", params)
         return response.get("items", [])
     
-    def get_newsfeed(self, count: int = 10, start_time: int = None, end_time: int = None, keyword: str = "новости", start_from: str = None) -> List[Dict[str, Any]]:
+    def get_newsfeed(self, count: int = 10, start_time: int = None, end_time: int = None, keyword: str = "новости", start_from: str = None,
+                     raise_errors: bool = False) -> List[Dict[str, Any]]:
         """Get newsfeed content using VK newsfeed.search API
         
         Args:
@@ -104,13 +223,16 @@ class VKAPI:
             end_time: Latest timestamp (in Unix time) of a news item to return
             keyword: Search keyword for newsfeed search
             start_from: Start parameter for pagination
+            raise_errors: Raise VKAPIError when the request fails instead of returning no items
             
         Returns:
             Tuple containing list of newsfeed items and next page token
         """
         params = {
             "q": keyword,  # 搜索关键词
-            "count": count
+            "count": count,
+            "extended": 1,
+            "fields": "members_count"  # 社区人数，用于计算分类优先级
         }
         
         # Add optional parameters if provided
@@ -121,9 +243,16 @@ class VKAPI:
         if start_from:
             params["start_from"] = start_from
         
-        response = self._make_request("newsfeed.search", params)
+        response = self._make_request("newsfeed.search", params, raise_errors=raise_errors)
         items = response.get("items", [])
         next_page = response.get("next_from")
+
+        # 将社区人数附加到社区发布的帖子上（owner_id为负数）
+        community_sizes = {group.get("id"): group.get("members_count", 0) for group in response.get("groups", [])}
+        for item in items:
+            owner_id = item.get("owner_id", 0)
+            if owner_id < 0 and -owner_id in community_sizes:
+                item["community_size"] = community_sizes[-owner_id]
         return items, next_page
 
     def get_community_content(self, communities: List[Dict[str, Any]], community_name: str, max_content_per_fetch: int = 20) -> List[Dict[str, Any]]:
@@ -182,5 +311,22 @@ class VKAPI:
             "author": author,
             "date": date,
             "url": url,
+            "photos": self._photo_urls(item),
             "raw": item
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def _photo_urls(item: Dict[str, Any], limit: int = 10) -> List[str]:
+        """帖子附件中的图片地址（每张取最大尺寸），最多limit张"""
+        urls = []
+        for attachment in item.get("attachments") or []:
+            if attachment.get("type") != "photo":
+                continue
+            sizes = attachment.get("photo", {}).get("sizes") or []
+            if sizes:
+                largest = max(sizes, key=lambda size: size.get("width", 0) * size.get("height", 0))
+                if largest.get("url"):
+                    urls.append(largest["url"])
+            if len(urls) >= limit:
+                break
+        return urls
\ No newline at end of file
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # 未安装zstandard时使用zlib压缩
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+# 帧头：负载长度、压缩格式
+FRAME_HEADER = struct.Struct("<IB")
+REQUEST_INDEX_DTYPE = np.dtype([("key", "<u8"), ("offset", "<u8")])
+POST_INDEX_DTYPE = np.dtype([("owner", "<i8"), ("post", "<i8"), ("offset", "<u8"), ("item", "<u4")])
+# 排序后的帖子索引：先是全部(owner, post)键，再是对应的(offset, item)，键连续存放以便直接二分查找
+POST_KEY_DTYPE = np.dtype([("owner", "<i8"), ("post", "<i8")])
+POST_VALUE_DTYPE = np.dtype([("offset", "<u8"), ("item", "<u4")])
+DATA_FILE = "responses.bin"
+REQUEST_INDEX_FILE = "requests.idx"
+POST_INDEX_FILE = "posts.idx"
+SORTED_POST_INDEX_FILE = "posts.sorted.idx"
+
+
+def request_key(method: str, params: Dict[str, Any]) -> int:
+    """Stable 64-bit key of a request; the access token is never part of params"""
+    canonical = json.dumps([method, {k: str(v) for k, v in params.items()}], sort_keys=True, ensure_ascii=False)
+    return int.from_bytes(hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class VKArchive:
+    """Append-only archive of VK API responses for record and replay
+
+    Every response is one independently compressed frame (zstd if the
+    ``zstandard`` package is installed, zlib otherwise) holding a JSON
+    record, so any frame can be decoded on its own. Two fixed-width binary
+    indexes map request keys and (owner_id, post_id) to frame offsets. Frames
+    are written before their index entries, so an interrupted write never
+    leaves an index entry pointing past the data. Reads go through mmap and
+    a small cache of decoded frames. ``finalize`` (called by ``close``)
+    writes the post index sorted by (owner_id, post_id), so post lookups
+    binary-search the mapped file; entries recorded after that are kept in
+    a dict until the next finalize.
+    """
+
+    def __init__(self, path: str, frame_cache_size: int = 64, compression_level: int = 3):
+        """Open or create an archive
+
+        Args:
+            path: Archive directory
+            frame_cache_size: Number of decoded frames kept in memory
+            compression_level: zstd (or zlib) compression level
+        """
+        self.path = path
+        self.frame_cache_size = frame_cache_size
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._frames: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._mmap = None
+        self._mapped_size = 0
+        self._sorted_keys: Optional[np.ndarray] = None
+        self._sorted_values: Optional[np.ndarray] = None
+        self._post_tail: Optional[Dict[Tuple[int, int], Tuple[int, int]]] = None
+        self._replay_cursors: Dict[int, int] = defaultdict(int)
+        self._requests: Optional[Dict[int, List[int]]] = None
+
+        os.makedirs(path, exist_ok=True)
+        self._data = open(os.path.join(path, DATA_FILE), "ab+")
+        self._request_index = open(os.path.join(path, REQUEST_INDEX_FILE), "ab")
+        self._post_index_file = open(os.path.join(path, POST_INDEX_FILE), "ab")
+        self._compressor = zstandard.ZstdCompressor(level=compression_level) if zstandard else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def close(self):
+        self.finalize()
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._data.close()
+            self._request_index.close()
+            self._post_index_file.close()
+
+    def _compress(self, payload: bytes) -> Tuple[bytes, int]:
+        if self._compressor is not None:
+            return self._compressor.compress(payload), CODEC_ZSTD
+        return zlib.compress(payload, self.compression_level), CODEC_ZLIB
+
+    def _decompress(self, payload: bytes, codec: int) -> bytes:
+        if codec == CODEC_ZSTD:
+            if self._decompressor is None:
+                raise RuntimeError("Archive frame is zstd-compressed, install the zstandard package to read it")
+            return self._decompressor.decompress(payload)
+        return zlib.decompress(payload)
+
+    def record(self, method: str, params: Dict[str, Any], response: Dict[str, Any]):
+        """Append a response and index it by request and by the posts it contains"""
+        key = request_key(method, params)
+        line = json.dumps({"method": method, "params": params, "time": time.time(), "response": response},
+                          ensure_ascii=False).encode("utf-8")
+        payload, codec = self._compress(line)
+
+        posts = []
+        items = response.get("items") if isinstance(response, dict) else None
+        for i, item in enumerate(items or []):
+            if isinstance(item, dict) and "id" in item and "owner_id" in item:
+                posts.append((item["owner_id"], item["id"], 0, i))
+
+        with self._lock:
+            self._data.seek(0, os.SEEK_END)
+            offset = self._data.tell()
+            self._data.write(FRAME_HEADER.pack(len(payload), codec) + payload)
+            self._data.flush()
+            self._request_index.write(np.array([(key, offset)], dtype=REQUEST_INDEX_DTYPE).tobytes())
+            self._request_index.flush()
+            if posts:
+                entries = np.array(posts, dtype=POST_INDEX_DTYPE)
+                entries["offset"] = offset
+                self._post_index_file.write(entries.tobytes())
+                self._post_index_file.flush()
+            # 新记录的帖子在下次finalize之前从内存中的字典查找
+            if self._post_tail is not None:
+                for owner_id, post_id, _, item in posts:
+                    self._post_tail[(owner_id, post_id)] = (offset, item)
+            if self._requests is not None:
+                self._requests.setdefault(key, []).append(offset)
+
+    def _view(self) -> Optional[mmap.mmap]:
+        size = os.path.getsize(os.path.join(self.path, DATA_FILE))
+        if size == 0:
+            return None
+        if self._mmap is None or size != self._mapped_size:
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self._data.fileno(), size, access=mmap.ACCESS_READ)
+            self._mapped_size = size
+        return self._mmap
+
+    def _read_frame(self, offset: int, cache: bool = True) -> Optional[Dict[str, Any]]:
+        """Decode the frame at offset, None for a truncated frame at the end of the file"""
+        frame = self._frames.get(offset)
+        if frame is not None:
+            self._frames.move_to_end(offset)
+            return frame
+        view = self._view()
+        if view is None or offset + FRAME_HEADER.size > len(view):
+            return None
+        length, codec = FRAME_HEADER.unpack_from(view, offset)
+        start = offset + FRAME_HEADER.size
+        if start + length > len(view):
+            return None
+        frame = json.loads(self._decompress(view[start:start + length], codec))
+        if not cache:
+            return frame
+        self._frames[offset] = frame
+        if len(self._frames) > self.frame_cache_size:
+            self._frames.popitem(last=False)
+        return frame
+
+    @staticmethod
+    def _load_index(path: str, dtype: np.dtype) -> np.ndarray:
+        size = os.path.getsize(path) // dtype.itemsize
+        if size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(size,))
+
+    def finalize(self):
+        """Rewrite the sorted post index if posts were recorded since it was last written"""
+        with self._lock:
+            self._post_index_file.flush()
+            index_path = os.path.join(self.path, POST_INDEX_FILE)
+            sorted_path = os.path.join(self.path, SORTED_POST_INDEX_FILE)
+            count = os.path.getsize(index_path) // POST_INDEX_DTYPE.itemsize
+            if count == self._sorted_count():
+                return
+            index = self._load_index(index_path, POST_INDEX_DTYPE)[:count]
+            # 按(owner, post)排序，同一帖子多次记录时最后一次排在最后
+            order = np.lexsort((np.arange(count), index["post"], index["owner"]))
+            entries = index[order]
+            keys = np.empty(count, dtype=POST_KEY_DTYPE)
+            values = np.empty(count, dtype=POST_VALUE_DTYPE)
+            for name in POST_KEY_DTYPE.names:
+                keys[name] = entries[name]
+            for name in POST_VALUE_DTYPE.names:
+                values[name] = entries[name]
+            with open(sorted_path + ".tmp", "wb") as f:
+                f.write(keys.tobytes())
+                f.write(values.tobytes())
+            os.replace(sorted_path + ".tmp", sorted_path)
+            self._sorted_keys = self._sorted_values = self._post_tail = None
+
+    def _sorted_count(self) -> int:
+        path = os.path.join(self.path, SORTED_POST_INDEX_FILE)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // (POST_KEY_DTYPE.itemsize + POST_VALUE_DTYPE.itemsize)
+
+    def _load_posts(self):
+        """Map the sorted post index and read the entries recorded after it into a dict, once per archive"""
+        if self._post_tail is not None:
+            return
+        index = self._load_index(os.path.join(self.path, POST_INDEX_FILE), POST_INDEX_DTYPE)
+        count = self._sorted_count()
+        if count > len(index):
+            # 排序索引与原始索引不一致（例如原始索引被截断），全部从原始索引读取
+            count = 0
+        if count:
+            path = os.path.join(self.path, SORTED_POST_INDEX_FILE)
+            self._sorted_keys = np.memmap(path, dtype=POST_KEY_DTYPE, mode="r", shape=(count,))
+            self._sorted_values = np.memmap(path, dtype=POST_VALUE_DTYPE, mode="r",
+                                            offset=count * POST_KEY_DTYPE.itemsize, shape=(count,))
+        else:
+            self._sorted_keys = self._sorted_values = None
+        tail = index[count:]
+        self._post_tail = {
+            (owner_id, post_id): (offset, item)
+            for owner_id, post_id, offset, item in zip(tail["owner"].tolist(), tail["post"].tolist(),
+                                                       tail["offset"].tolist(), tail["item"].tolist())
+        }
+
+    def get_post(self, owner_id: int, post_id: int) -> Optional[Dict[str, Any]]:
+        """Most recently recorded version of a post, or None"""
+        with self._lock:
+            self._load_posts()
+            entry = self._post_tail.get((owner_id, post_id))
+            if entry is None and self._sorted_keys is not None:
+                end = int(np.searchsorted(self._sorted_keys, np.array((owner_id, post_id), dtype=POST_KEY_DTYPE), "right"))
+                if end and tuple(self._sorted_keys[end - 1].tolist()) == (owner_id, post_id):
+                    value = self._sorted_values[end - 1]
+                    entry = (int(value["offset"]), int(value["item"]))
+            if entry is None:
+                return None
+            frame = self._read_frame(entry[0])
+        if frame is None:
+            return None
+        return frame["response"]["items"][entry[1]]
+
+    def replay(self, method: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Recorded response of a request, None if it was never recorded
+
+        A request recorded several times is answered with its responses in
+        recording order; after the last one it keeps returning the last.
+        """
+        key = request_key(method, params)
+        with self._lock:
+            if self._requests is None:
+                self._requests = defaultdict(list)
+                index = self._load_index(os.path.join(self.path, REQUEST_INDEX_FILE), REQUEST_INDEX_DTYPE)
+                for entry_key, offset in zip(index["key"].tolist(), index["offset"].tolist()):
+                    self._requests[entry_key].append(offset)
+            offsets = self._requests.get(key)
+            if not offsets:
+                return None
+            position = min(self._replay_cursors[key], len(offsets) - 1)
+            self._replay_cursors[key] += 1
+            frame = self._read_frame(offsets[position])
+        return frame["response"] if frame else None
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """All recorded responses in order, decoded frame by frame"""
+        offset = 0
+        while True:
+            with self._lock:
+                view = self._view()
+                if view is None or offset + FRAME_HEADER.size > len(view):
+                    return
+                length, _ = FRAME_HEADER.unpack_from(view, offset)
+                frame = self._read_frame(offset, cache=False)
+            if frame is None:
+                return
+            yield frame
+            offset += FRAME_HEADER.size + length
+
+    def iter_posts(self) -> Iterator[Dict[str, Any]]:
+        """Every archived post item in recording order"""
+        for frame in self.iter_records():
+            items = frame["response"].get("items") if isinstance(frame["response"], dict) else None
+            for item in items or []:
+                if isinstance(item, dict) and "owner_id" in item:
+                    yield item
@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 由本机器人创建的规则tag前缀，同步规则时只管理带此前缀的规则
+RULE_TAG_PREFIX = "kw_"
+
+
+class VKStreamingClient:
+    """VK Streaming API client: keeps stream rules in sync with keywords and receives posts in real time"""
+
+    def __init__(self, vk_api, endpoint: str = None, key: str = None, secure: bool = True,
+                 reconnect_delay: float = 5, max_reconnect_delay: float = 300, gap_overlap: int = 60):
+        """Initialize streaming client
+
+        Args:
+            vk_api: VKAPI instance used for streaming.getServerUrl
+            endpoint: Streaming host (e.g. "streaming.vk.com"); resolved via VK API if empty
+            key: Streaming access key; resolved via VK API if empty
+            secure: Use https/wss (disable for a local fake stream server)
+            reconnect_delay: Initial reconnect delay in seconds
+            max_reconnect_delay: Upper bound for exponential reconnect backoff
+            gap_overlap: Seconds subtracted from the disconnect time when backfilling a gap
+        """
+        self.vk_api = vk_api
+        self.configured_endpoint = endpoint
+        self.configured_key = key
+        self.endpoint = endpoint
+        self.key = key
+        self.secure = secure
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.gap_overlap = gap_overlap
+        # 流覆盖到的最后时间点，断线重连后从此处回补
+        self.covered_until = 0
+
+    def _resolve_server(self) -> bool:
+        """Get streaming endpoint and key via streaming.getServerUrl"""
+        if self.endpoint and self.key:
+            return True
+
+        response = self.vk_api._make_request("streaming.getServerUrl", {})
+        endpoint = response.get("endpoint")
+        key = response.get("key")
+        if not endpoint or not key:
+            logger.error("Failed to get VK streaming server url")
+            return False
+
+        self.endpoint = endpoint
+        self.key = key
+        logger.info(f"VK streaming endpoint resolved: {endpoint}")
+        return True
+
+    def _reset_server(self):
+        """Forget a resolved endpoint/key so that the next connect resolves a fresh one"""
+        self.endpoint = self.configured_endpoint
+        self.key = self.configured_key
+
+    def _rules_url(self) -> str:
+        scheme = "https" if self.secure else "http"
+        return f"{scheme}://{self.endpoint}/rules"
+
+    def _stream_url(self) -> str:
+        scheme = "wss" if self.secure else "ws"
+        return f"{scheme}://{self.endpoint}/stream?key={self.key}"
+
+    @staticmethod
+    def build_rules(keywords: List[str]) -> Dict[str, str]:
+        """Derive stream rules from keywords
+
+        Every keyword becomes one rule (all words must be present in the post).
+        The tag is a stable hash of the normalized keyword, so re-syncing the
+        same keyword list never recreates existing rules.
+
+        Returns:
+            Mapping of rule tag to rule value
+        """
+        rules = {}
+        for keyword in keywords:
+            value = " ".join(str(keyword).split())
+            if not value:
+                continue
+            digest = hashlib.sha1(value.lower().encode("utf-8")).hexdigest()[:12]
+            rules[f"{RULE_TAG_PREFIX}{digest}"] = value
+        return rules
+
+    def get_rules(self) -> Optional[List[Dict[str, Any]]]:
+        """Get the rules currently installed on the stream, None on failure"""
+        try:
+            response = requests.get(self._rules_url(), params={"key": self.key}, timeout=10)
+            data = response.json()
+            if data.get("code") != 200:
+                logger.error(f"VK streaming get rules error: {data.get('error')}")
+                return None
+            return data.get("rules") or []
+        except Exception as e:
+            logger.error(f"VK streaming get rules exception: {str(e)}")
+            return None
+
+    def _add_rule(self, tag: str, value: str) -> bool:
+        try:
+            response = requests.post(self._rules_url(), params={"key": self.key},
+                                     json={"rule": {"value": value, "tag": tag}}, timeout=10)
+            data = response.json()
+            if data.get("code") != 200:
+                logger.error(f"VK streaming add rule '{value}' error: {data.get('error')}")
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"VK streaming add rule exception: {str(e)}")
+            return False
+
+    def _delete_rule(self, tag: str) -> bool:
+        try:
+            response = requests.delete(self._rules_url(), params={"key": self.key},
+                                       json={"tag": tag}, timeout=10)
+            data = response.json()
+            if data.get("code") != 200:
+                logger.error(f"VK streaming delete rule {tag} error: {data.get('error')}")
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"VK streaming delete rule exception: {str(e)}")
+            return False
+
+    def sync_rules(self, keywords: List[str]) -> bool:
+        """Install missing keyword rules and remove our rules for keywords no longer configured"""
+        existing = self.get_rules()
+        if existing is None:
+            return False
+
+        desired = self.build_rules(keywords)
+        current = {rule.get("tag"): rule.get("value") for rule in existing}
+
+        ok = True
+        for tag in current:
+            if tag and tag.startswith(RULE_TAG_PREFIX) and tag not in desired:
+                ok = self._delete_rule(tag) and ok
+        for tag, value in desired.items():
+            if tag not in current:
+                ok = self._add_rule(tag, value) and ok
+
+        logger.info(f"VK streaming rules synced: {len(desired)} keyword rules")
+        return ok
+
+    @staticmethod
+    def event_to_post(event: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a streaming event into the item structure returned by newsfeed.search"""
+        event_id = event.get("event_id", {})
+        text = event.get("text", "") or ""
+        # 流中的文本用<br>表示换行
+        text = text.replace("<br>", "\n")
+        return {
+            "id": event_id.get("post_id"),
+            "owner_id": event_id.get("post_owner_id"),
+            "date": event.get("creation_time", 0),
+            "text": text,
+            "post_type": event.get("event_type", "post"),
+            "streaming_tags": event.get("tags", [])
+        }
+
+    def _handle_message(self, raw: str, on_post: Callable[[Dict[str, Any]], None]):
+        """Handle one websocket message"""
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning(f"Invalid VK streaming message: {raw[:200]}")
+            return
+
+        code = message.get("code")
+        if code == 300:
+            service = message.get("service_message", {})
+            logger.info(f"VK streaming service message {service.get('service_code')}: {service.get('message')}")
+            return
+        if code != 100:
+            logger.warning(f"Unexpected VK streaming message code: {code}")
+            return
+
+        event = message.get("event", {})
+        # 只处理帖子和转发，忽略评论
+        if event.get("event_type") not in ("post", "share"):
+            return
+
+        post = self.event_to_post(event)
+        if post.get("id") and post.get("owner_id"):
+            on_post(post)
+
+    def _prepare(self, keywords: List[str]) -> bool:
+        """Resolve the stream server and install rules before connecting"""
+        if not self._resolve_server():
+            return False
+        if not self.sync_rules(keywords):
+            # 规则同步失败可能是key过期，下次重新获取
+            self._reset_server()
+            return False
+        return True
+
+    async def run(self, get_keywords: Callable[[], List[str]],
+                  on_post: Callable[[Dict[str, Any]], None],
+                  on_gap: Callable[[int, int], Awaitable[None]]):
+        """Consume the stream forever, reconnecting with backoff
+
+        Args:
+            get_keywords: Returns the current keyword list, rules are re-synced on every connect
+            on_post: Called for every received post (must be cheap, it runs on the event loop)
+            on_gap: Coroutine called with (start_time, end_time) after a reconnect so the caller
+                    can cover the gap with newsfeed.search
+        """
+        import websockets
+
+        delay = self.reconnect_delay
+        while True:
+            connected = False
+            try:
+                prepared = await asyncio.to_thread(self._prepare, get_keywords())
+                if not prepared:
+                    raise ConnectionError("VK streaming server not available")
+
+                async with websockets.connect(self._stream_url()) as ws:
+                    connected = True
+                    delay = self.reconnect_delay
+                    logger.info(f"Connected to VK streaming: {self.endpoint}")
+
+                    if self.covered_until:
+                        gap_start = self.covered_until - self.gap_overlap
+                        gap_end = int(time.time())
+                        logger.info(f"Backfilling VK streaming gap {gap_start} - {gap_end}")
+                        await on_gap(gap_start, gap_end)
+
+                    async for raw in ws:
+                        self._handle_message(raw, on_post)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"VK streaming connection error: {str(e)}")
+                if not connected:
+                    self._reset_server()
+            finally:
+                if connected:
+                    self.covered_until = int(time.time())
+
+            logger.info(f"Reconnecting to VK streaming in {delay} seconds")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
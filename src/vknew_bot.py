@@ -1,9 +1,15 @@
 import logging
 import datetime
+import html
 from typing import Callable, Dict, Any, List
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import CallbackContext
 
+from src import profiling, rate_governor
+from src.event_catalogue import parse_event_query
+from src.message_renderer import MessageRenderer
+from src.subscriptions import describe_filter, parse_subscription_filter
+
 logger = logging.getLogger(__name__)
 
 # Default keyword for searching news in Russian
@@ -14,11 +20,16 @@ class VKNewBot:
         self.user_chat_ids = set()  # 存储从用户消息中获取的聊天ID
         self.user_input_cache = {}  # 存储用户上一次的输入，格式：{chat_id: last_input}
         self.fetch_callback = None
+        self.reload_callback = None
         self.telegram_api = None
         self.vk_api = None
         self.ai_processor = None
         self.text_processor = None
         self.config = {}
+        self.state_store = None
+        self.event_catalogue = None
+        self.post_index = None
+        self.message_renderer = MessageRenderer()
 
     def set_telegram_api(self, telegram_api):
         """设置Telegram API实例"""
@@ -40,15 +51,34 @@ class VKNewBot:
         """设置配置参数"""
         self.config = config
 
+    def set_state_store(self, state_store):
+        """设置共享状态库实例，并加载已注册的用户"""
+        self.state_store = state_store
+        self.user_chat_ids.update(state_store.get_subscribers())
+
+    def set_event_catalogue(self, event_catalogue):
+        """设置本地活动目录实例"""
+        self.event_catalogue = event_catalogue
+
+    def set_post_index(self, post_index):
+        """设置最近帖子的本地向量索引实例"""
+        self.post_index = post_index
+
     def register_fetch_callback(self, callback: Callable):
         """注册内容获取回调函数"""
         self.fetch_callback = callback
 
+    def register_reload_callback(self, callback: Callable):
+        """注册配置热更新回调函数"""
+        self.reload_callback = callback
+
     def start_handler(self, update: Update, context: CallbackContext):
         """处理/start命令"""
         # 存储用户的chat_id
         chat_id = update.message.chat_id
         self.user_chat_ids.add(chat_id)
+        if self.state_store:
+            self.state_store.add_subscriber(chat_id)
         logger.info(f"New user registered with chat_id: {chat_id}")
         
         # 创建Reply Keyboard
@@ -60,6 +90,113 @@ class VKNewBot:
             reply_markup=reply_markup
         )
 
+    def _is_admin(self, chat_id) -> bool:
+        """检查是否为管理员"""
+        admin_chat_ids = self.config.get("telegram", {}).get("admin_chat_ids") or []
+        return chat_id in admin_chat_ids or str(chat_id) in [str(i) for i in admin_chat_ids]
+
+    def profile_handler(self, update: Update, context: CallbackContext):
+        """处理/profile命令：输出各阶段耗时统计（仅管理员）"""
+        chat_id = update.message.chat_id
+        if not self._is_admin(chat_id):
+            logger.warning(f"Non-admin chat {chat_id} requested profiling report")
+            return
+
+        report = profiling.format_report()
+        budgets = rate_governor.get_stats()
+        if budgets:
+            report += "\n\n" + "\n".join(
+                f"{name:<20} {b['rate']:>8.2f}/s of {b['max_rate'] or '∞'}  throttled {b['throttled']}  waited {b['waited_s']:.1f}s"
+                for name, b in budgets.items()
+            )
+        report = html.escape(report)
+        update.message.reply_text(f"<pre>{report}</pre>", parse_mode='HTML')
+
+    def reload_handler(self, update: Update, context: CallbackContext):
+        """处理/reload命令：重新加载配置文件（仅管理员）"""
+        chat_id = update.message.chat_id
+        if not self._is_admin(chat_id) or not self.reload_callback:
+            logger.warning(f"Chat {chat_id} requested config reload")
+            return
+
+        try:
+            changed = self.reload_callback()
+        except Exception as e:
+            update.message.reply_text(f"配置无效，未重新加载：\n<pre>{html.escape(str(e))}</pre>", parse_mode='HTML')
+            return
+        update.message.reply_text("配置已重新加载：" + (", ".join(changed) if changed else "没有变化"))
+
+    def events_handler(self, update: Update, context: CallbackContext):
+        """处理/events命令：从本地活动目录中查询，例如 /events концерты на выходных спб"""
+        query = " ".join(context.args or [])
+        if not self.event_catalogue:
+            update.message.reply_text("活动目录未启用")
+            return
+
+        filters = parse_event_query(query)
+        events = self.event_catalogue.search(limit=self.config.get("system", {}).get("events_per_query", 10), **filters)
+        if not events:
+            update.message.reply_text("没有找到符合条件的活动")
+            return
+
+        update.message.reply_text(self.format_events(events), parse_mode='HTML', disable_web_page_preview=True)
+
+    def subscribe_handler(self, update: Update, context: CallbackContext):
+        """处理/subscribe命令：添加推送过滤条件，例如 /subscribe концерты спб до 1000"""
+        chat_id = update.message.chat_id
+        text = " ".join(context.args or [])
+        if not text:
+            update.message.reply_text("用法：/subscribe <条件>，例如 /subscribe концерты спб до 1000 с 01.05 по 31.05")
+            return
+
+        subscription_filter = parse_subscription_filter(text)
+        self.user_chat_ids.add(chat_id)
+        self.state_store.add_subscriber(chat_id)
+        subscription_id = self.state_store.add_subscription(chat_id, subscription_filter)
+        logger.info(f"Chat {chat_id} added subscription {subscription_id}: {subscription_filter}")
+        update.message.reply_text(f"已添加订阅 #{subscription_id}：{describe_filter(subscription_filter)}", parse_mode='HTML')
+
+    def subscriptions_handler(self, update: Update, context: CallbackContext):
+        """处理/subscriptions命令：列出当前的订阅条件"""
+        subscriptions = self.state_store.get_subscriptions(update.message.chat_id)
+        if not subscriptions:
+            update.message.reply_text("没有订阅条件，将收到所有活动推送")
+            return
+
+        lines = [f"#{item['id']} {describe_filter(item['filter'])}" for item in subscriptions]
+        update.message.reply_text("\n".join(lines), parse_mode='HTML')
+
+    def unsubscribe_handler(self, update: Update, context: CallbackContext):
+        """处理/unsubscribe命令：删除指定订阅，不带参数时停止所有推送"""
+        chat_id = update.message.chat_id
+        args = context.args or []
+        if args and args[0].lstrip("#").isdigit():
+            removed = self.state_store.remove_subscriptions(chat_id, int(args[0].lstrip("#")))
+            update.message.reply_text("已删除订阅" if removed else "未找到该订阅")
+            return
+
+        self.state_store.remove_subscriptions(chat_id)
+        self.state_store.remove_subscriber(chat_id)
+        self.user_chat_ids.discard(chat_id)
+        logger.info(f"Chat {chat_id} unsubscribed from notifications")
+        update.message.reply_text("已停止推送，发送 /start 重新订阅")
+
+    def format_events(self, events: List[Dict[str, Any]]) -> str:
+        """将活动目录中的活动格式化为消息"""
+        lines = []
+        for event in events:
+            when = ""
+            if event.get("start_ts"):
+                when = datetime.datetime.fromtimestamp(event["start_ts"]).strftime("%d.%m %H:%M").replace(" 00:00", "")
+            place = ", ".join(part for part in (event.get("venue"), event.get("city")) if part)
+            line = f"🗓 {html.escape(when)} <a href='{html.escape(event['url'], quote=True)}'><strong>{html.escape(event['title'])}</strong></a>"
+            if place:
+                line += f"\n📍 {html.escape(place)}"
+            if event.get("price") is not None:
+                line += "\n💳 " + ("бесплатно" if event["price"] == 0 else f"от {event['price']:.0f} ₽")
+            lines.append(line)
+        return "\n\n".join(lines)
+
     def keyboard_handler(self, update: Update, context: CallbackContext):
         """处理文本消息事件"""
         keyword = update.message.text
@@ -81,48 +218,33 @@ class VKNewBot:
         """执行刷新操作"""
         try:
             import asyncio
-            # 内容获取和处理
-            result = asyncio.run(self.fetch_and_process_content(chat_id=chat_id, keyword=keyword))
+            # 内容获取和处理：用户主动刷新，VK/AI调用优先于后台任务
+            with rate_governor.interactive():
+                result = asyncio.run(self.fetch_and_process_content(chat_id=chat_id, keyword=keyword))
             if result and "success" in result and result["success"]:
-                update.message.reply_text(result["message"],parse_mode='HTML')       
+                # 结果较多时按帖子边界拆分为多条消息依次发送
+                for message in result["messages"]:
+                    update.message.reply_text(message, parse_mode='HTML')
             else:
                 update.message.reply_text(result["message"])         
         except Exception as e:
             logger.error(f"Search error: {str(e)}")
             update.message.reply_text("处理请求时出错，请稍后重试")
     
-    def generate_multiple_processed_content(self, contents: List[Dict[str, Any]], chat_id=None):
-        """Send multiple processed contents as a single message"""
-        message = ""
-        
-        for i, content in enumerate(contents, 1):
-            # Get content fields
-            ru_summary = content.get("ru_summary", "")
-            url = content.get("url", "")
-            date_timestamp = content.get("date", 0)
-            
-            # Convert timestamp to readable time
-            if date_timestamp:
-                try:
-                    publish_time = datetime.datetime.fromtimestamp(date_timestamp).strftime("%Y-%m-%d %H:%M")
-                except Exception as e:
-                    logger.error(f"Failed to convert timestamp {date_timestamp}: {e}")
-                    publish_time = ""
-            else:
-                publish_time = ""
-            
-            # Format with publish time outside link
-            message += f"🔗 <a href='{url}'><strong>{ru_summary[:50]}</strong></a>\n"
-            message += f"<code>{ru_summary}（{publish_time}）</code>"
-            
-            # Consistent spacing at the end
-            message += "\n"
-        
-        # Remove trailing newlines
-        message = message.rstrip("\n")
+    def generate_multiple_processed_content(self, contents: List[Dict[str, Any]], chat_id=None) -> List[str]:
+        """Render processed contents into as few messages as possible, each within Telegram's length limit"""
+        return self.message_renderer.render(contents)
 
-        return message
-        
+    def _search_local(self, keyword: str) -> List[Dict[str, Any]]:
+        """从本地向量索引检索，命中数少于min_results时返回空列表"""
+        if not self.post_index or not keyword:
+            return []
+        index_config = self.config.get("system", {}).get("post_index", {})
+        hits = self.post_index.search(keyword, k=index_config.get("results", 10),
+                                      min_score=index_config.get("min_score", 0.15))
+        if len(hits) < index_config.get("min_results", 3):
+            return []
+        return [dict(content) for _, content in hits]
 
     async def fetch_and_process_content(self, chat_id: str = None, keyword: str = None) -> Dict[str, Any]:
         """Fetch content, process and send
@@ -132,18 +254,23 @@ class VKNewBot:
             keyword: Optional, Search keyword for VK API
         """
         try:
-            logger.info("Starting VK content fetch...")
-            
-            # Fetch newsfeed content
-            raw_content_list = self.vk_api.get_newsfeed(keyword=keyword)
+            # 优先从本地向量索引检索最近采集的帖子（语义匹配），结果太少时再调用VK搜索
+            content_list = self._search_local(keyword)
+            if content_list:
+                logger.info(f"Answered query from local index with {len(content_list)} posts: {keyword}")
+            else:
+                logger.info("Starting VK content fetch...")
+                
+                # Fetch newsfeed content
+                raw_content_list, _ = self.vk_api.get_newsfeed(keyword=keyword)
 
-            logger.info(f"Fetched {len(raw_content_list)} VK items")
-            
-            # Process all fetched content regardless of whether it's been processed before
-            content_list = []
-            for raw_content in raw_content_list:
-                content = self.vk_api.format_content(raw_content)
-                content_list.append(content)
+                logger.info(f"Fetched {len(raw_content_list)} VK items")
+                
+                # Process all fetched content regardless of whether it's been processed before
+                content_list = []
+                for raw_content in raw_content_list:
+                    content = self.vk_api.format_content(raw_content)
+                    content_list.append(content)
             
             if not content_list:
                 logger.info("No content to process")
@@ -153,23 +280,23 @@ class VKNewBot:
             ai_config = self.config.get("ai", {})
             processed_contents = self.text_processor.process_content_batch(content_list, ai_config)
             
-            # Send all processed contents as a single message if there are any
-            if processed_contents:
-                # Filter contents to ensure we only send messages with all required fields
-                filtered_contents = [
-                    content for content in processed_contents
-                    if content.get("ru_summary", "") and content.get("url", "")
-                ]
-                
-                if not filtered_contents:
-                    logger.info("No valid content to send (missing ru_summary or url)")
-                    return {"success": False, "message": "获取消息失败"}
-                message = self.generate_multiple_processed_content(filtered_contents, chat_id=chat_id)
-                if not message:
-                    logger.error("Failed to send multiple processed contents")
-                    return {"success": False, "message": "发送内容失败"}
+            # Filter contents to ensure we only send messages with all required fields
+            filtered_contents = [
+                content for content in processed_contents or []
+                if content.get("ru_summary", "") and content.get("url", "")
+            ]
+            
+            if not filtered_contents:
+                logger.info("No valid content to send (missing ru_summary or url)")
+                return {"success": False, "message": "获取消息失败"}
+            
+            # Render all processed contents into as few messages as the length limit allows
+            messages = self.generate_multiple_processed_content(filtered_contents, chat_id=chat_id)
+            if not messages:
+                logger.error("Failed to send multiple processed contents")
+                return {"success": False, "message": "发送内容失败"}
             
-            return {"success": True, "message": message}
+            return {"success": True, "messages": messages}
             
         except Exception as e:
             logger.error(f"Failed to fetch and process content: {str(e)}")
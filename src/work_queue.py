@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 流水线阶段
+STAGE_CLASSIFY = "classify"
+STAGE_NOTIFY = "notify"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stage TEXT NOT NULL,
+    job_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    priority REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (stage, job_key)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (stage, status, priority DESC, available_at);
+CREATE TABLE IF NOT EXISTS deliveries (
+    item_key TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    delivered_at REAL NOT NULL,
+    PRIMARY KEY (item_key, chat_id)
+);
+"""
+
+
+class WorkQueue:
+    """Durable SQLite-backed queue between the ingest, classify and notify stages
+
+    Jobs are leased rather than popped: a job only disappears from the ready
+    set when it is acked, so a crash between lease and ack makes it available
+    again once its lease expires (at-least-once processing). Deliveries are
+    recorded per (item, chat) so re-running a notify job never sends twice.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300, max_attempts: int = 5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # isolation_level=None：手动管理事务，租约使用BEGIN IMMEDIATE保证多进程安全
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        logger.info(f"Work queue opened: {path}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(self, stage: str, key: str, payload: Dict[str, Any], priority: float = 0, delay: float = 0) -> bool:
+        """Add a job unless one with the same key already exists in the stage
+
+        Finished and failed jobs keep their key until purge removes them, so a
+        key is deduplicated for the whole retention period.
+
+        Returns:
+            True if a new job was created
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (stage, job_key, payload, priority, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (stage, key, json.dumps(payload, ensure_ascii=False), priority, now + delay, now, now)
+            )
+            return cursor.rowcount > 0
+
+    def lease(self, stage: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Lease up to limit ready jobs, highest priority first
+
+        Ready jobs are pending jobs whose available_at has passed, plus leased
+        jobs whose lease expired (their worker died). An expired job that
+        already used max_attempts is marked failed instead.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 租约过期且已达最大尝试次数的任务直接标记失败，不再重新租出
+                exhausted = self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', lease_until = NULL, last_error = ?, updated_at = ? "
+                    "WHERE stage = ? AND status = 'leased' AND lease_until < ? AND attempts >= ?",
+                    ("lease expired after max attempts", now, stage, now, self.max_attempts)
+                ).rowcount
+                rows = self._conn.execute(
+                    "SELECT id, job_key, payload, attempts, priority FROM jobs "
+                    "WHERE stage = ? AND ((status = 'pending' AND available_at <= ?) "
+                    "OR (status = 'leased' AND lease_until < ?)) "
+                    "ORDER BY priority DESC, id LIMIT ?",
+                    (stage, now, now, limit)
+                ).fetchall()
+                for row in rows:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'leased', lease_until = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (now + self.lease_seconds, now, row["id"])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if exhausted:
+            logger.error(f"{exhausted} {stage} jobs failed: lease expired after {self.max_attempts} attempts")
+        return [{
+            "id": row["id"],
+            "key": row["job_key"],
+            "payload": json.loads(row["payload"]),
+            "attempts": row["attempts"] + 1,
+            "priority": row["priority"]
+        } for row in rows]
+
+    def ack(self, job_id: int):
+        """Mark a job as done"""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'done', lease_until = NULL, updated_at = ? WHERE id = ?",
+                               (time.time(), job_id))
+
+    def retry(self, job: Dict[str, Any], error: str, delay: float = 30):
+        """Return a failed job to the queue, or give up after max_attempts"""
+        now = time.time()
+        status = "failed" if job["attempts"] >= self.max_attempts else "pending"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, lease_until = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+                (status, now + delay, error[:500], now, job["id"])
+            )
+        if status == "failed":
+            logger.error(f"Job {job['key']} failed after {job['attempts']} attempts: {error}")
+
+    def defer(self, job: Dict[str, Any], delay: float):
+        """Return a leased job to the queue without counting the attempt"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'pending', available_at = ?, lease_until = NULL, attempts = attempts - 1, "
+                "updated_at = ? WHERE id = ?",
+                (now + delay, now, job["id"])
+            )
+
+    def recover(self) -> int:
+        """Release every leased job, used on startup when no other worker can hold a lease
+
+        Returns:
+            Number of jobs returned to pending
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'pending', lease_until = NULL, updated_at = ? WHERE status = 'leased'",
+                (time.time(),)
+            )
+        if cursor.rowcount:
+            logger.info(f"Recovered {cursor.rowcount} interrupted jobs")
+        return cursor.rowcount
+
+    def is_delivered(self, item_key: str, chat_id) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM deliveries WHERE item_key = ? AND chat_id = ?",
+                                     (item_key, str(chat_id))).fetchone()
+        return row is not None
+
+    def mark_delivered(self, item_key: str, chat_id):
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO deliveries (item_key, chat_id, delivered_at) VALUES (?, ?, ?)",
+                               (item_key, str(chat_id), time.time()))
+
+    def purge(self, older_than: float = 7 * 86400) -> int:
+        """Delete finished jobs and delivery records older than the given age in seconds"""
+        cutoff = time.time() - older_than
+        with self._lock:
+            jobs = self._conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                                      (cutoff,)).rowcount
+            self._conn.execute("DELETE FROM deliveries WHERE delivered_at < ?", (cutoff,))
+        return jobs
+
+    def payloads(self, stage: str, after_id: int = 0, since: float = 0, limit: int = 1000) -> List[Tuple[int, Dict[str, Any]]]:
+        """Payloads of jobs in a stage created after since, in id order starting after after_id
+
+        Lets processes that do not ingest (the webhook role) read the posts
+        other processes enqueued.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM jobs WHERE stage = ? AND id > ? AND created_at >= ? ORDER BY id LIMIT ?",
+                (stage, after_id, since, limit)
+            ).fetchall()
+        return [(row["id"], json.loads(row["payload"])) for row in rows]
+
+    def pending_count(self, stage: Optional[str] = None) -> int:
+        query = "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'leased')"
+        params = ()
+        if stage:
+            query += " AND stage = ?"
+            params = (stage,)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Job counts by stage and status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT stage, status, COUNT(*) AS n FROM jobs GROUP BY stage, status").fetchall()
+        result = {}
+        for row in rows:
+            result.setdefault(row["stage"], {})[row["status"]] = row["n"]
+        return result
@@ -0,0 +1,59 @@
+from src.backfill import BackfillCrawler
+from src.vk_api import VKAPIError
+
+HOUR = 3600
+
+
+class StubVK:
+    """newsfeed.search stand-in returning one post per slice, failing for the listed keywords"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    def get_newsfeed(self, count, keyword, start_time, end_time, start_from=None, raise_errors=False):
+        self.calls.append((keyword, start_time, end_time))
+        if keyword in self.failing:
+            raise VKAPIError("HTTP 500 from newsfeed.search")
+        return [{"owner_id": -1, "id": start_time, "text": keyword}], None
+
+
+def test_failed_slice_stays_pending_and_is_resumed(tmp_path):
+    path = str(tmp_path / "backfill.db")
+    received = []
+
+    crawler = BackfillCrawler(StubVK(failing={"лекция"}), path, slice_seconds=HOUR)
+    stats = crawler.run(["концерт", "лекция"], 0, 2 * HOUR, received.extend)
+    assert stats["failed"] == 2
+    assert stats["slices"] == 2
+    assert crawler.progress() == {"done": 2, "pending": 2}
+    assert sorted(crawler.plan(["концерт", "лекция"], 0, 2 * HOUR)) == [("лекция", 0, HOUR), ("лекция", HOUR, 2 * HOUR)]
+    crawler.close()
+
+    vk = StubVK()
+    crawler = BackfillCrawler(vk, path, slice_seconds=HOUR)
+    stats = crawler.run(["концерт", "лекция"], 0, 2 * HOUR, received.extend)
+    # 只重试失败的时间片
+    assert sorted(vk.calls) == [("лекция", 0, HOUR), ("лекция", HOUR, 2 * HOUR)]
+    assert stats == {"slices": 2, "split": 0, "failed": 0, "posts": 2}
+    assert crawler.progress() == {"done": 4}
+    assert crawler.plan(["концерт", "лекция"], 0, 2 * HOUR) == []
+    assert len(received) == 4
+    crawler.close()
+
+
+def test_saturated_slice_is_split(tmp_path):
+    class PagedVK(StubVK):
+        def get_newsfeed(self, count, keyword, start_time, end_time, start_from=None, raise_errors=False):
+            self.calls.append((keyword, start_time, end_time))
+            # 整个时间片一页取不完，拆分后的半片可以取完
+            more = "next" if end_time - start_time > HOUR else None
+            return [{"owner_id": -1, "id": len(self.calls)}], more
+
+    crawler = BackfillCrawler(PagedVK(), str(tmp_path / "backfill.db"), slice_seconds=2 * HOUR,
+                              min_slice_seconds=HOUR // 2, max_pages=1)
+    stats = crawler.run(["концерт"], 0, 2 * HOUR, lambda posts: None)
+    assert stats["split"] == 1
+    assert stats["slices"] == 2
+    assert crawler.progress() == {"split": 1, "done": 2}
+    crawler.close()
@@ -0,0 +1,83 @@
+import logging
+
+import pytest
+
+from src.config_loader import ConfigError, changed_sections, load_config, resolve_env_vars, validate_config
+
+MINIMAL = """
+telegram:
+  bot_token: "${TEST_BOT_TOKEN}"  # 注释中的 ${NOT_A_VAR} 不会被替换
+ai:
+  providers:
+    - name: siliconflow
+      api_key: "${TEST_AI_KEY}"
+      model: qwen
+"""
+
+
+def _write(tmp_path, text):
+    path = tmp_path / "config.yaml"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_load_resolves_values_and_ignores_comments(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv("TEST_BOT_TOKEN", "123:abc")
+    monkeypatch.delenv("TEST_AI_KEY", raising=False)
+    with caplog.at_level(logging.WARNING, logger="src.config_loader"):
+        config = load_config(_write(tmp_path, MINIMAL))
+    assert config["telegram"]["bot_token"] == "123:abc"
+    # 未设置的变量保留占位符，只报告变量名
+    assert config["ai"]["providers"][0]["api_key"] == "${TEST_AI_KEY}"
+    assert "TEST_AI_KEY" in caplog.text
+    assert "NOT_A_VAR" not in caplog.text
+
+
+def test_resolve_env_vars_nested(monkeypatch):
+    monkeypatch.setenv("TEST_HOST", "example.org")
+    monkeypatch.delenv("TEST_MISSING", raising=False)
+    value, missing = resolve_env_vars({"urls": ["https://${TEST_HOST}/a", {"b": "${TEST_MISSING}"}], "port": 8443})
+    assert value == {"urls": ["https://example.org/a", {"b": "${TEST_MISSING}"}], "port": 8443}
+    assert missing == ["TEST_MISSING"]
+
+
+def test_schema_errors_are_collected(tmp_path):
+    text = MINIMAL + """
+vk:
+  ingest_mode: push
+  keywords: [концерт, 3]
+system:
+  fetch_interval: true
+  queue:
+    max_attempts: 0
+"""
+    with pytest.raises(ConfigError) as excinfo:
+        load_config(_write(tmp_path, text))
+    assert sorted(excinfo.value.errors) == [
+        "system.fetch_interval must be int or float, got bool",
+        "system.queue.max_attempts must be >= 1, got 0",
+        "vk.ingest_mode must be one of poll, stream, got 'push'",
+        "vk.keywords[1] must be str",
+    ]
+
+
+def test_required_fields_and_list_items():
+    errors = validate_config({"ai": {"providers": [{"name": "openrouter", "model": "x"}]}})
+    assert errors == ["ai.providers[0].api_key is required"]
+    assert validate_config({"telegram": {}, "ai": {"providers": None}}) == [
+        "telegram.bot_token is required", "ai.providers is required"]
+    assert validate_config({"telegram": {"bot_token": "t"}, "ai": {"providers": []}}) == []
+    assert validate_config([1, 2]) == ["config must be a mapping"]
+
+
+def test_missing_and_malformed_files(tmp_path):
+    with pytest.raises(ConfigError, match="config file not found"):
+        load_config(str(tmp_path / "absent.yaml"))
+    with pytest.raises(ConfigError, match="invalid YAML"):
+        load_config(_write(tmp_path, "telegram: [unclosed"))
+
+
+def test_changed_sections():
+    old = {"system": {"queue": {"batch_size": 10}, "log_level": "INFO"}, "vk": {"keywords": ["a"]}}
+    new = {"system": {"queue": {"batch_size": 20}, "log_level": "INFO"}, "vk": {"keywords": ["a"]}, "ai": {}}
+    assert changed_sections(old, new) == ["ai", "system.queue.batch_size"]
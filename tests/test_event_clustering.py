@@ -0,0 +1,79 @@
+import datetime
+
+import pytest
+
+from src import event_clustering
+from src.event_clustering import EventClusterer
+
+ANNOUNCEMENT = ("Приглашаем на концерт камерного оркестра «Времена года» в субботу 16 мая в 19:00 "
+                "в Доме музыки на Английской набережной. Программа: Вивальди, Бах, Гендель. Билеты от 800 рублей.")
+REPOST = ("Концерт камерного оркестра «Времена года» в субботу 16 мая в 19:00, Дом музыки, Английская набережная. "
+          "В программе Вивальди, Бах и Гендель. Билеты от 800 рублей!")
+OTHER = "Лекция о современной архитектуре Петербурга в библиотеке Маяковского, вход свободный, нужна регистрация."
+START = datetime.datetime(2026, 5, 16, 19, 0).timestamp()
+
+
+@pytest.fixture
+def clusterer(tmp_path):
+    return EventClusterer(str(tmp_path / "clusters.db"))
+
+
+def test_near_duplicate_joins_cluster(clusterer):
+    cluster_id, is_new = clusterer.assign("https://vk.com/wall-1_1", ANNOUNCEMENT)
+    assert is_new
+    assert clusterer.assign("https://vk.com/wall-2_1", REPOST) == (cluster_id, False)
+    other_id, is_new = clusterer.assign("https://vk.com/wall-3_1", OTHER)
+    assert is_new and other_id != cluster_id
+    assert clusterer.members(cluster_id) == ["https://vk.com/wall-1_1", "https://vk.com/wall-2_1"]
+
+
+def test_signature_estimates_jaccard(clusterer):
+    a, b = clusterer.shingles(ANNOUNCEMENT), clusterer.shingles(REPOST)
+    jaccard = len(a & b) / len(a | b)
+    estimate = float((clusterer.signature(ANNOUNCEMENT) == clusterer.signature(REPOST)).mean())
+    assert abs(estimate - jaccard) < 0.2
+    partial = "Камерный оркестр «Времена года»: Вивальди, Бах, Гендель. Дом музыки, начало в 19:00."
+    a = clusterer.shingles(partial)
+    b = clusterer.shingles(ANNOUNCEMENT)
+    estimate = float((clusterer.signature(partial) == clusterer.signature(ANNOUNCEMENT)).mean())
+    assert abs(estimate - len(a & b) / len(a | b)) < 0.2
+    assert (clusterer.signature(OTHER) == clusterer.signature(ANNOUNCEMENT)).mean() < 0.2
+
+
+def test_same_day_and_venue_uses_lower_threshold(clusterer):
+    event = {"start_ts": START, "venue": "Дом музыки"}
+    # 与原帖的Jaccard约0.3：低于threshold，高于venue_threshold
+    short = "Камерный оркестр «Времена года»: Вивальди, Бах, Гендель. Дом музыки, начало в 19:00."
+    cluster_id, _ = clusterer.assign("https://vk.com/wall-1_1", ANNOUNCEMENT, event)
+    assert clusterer.assign("https://vk.com/wall-2_1", short, dict(event, start_ts=START + 3600)) == (cluster_id, False)
+
+    other_day = dict(event, start_ts=START + 86400)
+    assert clusterer.assign("https://vk.com/wall-3_1", short, other_day)[0] != cluster_id
+
+
+def test_start_time_mismatch_splits_clusters(clusterer):
+    cluster_id, _ = clusterer.assign("https://vk.com/wall-1_1", ANNOUNCEMENT, {"start_ts": START})
+    other_id, is_new = clusterer.assign("https://vk.com/wall-2_1", REPOST, {"start_ts": START + 7 * 86400})
+    assert is_new and other_id != cluster_id
+
+
+def test_reassigning_a_member_is_idempotent(clusterer):
+    cluster_id, _ = clusterer.assign("https://vk.com/wall-1_1", ANNOUNCEMENT)
+    clusterer.assign("https://vk.com/wall-2_1", REPOST)
+    # 重试时创建簇的帖子仍是新活动，后加入的帖子不是
+    assert clusterer.assign("https://vk.com/wall-1_1", ANNOUNCEMENT) == (cluster_id, True)
+    assert clusterer.assign("https://vk.com/wall-2_1", REPOST) == (cluster_id, False)
+
+
+def test_expire_forgets_old_clusters(clusterer, monkeypatch):
+    cluster_id, _ = clusterer.assign("https://vk.com/wall-1_1", ANNOUNCEMENT)
+    now = event_clustering.time.time()
+    monkeypatch.setattr(event_clustering.time, "time", lambda: now + clusterer.retention + 1)
+    assert clusterer.expire() == 1
+    assert clusterer.members(cluster_id) == []
+    assert clusterer.assign("https://vk.com/wall-2_1", REPOST)[1]
+
+
+def test_bands_must_divide_signature():
+    with pytest.raises(ValueError):
+        EventClusterer(":memory:", num_perm=64, bands=10)
@@ -0,0 +1,56 @@
+import sqlite3
+import time
+from types import SimpleNamespace
+
+from src import media_cache
+from src.media_cache import MediaCache
+
+DAY = 86400
+
+
+def _row(path, url):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT used_at, uses FROM media WHERE url = ?", (url,)).fetchone()
+    finally:
+        conn.close()
+
+
+def test_hits_are_written_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_cache, "FLUSH_SIZE", 2)
+    path = str(tmp_path / "media.db")
+    cache = MediaCache(path)
+    cache.put("https://vk.com/a.jpg", "file-a")
+    cache.put("https://vk.com/b.jpg", "file-b")
+
+    assert cache.get("https://vk.com/a.jpg") == "file-a"
+    assert cache.get("https://vk.com/a.jpg") == "file-a"
+    assert cache.get("https://vk.com/c.jpg") is None
+    # 命中只记在内存中
+    assert _row(path, "https://vk.com/a.jpg")[1] == 0
+
+    assert cache.get("https://vk.com/b.jpg") == "file-b"
+    assert _row(path, "https://vk.com/a.jpg")[1] == 2
+    assert _row(path, "https://vk.com/b.jpg")[1] == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    cache.get("https://vk.com/b.jpg")
+    cache.close()
+    assert _row(path, "https://vk.com/b.jpg")[1] == 2
+
+
+def test_purge_keeps_recently_used_entries(tmp_path, monkeypatch):
+    clock = [1000 * DAY]
+    monkeypatch.setattr(media_cache, "time", SimpleNamespace(time=lambda: clock[0], monotonic=time.monotonic))
+    path = str(tmp_path / "media.db")
+    cache = MediaCache(path)
+    cache.put("https://vk.com/old.jpg", "file-old")
+    cache.put("https://vk.com/used.jpg", "file-used")
+
+    clock[0] += 40 * DAY
+    # 未写回的命中在清理前写入，最近用过的不会被删除
+    assert cache.get("https://vk.com/used.jpg") == "file-used"
+    assert cache.purge(30 * DAY) == 1
+    assert cache.get("https://vk.com/old.jpg") is None
+    assert cache.get("https://vk.com/used.jpg") == "file-used"
+    cache.close()
@@ -0,0 +1,67 @@
+import datetime
+
+from src.message_renderer import (MessageRenderer, build_caption, message_length, pack_messages, truncate_text,
+                                  visible_length)
+
+
+def content(i, summary="Концерт в парке", url=None):
+    return {"url": url or f"https://vk.com/wall-1_{i}", "ru_summary": summary,
+            "date": int(datetime.datetime(2026, 5, 1, 19, 30).timestamp())}
+
+
+def test_message_length_counts_utf16_units():
+    assert message_length("abc") == 3
+    assert message_length("🎉") == 2
+
+
+def test_pack_messages_splits_on_fragment_boundaries():
+    fragments = ["a" * 40, "b" * 40, "c" * 40]
+    assert pack_messages(fragments, limit=81) == ["a" * 40 + "\n" + "b" * 40, "c" * 40]
+    assert pack_messages(fragments, limit=80) == fragments
+    assert pack_messages([], limit=80) == []
+
+
+def test_render_escapes_summary_and_url():
+    renderer = MessageRenderer()
+    [message] = renderer.render([content(1, summary="<script> & \"quotes\"", url="https://vk.com/?a=1&b='2'")])
+    assert "<script>" not in message
+    assert "&lt;script&gt; &amp;" in message
+    assert "href='https://vk.com/?a=1&amp;b=&#x27;2&#x27;'" in message
+    assert "01.05" not in message and "2026-05-01 19:30" in message
+
+
+def test_render_packs_items_within_limit():
+    renderer = MessageRenderer(limit=300)
+    messages = renderer.render([content(i) for i in range(10)])
+    assert len(messages) > 1
+    assert all(message_length(message) <= 300 for message in messages)
+    # 每条帖子完整地出现在某一条消息中
+    assert sum(message.count("<a href=") for message in messages) == 10
+    assert all(message.count("<a href=") == message.count("</code>") for message in messages)
+
+
+def test_oversized_item_summary_is_truncated():
+    renderer = MessageRenderer(limit=500)
+    [message] = renderer.render([content(1, summary="&" * 1000)])
+    assert message_length(message) <= 500
+    assert "…" in message
+    assert "&amp;&amp;" in message and "&&" not in message
+
+
+def test_rendered_items_are_cached():
+    renderer = MessageRenderer(cache_size=1)
+    renderer.render([content(1)])
+    renderer.render([content(1)])
+    assert (renderer.hits, renderer.misses) == (1, 1)
+    renderer.render([content(2), content(1)])
+    assert renderer.misses == 3
+
+
+def test_caption_helpers():
+    assert visible_length("<b>A &amp; B</b>") == 5
+    assert truncate_text("abcdef", 4) == "abc…"
+    assert truncate_text("abc", 4) == "abc"
+    assert truncate_text("🎉🎉🎉", 5) == "🎉🎉…"
+    caption = build_caption("<b>T</b>", "x" * 50, excerpt_length=400, limit=20)
+    assert caption == "<b>T</b>\n\n" + "x" * 16 + "…"
+    assert visible_length(caption) == 20
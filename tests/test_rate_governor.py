@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from src import rate_governor
+
+
+@pytest.fixture(autouse=True)
+def fresh_governor(monkeypatch):
+    monkeypatch.setattr(rate_governor, "_buckets", {})
+    monkeypatch.setattr(rate_governor, "_rates", {})
+
+
+def test_throttle_halves_rate_and_success_recovers():
+    rate_governor.configure({"vk": 10})
+    budget = rate_governor.get_budget("vk")
+    rate_governor.feedback("vk", throttled=True, retry_after=0.01)
+    assert budget.rate == 5
+    rate_governor.feedback("vk", error=True)
+    assert budget.rate == 4
+    for _ in range(5):
+        rate_governor.feedback("vk")
+    assert budget.rate == pytest.approx(6.5)
+    for _ in range(100):
+        rate_governor.feedback("vk")
+    assert budget.rate == 10
+
+
+def test_sub_budget_uses_parent_rate():
+    rate_governor.configure({"ai": 3})
+    assert rate_governor.get_budget("ai:siliconflow").max_rate == 3
+    assert rate_governor.get_budget("telegram").max_rate == 0
+
+
+def test_reload_keeps_backoff_and_tokens():
+    rate_governor.configure({"vk": 10})
+    budget = rate_governor.get_budget("vk")
+    assert rate_governor.acquire("vk", cost=10)
+    rate_governor.feedback("vk", throttled=True, retry_after=0.01)
+    assert budget.rate == 5
+
+    # 其他预算变化不影响vk
+    rate_governor.configure({"vk": 10, "telegram": 25})
+    assert budget.rate == 5
+    assert not rate_governor.acquire("vk", timeout=0)
+
+    # 上限提高时保留退避后的速率，降低时速率不超过新上限
+    rate_governor.configure({"vk": 20, "telegram": 25})
+    assert (budget.max_rate, budget.rate) == (20, 5)
+    assert not rate_governor.acquire("vk", timeout=0)
+    rate_governor.configure({"vk": 2, "telegram": 25})
+    assert (budget.max_rate, budget.rate) == (2, 2)
+
+    # 去掉限制后再次配置从新上限开始
+    rate_governor.configure({})
+    assert budget.rate == 0
+    rate_governor.configure({"vk": 3})
+    assert budget.rate == 3
+
+
+def test_interactive_caller_goes_first():
+    rate_governor.configure({"vk": 5})
+    budget = rate_governor.get_budget("vk")
+    budget.configure(5, burst=1)
+    assert rate_governor.acquire("vk")
+    order = []
+
+    def background():
+        rate_governor.acquire("vk")
+        order.append("background")
+
+    def refresh():
+        with rate_governor.interactive():
+            rate_governor.acquire("vk")
+        order.append("interactive")
+
+    threads = [threading.Thread(target=background), threading.Thread(target=refresh)]
+    threads[0].start()
+    time.sleep(0.05)
+    threads[1].start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ["interactive", "background"]
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from src.main import VKTelegramBot
+from src.message_renderer import TELEGRAM_CAPTION_LIMIT, visible_length
+
+
+def build(content, excerpt_length=2000):
+    bot = SimpleNamespace(config={"telegram": {"rich_notifications": {"excerpt_length": excerpt_length}}},
+                          event_clusterer=None)
+    return VKTelegramBot._build_rich_notification(bot, content["url"], content)
+
+
+def test_long_title_and_excerpt_fit_caption_limit():
+    content = {
+        "url": "https://vk.com/wall-1_1",
+        "text": "Концерт & <джаз> " * 80,
+        "event": {"title": "Большой & <весенний> фестиваль " * 20, "start_ts": 1767225600,
+                  "venue": "Клуб «Мост» & бар", "city": "Москва", "price": 500},
+    }
+    caption = build(content)["caption"]
+    assert visible_length(caption) <= TELEGRAM_CAPTION_LIMIT
+    assert caption.startswith("<b>Большой &amp; &lt;весенний&gt;")
+    assert caption.endswith("…")
+
+
+def test_excerpt_near_limit_uses_visible_length():
+    event = {"title": "Вечер & джаз"}
+    header_length = len("Вечер & джаз") + 2
+    text = "а" * (TELEGRAM_CAPTION_LIMIT - header_length)
+    caption = build({"url": "https://vk.com/wall-1_2", "text": text, "event": event})["caption"]
+    # 标记和转义字符不占可见长度，正好放得下的摘录不应被截断
+    assert caption.endswith(text)
+    assert visible_length(caption) == TELEGRAM_CAPTION_LIMIT
+
+    caption = build({"url": "https://vk.com/wall-1_2", "text": text + "б", "event": event})["caption"]
+    assert caption.endswith("…")
+    assert visible_length(caption) == TELEGRAM_CAPTION_LIMIT
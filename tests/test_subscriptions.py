@@ -0,0 +1,70 @@
+import datetime
+
+from src.subscriptions import SubscriptionIndex, describe_filter, parse_subscription_filter
+
+NOW = datetime.datetime(2026, 4, 20, 12, 0).timestamp()
+
+
+def ts(year, month, day, hour=0):
+    return datetime.datetime(year, month, day, hour).timestamp()
+
+
+def test_parse_full_filter():
+    subscription_filter = parse_subscription_filter("концерты спб до 1000 с 01.05 по 31.05 джаз", now=NOW)
+    assert subscription_filter == {
+        "city": "Санкт-Петербург",
+        "category": "concert",
+        "max_price": 1000.0,
+        "start_ts": ts(2026, 5, 1),
+        "end_ts": ts(2026, 6, 1),
+        "keywords": ["джаз"],
+    }
+
+
+def test_parse_free_and_past_date_rolls_to_next_year():
+    subscription_filter = parse_subscription_filter("бесплатно 10.03 в москве", now=NOW)
+    assert subscription_filter["max_price"] == 0.0
+    assert subscription_filter["city"] == "Москва"
+    assert subscription_filter["start_ts"] == ts(2027, 3, 10)
+    assert subscription_filter["end_ts"] == ts(2027, 3, 11)
+    assert "keywords" not in subscription_filter
+
+
+def test_parse_invalid_date_and_stopwords_are_ignored():
+    subscription_filter = parse_subscription_filter("все выставки 31.02 про импрессионистов", now=NOW)
+    assert subscription_filter == {"category": "exhibition", "keywords": ["импре"]}
+
+
+def test_describe_filter_escapes_html():
+    assert describe_filter({}) == "все мероприятия"
+    assert describe_filter({"keywords": ["<b>"], "max_price": 0.0}) == "🔎 &lt;b&gt;, 💳 бесплатно"
+
+
+def build_index(*filters):
+    index = SubscriptionIndex()
+    index.rebuild([{"id": i, "chat_id": chat_id, "filter": subscription_filter}
+                   for i, (chat_id, subscription_filter) in enumerate(filters)], version=1)
+    return index
+
+
+def test_match_checks_every_condition():
+    index = build_index(
+        (1, {"city": "Москва", "category": "concert", "keywords": ["джаз"]}),
+        (2, {"city": "Москва", "max_price": 0.0}),
+        (3, {"category": "concert", "start_ts": ts(2026, 5, 1), "end_ts": ts(2026, 5, 2)}),
+        (4, {"keywords": ["орган"]}),
+        (5, {}),
+    )
+    event = {"city": "Москва", "category": "concert", "price": 500, "start_ts": ts(2026, 5, 1, 19),
+             "title": "Джазовый вечер"}
+    assert index.match(event, "Приглашаем на концерт") == {1, 3, 5}
+    assert index.match(dict(event, price=0), "") == {1, 2, 3, 5}
+    assert index.match(dict(event, city="Санкт-Петербург", start_ts=None), "органный концерт") == {4, 5}
+    assert index.match(None, "") == {5}
+
+
+def test_recipients_keep_unfiltered_chats():
+    index = build_index((10, {"category": "lecture"}), (11, {"category": "concert"}), (11, {"city": "Москва"}))
+    recipients = index.recipients([10, 11, 12, 13], {"category": "concert", "city": "Москва"})
+    assert recipients == [12, 13, 11]
+    assert index.version == 1
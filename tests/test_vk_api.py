@@ -0,0 +1,71 @@
+from unittest import mock
+
+import pytest
+
+from benchmarks.fake_servers import FakeVKServer
+from src import rate_governor
+from src.vk_api import VKAPI, VKAPIError
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self._data = data or {}
+
+    def json(self):
+        return self._data
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limits(monkeypatch):
+    # 每个测试使用新的预算，前一个测试的限流暂停不会延续
+    monkeypatch.setattr(rate_governor, "_buckets", {})
+    monkeypatch.setattr(rate_governor, "_rates", {})
+
+
+def make_api(*responses, tokens=("a",)):
+    api = VKAPI(access_tokens=list(tokens), throttle_cooldown=60)
+    patcher = mock.patch("src.vk_api.requests.get", side_effect=list(responses))
+    return api, patcher
+
+
+def test_failures_return_empty_result_by_default():
+    api, patcher = make_api(FakeResponse(500))
+    with patcher:
+        assert api.get_newsfeed(keyword="концерт") == ([], None)
+
+
+@pytest.mark.parametrize("response", [
+    FakeResponse(500),
+    FakeResponse(200, {"error": {"error_code": 100, "error_msg": "invalid param"}}),
+    ConnectionError("connection reset"),
+])
+def test_failures_raise_when_asked(response):
+    api, patcher = make_api(response)
+    with patcher, pytest.raises(VKAPIError):
+        api.get_newsfeed(keyword="концерт", raise_errors=True)
+
+
+def test_throttled_token_is_rotated():
+    throttled = FakeResponse(200, {"error": {"error_code": 6, "error_msg": "Too many requests per second"}})
+    ok = FakeResponse(200, {"response": {"items": [{"owner_id": -1, "id": 1}], "groups": []}})
+    api, patcher = make_api(throttled, ok, tokens=("a", "b"))
+    with patcher as get:
+        items, _ = api.get_newsfeed(keyword="концерт", raise_errors=True)
+    assert items == [{"owner_id": -1, "id": 1}]
+    assert [call.kwargs["params"]["access_token"] for call in get.call_args_list] == ["a", "b"]
+    assert [stats["healthy"] for stats in api.token_stats()] == [False, True]
+
+
+def test_fake_vk_server_throttles_like_vk():
+    server = FakeVKServer(rate_limit_rate=1.0).start()
+    try:
+        api = VKAPI(access_tokens=["a", "b"], base_url=f"{server.url}/method", throttle_cooldown=60)
+        with pytest.raises(VKAPIError, match="no healthy access token"):
+            api.get_newsfeed(keyword="концерт", raise_errors=True)
+    finally:
+        server.stop()
+    # HTTP 200加错误6：两个令牌都被限流并移出轮换
+    assert server.counters["rate_limited"] == 2
+    assert [stats["healthy"] for stats in api.token_stats()] == [False, False]
+    assert rate_governor.get_budget("vk:0").throttled == 1
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+from src.main import VKTelegramBot, _parse_post_ids
+from src.vk_archive import VKArchive
+
+PARAMS = {"q": "концерт", "count": 2}
+
+
+def _response(*posts):
+    return {"items": [{"owner_id": owner_id, "id": post_id, "text": text} for owner_id, post_id, text in posts]}
+
+
+def test_record_and_get_post(tmp_path):
+    archive = VKArchive(str(tmp_path))
+    archive.record("newsfeed.search", PARAMS, _response((-1, 10, "a"), (-1, 11, "b")))
+    assert archive.get_post(-1, 11)["text"] == "b"
+    assert archive.get_post(-1, 12) is None
+    # 查找之后记录的帖子也能立即找到
+    archive.record("newsfeed.search", PARAMS, _response((-2, 5, "c")))
+    assert archive.get_post(-2, 5)["text"] == "c"
+    archive.close()
+
+
+def test_finalize_keeps_latest_version_across_reopen(tmp_path):
+    archive = VKArchive(str(tmp_path))
+    archive.record("newsfeed.search", PARAMS, _response((-1, 10, "old"), (-3, 1, "x")))
+    archive.record("newsfeed.search", PARAMS, _response((-1, 10, "new")))
+    archive.close()
+    assert (tmp_path / "posts.sorted.idx").exists()
+
+    archive = VKArchive(str(tmp_path))
+    assert archive.get_post(-1, 10)["text"] == "new"
+    assert archive.get_post(-3, 1)["text"] == "x"
+    # finalize之后追加的记录从未排序的尾部查找
+    archive.record("newsfeed.search", PARAMS, _response((-1, 10, "newest")))
+    archive.close()
+    archive = VKArchive(str(tmp_path))
+    assert archive.get_post(-1, 10)["text"] == "newest"
+    archive.close()
+
+
+def test_replay_returns_responses_in_order_then_repeats_last(tmp_path):
+    archive = VKArchive(str(tmp_path))
+    archive.record("newsfeed.search", PARAMS, _response((-1, 1, "first")))
+    archive.record("newsfeed.search", PARAMS, _response((-1, 2, "second")))
+    archive.close()
+
+    archive = VKArchive(str(tmp_path))
+    texts = [archive.replay("newsfeed.search", PARAMS)["items"][0]["text"] for _ in range(3)]
+    assert texts == ["first", "second", "second"]
+    assert archive.replay("newsfeed.search", {"q": "лекция"}) is None
+    assert [post["id"] for post in archive.iter_posts()] == [1, 2]
+    archive.close()
+
+
+def test_replay_archive_selected_posts(tmp_path):
+    archive = VKArchive(str(tmp_path))
+    archive.record("newsfeed.search", PARAMS, _response((-1, 1, "a"), (-1, 2, "b"), (-1, 3, "c")))
+    archive.close()
+
+    enqueued = []
+    bot = SimpleNamespace(config={}, _enqueue_posts=enqueued.extend, _archived_posts=VKTelegramBot._archived_posts)
+    total = VKTelegramBot.replay_archive(bot, str(tmp_path), post_ids=_parse_post_ids("-1_3, wall-1_1,-1_9"))
+    assert total == 2
+    assert [post["text"] for post in enqueued] == ["c", "a"]
+
+
+def test_stop_closes_record_archive(tmp_path):
+    import asyncio
+
+    archive = VKArchive(str(tmp_path))
+    archive.record("newsfeed.search", PARAMS, _response((-1, 1, "a")))
+    bot = SimpleNamespace(vk_archive=archive, telegram_api=None)
+    asyncio.run(VKTelegramBot.stop(bot))
+    assert bot.vk_archive is None
+    assert (tmp_path / "posts.sorted.idx").exists()
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import re
+import time
+
+import pytest
+
+from benchmarks.fake_servers import FakeStreamingServer
+from src import rate_governor
+from src.vk_api import VKAPI
+from src.vk_streaming import RULE_TAG_PREFIX, VKStreamingClient
+
+
+@pytest.fixture
+def server():
+    rate_governor.configure({})
+    server = FakeStreamingServer().start()
+    yield server
+    server.stop()
+
+
+def make_client(server, **kwargs):
+    # endpoint和key通过streaming.getServerUrl从假服务器获取
+    vk_api = VKAPI(access_token="token", base_url=f"{server.url}/method")
+    return VKStreamingClient(vk_api, secure=False, **kwargs)
+
+
+async def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def test_rule_sync_only_touches_own_rules(server):
+    server.rules = {"manual": "кино", f"{RULE_TAG_PREFIX}stale": "старое"}
+    client = make_client(server)
+    assert client._prepare(["концерт", "  лекция   бесплатно "])
+    assert set(server.rules.values()) == {"кино", "концерт", "лекция бесплатно"}
+    assert server.counters["rules_deleted"] == 1
+
+    # 关键词不变时重新同步不会重建规则
+    assert client.sync_rules(["концерт", "лекция бесплатно"])
+    assert server.counters["rules_added"] == 2
+
+    assert client.sync_rules(["концерт"])
+    assert set(server.rules.values()) == {"кино", "концерт"}
+
+
+def test_reconnect_backs_off_and_resets_after_connecting(server, caplog):
+    server.available = False
+    posts = []
+
+    async def scenario():
+        client = make_client(server, reconnect_delay=0.01, max_reconnect_delay=0.04)
+        task = asyncio.create_task(client.run(lambda: ["концерт"], posts.append, lambda start, end: asyncio.sleep(0)))
+        await wait_until(lambda: len(delays()) >= 4)
+        server.available = True
+        await wait_until(lambda: server.counters["connections"] == 1)
+        server.publish("Концерт в субботу")
+        await wait_until(lambda: posts)
+        server.disconnect()
+        await wait_until(lambda: server.counters["connections"] == 2)
+        task.cancel()
+
+    def delays():
+        return [float(m.group(1)) for r in caplog.records
+                if (m := re.match(r"Reconnecting to VK streaming in ([\d.]+) seconds", r.getMessage()))]
+
+    with caplog.at_level(logging.INFO, logger="src.vk_streaming"):
+        asyncio.run(scenario())
+    observed = delays()
+    assert observed[:4] == [0.01, 0.02, 0.04, 0.04]
+    # 连接成功后退避时间恢复为初始值
+    assert observed[-1] == 0.01
+    assert posts[0]["text"] == "Концерт в субботу"
+
+
+def test_gap_after_disconnect_is_backfilled(server):
+    posts = []
+    gaps = []
+
+    async def on_gap(start_time, end_time):
+        gaps.append((start_time, end_time))
+
+    async def scenario():
+        client = make_client(server, reconnect_delay=0.01, gap_overlap=60)
+        task = asyncio.create_task(client.run(lambda: ["концерт"], posts.append, on_gap))
+        await wait_until(lambda: server.counters["connections"] == 1)
+        assert gaps == []
+        server.publish("Концерт до обрыва")
+        await wait_until(lambda: len(posts) == 1)
+        dropped_at = int(time.time())
+        server.disconnect()
+        await wait_until(lambda: gaps)
+        server.publish("Концерт после переподключения")
+        await wait_until(lambda: len(posts) == 2)
+        task.cancel()
+        return dropped_at
+
+    dropped_at = asyncio.run(scenario())
+    [(start_time, end_time)] = gaps
+    assert dropped_at - 60 <= start_time <= dropped_at + 1 - 60
+    assert end_time >= dropped_at
+    assert [post["text"] for post in posts] == ["Концерт до обрыва", "Концерт после переподключения"]
+
+
+def test_gap_posts_are_processed_by_the_stream_consumer(server):
+    from types import SimpleNamespace
+    import threading
+
+    from src.main import VKTelegramBot
+
+    lock = threading.Lock()
+    state = {"active": 0, "max_active": 0, "processed": []}
+
+    def process_posts(posts):
+        with lock:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+            state["processed"].extend(post["text"] for post in posts)
+
+    bot = SimpleNamespace(
+        vk_api=VKAPI(access_token="token", base_url=f"{server.url}/method"),
+        config={"vk": {"streaming": {"secure": False, "reconnect_delay": 0.01}}},
+        streaming_client=None,
+        _get_keywords=lambda: ["концерт"],
+        _backfill_gap=lambda start_time, end_time: [{"owner_id": -1, "id": i, "text": f"gap {i}"} for i in range(3)],
+        _process_posts=process_posts,
+    )
+
+    async def scenario():
+        task = asyncio.create_task(VKTelegramBot._streaming_task(bot))
+        await wait_until(lambda: server.counters["connections"] == 1)
+        server.disconnect()
+        await wait_until(lambda: server.counters["connections"] == 2)
+        for _ in range(3):
+            server.publish("live")
+        await wait_until(lambda: len(state["processed"]) == 6)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert sorted(state["processed"]) == ["gap 0", "gap 1", "gap 2", "live", "live", "live"]
+    assert state["max_active"] == 1
@@ -0,0 +1,136 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src import work_queue
+from src.work_queue import STAGE_CLASSIFY, STAGE_NOTIFY, WorkQueue
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue, "time", SimpleNamespace(time=clock))
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path / "pipeline.db"), lease_seconds=60, max_attempts=3)
+    yield queue
+    queue.close()
+
+
+def test_lease_orders_by_priority_and_hides_leased_jobs(queue):
+    queue.enqueue(STAGE_CLASSIFY, "low", {"n": 1}, priority=0.1)
+    queue.enqueue(STAGE_CLASSIFY, "high", {"n": 2}, priority=0.9)
+    queue.enqueue(STAGE_NOTIFY, "other-stage", {})
+
+    jobs = queue.lease(STAGE_CLASSIFY, limit=1)
+    assert [(job["key"], job["payload"], job["attempts"]) for job in jobs] == [("high", {"n": 2}, 1)]
+    assert [job["key"] for job in queue.lease(STAGE_CLASSIFY)] == ["low"]
+    assert queue.lease(STAGE_CLASSIFY) == []
+
+
+def test_expired_lease_is_leased_again(queue, clock):
+    queue.enqueue(STAGE_CLASSIFY, "post", {})
+    [job] = queue.lease(STAGE_CLASSIFY)
+    clock.now += 30
+    assert queue.lease(STAGE_CLASSIFY) == []
+    clock.now += 31
+    [again] = queue.lease(STAGE_CLASSIFY)
+    assert again["id"] == job["id"]
+    assert again["attempts"] == 2
+
+
+def test_expired_lease_after_max_attempts_fails(queue, clock):
+    queue.enqueue(STAGE_CLASSIFY, "post", {})
+    for _ in range(3):
+        assert queue.lease(STAGE_CLASSIFY)
+        clock.now += 61
+    assert queue.lease(STAGE_CLASSIFY) == []
+    assert queue.stats() == {STAGE_CLASSIFY: {"failed": 1}}
+
+
+def test_retry_until_max_attempts(queue, clock):
+    queue.enqueue(STAGE_CLASSIFY, "post", {})
+    for attempt in range(1, 4):
+        [job] = queue.lease(STAGE_CLASSIFY)
+        assert job["attempts"] == attempt
+        queue.retry(job, "boom", delay=10)
+        assert queue.lease(STAGE_CLASSIFY) == []
+        clock.now += 10
+    assert queue.lease(STAGE_CLASSIFY) == []
+    assert queue.stats() == {STAGE_CLASSIFY: {"failed": 1}}
+
+
+def test_defer_does_not_count_an_attempt(queue, clock):
+    queue.enqueue(STAGE_CLASSIFY, "post", {})
+    [job] = queue.lease(STAGE_CLASSIFY)
+    queue.defer(job, 100)
+    clock.now += 99
+    assert queue.lease(STAGE_CLASSIFY) == []
+    clock.now += 1
+    [job] = queue.lease(STAGE_CLASSIFY)
+    assert job["attempts"] == 1
+
+
+def test_recover_releases_leased_jobs(queue):
+    queue.enqueue(STAGE_CLASSIFY, "post", {})
+    queue.lease(STAGE_CLASSIFY)
+    assert queue.recover() == 1
+    assert [job["key"] for job in queue.lease(STAGE_CLASSIFY)] == ["post"]
+
+
+def test_keys_are_deduplicated_until_purged(queue, clock):
+    assert queue.enqueue(STAGE_CLASSIFY, "post", {})
+    assert not queue.enqueue(STAGE_CLASSIFY, "post", {})
+    [job] = queue.lease(STAGE_CLASSIFY)
+    queue.ack(job["id"])
+    queue.mark_delivered("post", 42)
+
+    clock.now += 6 * 86400
+    assert not queue.enqueue(STAGE_CLASSIFY, "post", {})
+    assert queue.purge(older_than=7 * 86400) == 0
+    assert queue.is_delivered("post", 42)
+
+    clock.now += 2 * 86400
+    assert queue.purge(older_than=7 * 86400) == 1
+    assert not queue.is_delivered("post", 42)
+    assert queue.enqueue(STAGE_CLASSIFY, "post", {})
+
+
+def test_purge_keeps_unfinished_jobs(queue, clock):
+    queue.enqueue(STAGE_CLASSIFY, "pending", {})
+    clock.now += 30 * 86400
+    assert queue.purge(older_than=86400) == 0
+    assert queue.pending_count(STAGE_CLASSIFY) == 1
+
+
+def test_state_survives_reopening(tmp_path, clock):
+    path = str(tmp_path / "pipeline.db")
+    queue = WorkQueue(path)
+    queue.enqueue(STAGE_NOTIFY, "post", {"url": "https://vk.com/wall-1_1"})
+    queue.close()
+
+    queue = WorkQueue(path)
+    [job] = queue.lease(STAGE_NOTIFY)
+    assert job["payload"] == {"url": "https://vk.com/wall-1_1"}
+    queue.close()
+
+
+def test_payloads_resume_after_id(queue, clock):
+    for i in range(3):
+        queue.enqueue(STAGE_CLASSIFY, f"post{i}", {"i": i})
+        clock.now += 10
+    rows = queue.payloads(STAGE_CLASSIFY, limit=2)
+    assert [payload["i"] for _, payload in rows] == [0, 1]
+    assert [payload["i"] for _, payload in queue.payloads(STAGE_CLASSIFY, after_id=rows[-1][0])] == [2]
+    assert [payload["i"] for _, payload in queue.payloads(STAGE_CLASSIFY, since=clock.now - 15)] == [2]